@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Booking, BookedTicket
+from .models import ArchivedBooking, Booking, BookedTicket, OrganizerRevenueRollup
 
 class BookedTicketInline(admin.TabularInline):
     model = BookedTicket
@@ -16,3 +16,15 @@ class BookingAdmin(admin.ModelAdmin):
 class BookedTicketAdmin(admin.ModelAdmin):
     list_display = ('booking', 'ticket_type', 'quantity')
     list_filter = ('ticket_type',)
+
+@admin.register(OrganizerRevenueRollup)
+class OrganizerRevenueRollupAdmin(admin.ModelAdmin):
+    list_display = ('organizer', 'event', 'day', 'bookings_count', 'revenue', 'platform_fee')
+    list_filter = ('day',)
+    search_fields = ('organizer__username', 'event__title')
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(admin.ModelAdmin):
+    list_display = ('user', 'event', 'status', 'total_amount', 'booked_at', 'archived_at')
+    list_filter = ('status', 'archived_at')
+    search_fields = ('user__username', 'event__title')
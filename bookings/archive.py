@@ -0,0 +1,64 @@
+"""
+Archive tier for finished bookings.
+
+A booking that is paid or failed, for an event that ended more than
+``BOOKING_ARCHIVE_AFTER_DAYS`` ago, never changes again. ``archive_bookings``
+moves such bookings, with their ticket lines, into ``ArchivedBooking`` /
+``ArchivedBookedTicket`` (same ids, same columns), so the hot tables and
+their indexes only grow with live and recent bookings.
+
+The move is online: small batches, one short transaction each, claimed with
+``FOR UPDATE SKIP LOCKED`` so a booking that is being written to is simply
+left for the next run. Each batch copies and deletes in the same
+transaction, so a booking is always in exactly one tier.
+
+Reads that ask for history (``?history=1`` on my-bookings, my-receipts and
+the organizer export) read both tiers. Organizer revenue comes from the
+rollup, which archiving doesn't touch; ``rebuild_rollup`` and the event
+counters count both tiers.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedBookedTicket, ArchivedBooking, Booking, BookedTicket
+
+BOOKING_COLUMNS = [field.attname for field in Booking._meta.concrete_fields]
+TICKET_COLUMNS = [field.attname for field in BookedTicket._meta.concrete_fields]
+
+
+def archivable(now=None):
+    cutoff = (now or timezone.now()) - timedelta(days=settings.BOOKING_ARCHIVE_AFTER_DAYS)
+    return Booking.objects.filter(status__in=['paid', 'failed'], event__end_time__lt=cutoff)
+
+
+def archive_bookings(batch_size=1000, pause=0, now=None, progress=None):
+    """Move every archivable booking to the archive tier, sleeping ``pause`` seconds between batches; returns how many moved."""
+    now = now or timezone.now()
+    moved = 0
+    while True:
+        with transaction.atomic():
+            # of=('self',): lock the bookings, not the events joined in for the cutoff
+            booking_ids = list(
+                archivable(now).select_for_update(skip_locked=True, of=('self',))
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not booking_ids:
+                return moved
+            ArchivedBooking.objects.bulk_create([
+                ArchivedBooking(archived_at=now, **row)
+                for row in Booking.objects.filter(id__in=booking_ids).values(*BOOKING_COLUMNS)
+            ])
+            ArchivedBookedTicket.objects.bulk_create([
+                ArchivedBookedTicket(**row)
+                for row in BookedTicket.objects.filter(booking_id__in=booking_ids).values(*TICKET_COLUMNS)
+            ])
+            BookedTicket.objects.filter(booking_id__in=booking_ids).delete()
+            Booking.objects.filter(id__in=booking_ids).delete()
+        moved += len(booking_ids)
+        if progress:
+            progress(moved)
+        time.sleep(pause)
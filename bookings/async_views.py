@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+
+from event_booking.async_api import async_api_view, json_response, view_for
+from event_booking.db_router import areplica_reads
+from .models import Booking
+from .serializers import BookingReceiptSerializer
+from .views import (
+    CHECKOUT_LONG_POLL_MAX_SECONDS, CHECKOUT_POLL_SECONDS, BookingListView, checkout_status_response, newest_first,
+    receipt_querysets, wants_history,
+)
+
+
+# ------------------------ LIST User Bookings (async) ------------------------
+@async_api_view()
+async def booking_list(request, user):
+    view = view_for(BookingListView, request, user)
+    try:
+        async with areplica_reads(user):
+            page = await view.paginator.apaginate_querysets(view.get_querysets(), view.request, view=view)
+        serializer = view.get_serializer(page, many=True)
+        return json_response({
+            "status": "success",
+            "message": "Bookings fetched successfully.",
+            "data": serializer.data,
+            "next": view.paginator.get_next_link(),
+        })
+
+    except NotFound:
+        raise
+
+    except Exception as e:
+        return json_response({
+            "status": "error",
+            "message": "Failed to fetch bookings.",
+            "error": str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ------------------------ Get Order/My Receipts (async) ------------------------
+@async_api_view()
+async def my_receipts(request, user):
+    try:
+        bookings = []
+        async with areplica_reads(user):
+            for queryset in receipt_querysets(user, wants_history(request.GET)):
+                bookings += [booking async for booking in queryset]
+        bookings = newest_first(bookings)
+        serializer = BookingReceiptSerializer(bookings, many=True)
+        return json_response({
+            "status": "success",
+            "message": "Receipts fetched successfully.",
+            "data": serializer.data
+        })
+
+    except Exception as e:
+        return json_response({
+            "status": "error",
+            "message": "Failed to fetch receipts.",
+            "error": str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ------------------------ Booking Checkout Status (async long-poll) ------------------------
+@async_api_view()
+async def booking_checkout_status(request, user, pk):
+    """``?wait=<seconds>`` long-polls until the checkout URL is ready; the wait holds no worker thread."""
+    bookings = Booking.objects.filter(pk=pk, user=user).only('status', 'checkout_status', 'checkout_url')
+    try:
+        booking = await bookings.aget()
+    except Booking.DoesNotExist:
+        raise NotFound()
+
+    try:
+        wait = min(float(request.GET.get('wait', 0)), CHECKOUT_LONG_POLL_MAX_SECONDS)
+    except ValueError:
+        wait = 0
+    deadline = time.monotonic() + wait
+    while booking.checkout_status == 'queued' and time.monotonic() < deadline:
+        await asyncio.sleep(CHECKOUT_POLL_SECONDS)
+        booking = await bookings.aget()
+
+    payload, headers = checkout_status_response(booking)
+    return json_response(payload, headers=headers)
@@ -0,0 +1,290 @@
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, PositiveIntegerField, Q, Sum, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from event_booking import metrics
+from events.counters import count_hold, count_restock, event_of
+from events.models import TicketType
+from events.sharding import return_to_shards, take_from_shards
+from .models import Booking, BookedTicket
+from .revenue import add_paid_booking
+
+logger = logging.getLogger(__name__)
+
+# The sweeper runs in Celery workers: shared, so /metrics on the web processes serves them
+expired_bookings = metrics.counter(
+    'booking_holds_expired_total', "Pending bookings failed by the hold sweeper.", shared=True)
+expiry_run_duration = metrics.histogram(
+    'booking_hold_sweep_duration_seconds', "Duration of each hold sweeper run.", shared=True)
+expiry_last_run = metrics.gauge(
+    'booking_hold_sweep_last_run_timestamp_seconds', "When the hold sweeper last finished.", shared=True)
+
+
+class InsufficientInventory(Exception):
+    def __init__(self, ticket_type_ids):
+        self.ticket_type_ids = list(ticket_type_ids)
+        super().__init__(f"Not enough tickets available for ticket types {self.ticket_type_ids}.")
+
+
+class CapacityReached(InsufficientInventory):
+    """The event's capacity is used up, whatever stock its ticket types have left; every line is short."""
+
+    def __init__(self, event_id, ticket_type_ids):
+        self.event_id = event_id
+        self.ticket_type_ids = list(ticket_type_ids)
+        Exception.__init__(self, f"Event {event_id} is at capacity.")
+
+
+def hold_expiry():
+    return timezone.now() + timedelta(minutes=settings.BOOKING_HOLD_TTL_MINUTES)
+
+
+def _merge_lines(lines):
+    merged = Counter()
+    for ticket_type_id, quantity in lines:
+        merged[ticket_type_id] += quantity
+    # Always touch rows in primary key order so concurrent holds can't deadlock.
+    return sorted(merged.items())
+
+
+def _shard_counts(lines):
+    ticket_type_ids = [ticket_type_id for ticket_type_id, _ in lines]
+    return dict(TicketType.objects.filter(id__in=ticket_type_ids, shard_count__gt=0).values_list('id', 'shard_count'))
+
+
+def _per_line(lines):
+    return Case(
+        *[When(id=ticket_type_id, then=Value(quantity)) for ticket_type_id, quantity in lines],
+        output_field=PositiveIntegerField(),
+    )
+
+
+def _short_lines(lines):
+    return list(TicketType.objects.filter(
+        id__in=[ticket_type_id for ticket_type_id, _ in lines], quantity__lt=_per_line(lines)
+    ).values_list('id', flat=True))
+
+
+# ------------------------ Hold seats ------------------------
+def reserve_tickets(lines, shard_counts=None, event=None):
+    """
+    Take seats for every ``(ticket_type_id, quantity)`` pair, or none at all.
+
+    All unsharded lines are taken by one conditional statement,
+    ``UPDATE ... SET quantity = quantity - n WHERE quantity >= n``, with ``n``
+    picked per row by a ``CASE``; if it touches fewer rows than there are
+    lines some stock ran out and the whole hold is rolled back. Sharded ticket
+    types take their seats from one of their shard rows instead.
+
+    If the event has a capacity its counters move first, in the same
+    transaction: that single conditional update is what enforces it, raising
+    ``CapacityReached``. Otherwise the event row isn't touched and its
+    counters are recounted shortly after (``events.counters``).
+
+    ``shard_counts`` maps sharded ticket type ids to their shard count and
+    ``event`` is the event all lines belong to (its id and capacity are
+    used); pass them when they are already loaded to skip the lookups.
+    """
+    lines = _merge_lines(lines)
+    if shard_counts is None:
+        shard_counts = _shard_counts(lines)
+    if event is None:
+        event = event_of(lines)
+    row_lines = [line for line in lines if line[0] not in shard_counts]
+
+    try:
+        with transaction.atomic():
+            # Event row before ticket type rows, the lock order of every stock change
+            if not count_hold(event, sum(quantity for _, quantity in lines)):
+                raise CapacityReached(event.id, [ticket_type_id for ticket_type_id, _ in lines])
+
+            if row_lines:
+                taken = TicketType.objects.filter(
+                    id__in=[ticket_type_id for ticket_type_id, _ in row_lines], quantity__gte=_per_line(row_lines)
+                ).update(quantity=F('quantity') - _per_line(row_lines))
+                if taken != len(row_lines):
+                    raise InsufficientInventory([])
+
+            for ticket_type_id, quantity in lines:
+                if ticket_type_id in shard_counts and not take_from_shards(ticket_type_id, shard_counts[ticket_type_id], quantity):
+                    raise InsufficientInventory([ticket_type_id])
+    except InsufficientInventory as exc:
+        if not exc.ticket_type_ids:
+            # The batched update only says that some line was short; look up which now that it rolled back
+            exc.ticket_type_ids = _short_lines(row_lines) or [ticket_type_id for ticket_type_id, _ in row_lines]
+        raise
+
+
+def restock_tickets(lines, event_id=None):
+    lines = _merge_lines(lines)
+    if not lines:
+        return
+    shard_counts = _shard_counts(lines)
+    row_lines = [line for line in lines if line[0] not in shard_counts]
+    with transaction.atomic():
+        count_restock(event_id or event_of(lines).id, sum(quantity for _, quantity in lines))
+        if row_lines:
+            TicketType.objects.filter(
+                id__in=[ticket_type_id for ticket_type_id, _ in row_lines]
+            ).update(quantity=F('quantity') + _per_line(row_lines))
+
+        for ticket_type_id, quantity in lines:
+            if ticket_type_id in shard_counts:
+                return_to_shards(ticket_type_id, shard_counts[ticket_type_id], quantity)
+
+
+def booking_lines(booking_id):
+    return list(BookedTicket.objects.filter(booking_id=booking_id).values_list('ticket_type_id', 'quantity'))
+
+
+# ------------------------ Confirm payment ------------------------
+def _paid_fields():
+    percentage = Value(settings.PLATFORM_FEE_PERCENTAGE / Decimal('100'), output_field=DecimalField())
+    platform_fee = Round(F('total_amount') * percentage, 2)
+    return {'status': 'paid', 'platform_fee': platform_fee, 'organizer_revenue': F('total_amount') - platform_fee}
+
+
+def mark_booking_paid(lookup, **stripe_ids):
+    """
+    Record payment for the booking matching ``lookup``.
+
+    Status, platform fee and organizer revenue are written by one conditional
+    ``UPDATE`` computed in the database. Only if the hold had already lapsed,
+    or the booking never held seats (``holds_seats``: made before holds), are
+    the seats taken now, for every line at once, in the same transaction. The organizer revenue rollup is bumped in that transaction
+    too, only when the booking actually becomes paid. Returns the ticket type
+    ids that could not be re-held (empty on success); nothing is written in
+    that case.
+    """
+    paid = {**_paid_fields(), **stripe_ids}
+    with transaction.atomic():
+        if Booking.objects.filter(status='pending', holds_seats=True, **lookup).update(**paid):
+            add_paid_booking(lookup)
+            return []
+
+        booking = (
+            Booking.objects.select_for_update(of=('self',)).select_related('event')
+            .only('id', 'status', 'event_id', 'event__capacity').get(**lookup)
+        )
+        if booking.status == 'paid':
+            Booking.objects.filter(id=booking.id).update(**stripe_ids)
+            return []
+
+        try:
+            reserve_tickets(booking_lines(booking.id), event=booking.event)
+        except InsufficientInventory as exc:
+            return exc.ticket_type_ids
+        Booking.objects.filter(id=booking.id).update(holds_seats=True, **paid)
+        add_paid_booking({'id': booking.id})
+    return []
+
+
+# ------------------------ Release seats ------------------------
+def release_booking(booking_id, expire_session=True):
+    """
+    Fail a pending booking and give its seats back.
+
+    The status flip is conditional, so a hold is only ever released once even
+    if the expiry job and a Stripe webhook race for the same booking. A
+    booking that never held seats (``holds_seats`` off) is failed without
+    touching stock. Its checkout session is expired once the release commits,
+    unless ``expire_session`` is off because Stripe already ended it.
+    """
+    with transaction.atomic():
+        released = Booking.objects.filter(id=booking_id, status='pending', holds_seats=True).update(status='failed')
+        if released:
+            restock_tickets(booking_lines(booking_id))
+        elif not Booking.objects.filter(id=booking_id, status='pending', holds_seats=False).update(status='failed'):
+            return False
+        if expire_session:
+            expire_checkout_sessions_soon([booking_id])
+    return True
+
+
+def expire_checkout_sessions_soon(booking_ids):
+    """
+    Expire the Stripe checkout sessions of ``booking_ids`` after the current
+    transaction commits, so nobody pays for seats that went back on sale.
+    """
+    session_ids = list(
+        Booking.objects.filter(id__in=booking_ids, checkout_session_id__isnull=False)
+        .values_list('checkout_session_id', flat=True)
+    )
+    if session_ids:
+        transaction.on_commit(lambda: _schedule_session_expiry(session_ids))
+
+
+def _schedule_session_expiry(session_ids):
+    from payments.tasks import expire_checkout_sessions_task
+
+    try:
+        expire_checkout_sessions_task.delay(session_ids)
+    except Exception as exc:
+        # Broker down: the sessions lapse on their own, and mark_booking_paid re-holds seats for a late payment
+        logger.warning("Could not queue expiry of %s checkout sessions: %s", len(session_ids), exc)
+
+
+def _stale_holds(now):
+    # Bookings made before holds had an expiry time get the hold TTL from when they were made
+    return Q(hold_expires_at__lte=now) | Q(
+        hold_expires_at__isnull=True, booked_at__lte=now - timedelta(minutes=settings.BOOKING_HOLD_TTL_MINUTES)
+    )
+
+
+def _restock_bookings(booking_ids):
+    # Bookings made before holds (holds_seats off) took no stock and give none back
+    lines = BookedTicket.objects.filter(booking_id__in=booking_ids, booking__holds_seats=True).values_list(
+        'booking__event_id', 'ticket_type_id'
+    ).annotate(total=Sum('quantity')).order_by('booking__event_id', 'ticket_type_id')
+    by_event = {}
+    for event_id, ticket_type_id, quantity in lines:
+        by_event.setdefault(event_id, []).append((ticket_type_id, quantity))
+    # Event ids ascending, so two sweepers sharing an event lock it in the same order
+    for event_id, event_lines in by_event.items():
+        restock_tickets(event_lines, event_id=event_id)
+
+
+def release_expired_holds(now=None, batch_size=None):
+    """
+    Fail every pending booking whose hold has lapsed and give its seats back.
+
+    Works through them ``BOOKING_EXPIRY_BATCH_SIZE`` at a time, one
+    transaction per batch: the batch is claimed with ``FOR UPDATE SKIP
+    LOCKED``, so a booking being paid (or another sweeper's batch) is passed
+    over instead of waited on, and the claimed rows are failed by one
+    ``UPDATE`` and restocked together; bookings made before holds existed
+    are failed without restocking. Their checkout sessions are expired after
+    each batch commits. Returns how many bookings expired.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.BOOKING_EXPIRY_BATCH_SIZE
+    started = time.monotonic()
+    expired = 0
+    while True:
+        with transaction.atomic():
+            booking_ids = list(
+                Booking.objects.select_for_update(skip_locked=True)
+                .filter(_stale_holds(now), status='pending')
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not booking_ids:
+                break
+            Booking.objects.filter(id__in=booking_ids, status='pending').update(status='failed')
+            _restock_bookings(booking_ids)
+            expire_checkout_sessions_soon(booking_ids)
+        expired += len(booking_ids)
+
+    elapsed = time.monotonic() - started
+    expired_bookings.inc(expired)
+    expiry_run_duration.observe(elapsed)
+    expiry_last_run.set(time.time())
+    logger.info("Expired %s stale pending bookings in %.2fs.", expired, elapsed)
+    return expired
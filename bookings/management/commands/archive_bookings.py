@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from bookings.archive import archivable, archive_bookings
+
+
+class Command(BaseCommand):
+    help = "Move finished bookings of long-past events, with their ticket lines, into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Bookings moved per transaction")
+        parser.add_argument('--pause', type=float, default=0, help="Seconds to sleep between batches, to go easy on a busy primary")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f"{archivable().count()} bookings would be archived.")
+            return
+        moved = archive_bookings(batch_size=options['batch_size'], pause=options['pause'], progress=self._progress)
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} bookings."))
+
+    def _progress(self, moved):
+        # Safe to interrupt: every batch reported here is committed
+        self.stdout.write(f"Archived {moved} bookings so far.")
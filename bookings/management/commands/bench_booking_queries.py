@@ -0,0 +1,70 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from bookings.archive import archive_bookings
+from bookings.models import ArchivedBooking, Booking
+from bookings.views import BookingListView, MyReceiptsView, OrganizerBookingExportView
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the hot booking endpoints for a real attendee and organizer; with --archive, "
+        "time them, move finished bookings to the archive tier, and time them again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, required=True, help="Attendee (user id) whose bookings and receipts are read")
+        parser.add_argument('--organizer', type=int, required=True, help="Organizer (user id) whose bookings are exported")
+        parser.add_argument('--runs', type=int, default=20, help="Timed runs per endpoint")
+        parser.add_argument('--archive', action='store_true', help="Archive finished bookings between two rounds")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.in_bulk([options['user'], options['organizer']])
+        if len(users) != len({options['user'], options['organizer']}):
+            raise CommandError("Unknown --user or --organizer.")
+        self.factory = APIRequestFactory()
+        self.attendee, self.organizer = users[options['user']], users[options['organizer']]
+
+        self._round('before' if options['archive'] else 'current', options['runs'])
+        if options['archive']:
+            began = time.perf_counter()
+            moved = archive_bookings(batch_size=options['batch_size'])
+            self.stdout.write(f"archived {moved} bookings in {time.perf_counter() - began:.1f}s")
+            self._round('after', options['runs'])
+
+    def _round(self, label, runs):
+        self.stdout.write(f"{label}: {Booking.objects.count()} current bookings, {ArchivedBooking.objects.count()} archived")
+        endpoints = [
+            ('my-bookings', BookingListView, self.attendee, '/api/bookings/my-bookings/', {}),
+            ('my-bookings history', BookingListView, self.attendee, '/api/bookings/my-bookings/', {'history': 1}),
+            ('my-receipts', MyReceiptsView, self.attendee, '/api/bookings/orders/my_receipts/', {}),
+            ('export', OrganizerBookingExportView, self.organizer, '/api/bookings/organizers/export/', {'status': 'paid'}),
+        ]
+        for name, view_class, user, path, params in endpoints:
+            p50, p95 = self._time(lambda: self._call(view_class, user, path, params), runs)
+            self.stdout.write(f"{name:>20}: p50 {p50:8.2f} ms p95 {p95:8.2f} ms")
+
+    def _call(self, view_class, user, path, params):
+        request = self.factory.get(path, params)
+        force_authenticate(request, user=user)
+        response = view_class.as_view()(request)
+        # Streamed exports only hit the database as they are read
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        else:
+            response.render()
+
+    def _time(self, fetch, runs):
+        timings = []
+        for _ in range(runs):
+            began = time.perf_counter()
+            fetch()
+            timings.append((time.perf_counter() - began) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))]
@@ -0,0 +1,93 @@
+import statistics
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection
+from django.utils import timezone
+
+from bookings.inventory import InsufficientInventory, reserve_tickets
+from events.models import Event, TicketType
+from events.sharding import shard_ticket_type
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent seat holds on one hot ticket type, single-row vs sharded counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--holds', type=int, default=200, help="Holds attempted per worker")
+        parser.add_argument('--quantity', type=int, default=1, help="Seats per hold")
+        parser.add_argument('--shards', type=int, nargs='+', default=[0, 4, 16], help="Shard counts to compare (0 = single row)")
+
+    def handle(self, *args, **options):
+        organizer, created = CustomUser.objects.get_or_create(
+            username='bench-organizer', defaults={'email': 'bench-organizer@example.com', 'role': 'organizer'}
+        )
+        now = timezone.now()
+        # No capacity: the event row stays off the hold path, so this measures ticket type / shard contention alone
+        event = Event.objects.create(
+            organizer=organizer, title='Inventory benchmark', description='', location='', category='bench',
+            start_time=now, end_time=now + timedelta(hours=1),
+        )
+        stock = options['workers'] * options['holds'] * options['quantity']
+
+        try:
+            for shards in options['shards']:
+                ticket_type = TicketType.objects.create(event=event, name=f'{shards} shards', price='1.00', quantity=stock)
+                if shards:
+                    shard_ticket_type(ticket_type.id, shards)
+                self._report(shards, self._run(ticket_type.id, options))
+        finally:
+            event.delete()
+            if created:
+                organizer.delete()
+
+    def _run(self, ticket_type_id, options):
+        latencies, retries = [], [0]
+        lock = threading.Lock()
+        start = threading.Barrier(options['workers'] + 1)
+
+        def worker():
+            close_old_connections()
+            mine, conflicts = [], 0
+            start.wait()
+            try:
+                for _ in range(options['holds']):
+                    began = time.perf_counter()
+                    while True:
+                        try:
+                            reserve_tickets([(ticket_type_id, options['quantity'])])
+                            break
+                        except OperationalError:
+                            conflicts += 1
+                        except InsufficientInventory:
+                            break
+                    mine.append(time.perf_counter() - began)
+            finally:
+                connection.close()
+                with lock:
+                    latencies.extend(mine)
+                    retries[0] += conflicts
+
+        threads = [threading.Thread(target=worker) for _ in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return {'elapsed': time.perf_counter() - began, 'latencies': sorted(latencies), 'retries': retries[0]}
+
+    def _report(self, shards, result):
+        latencies = result['latencies']
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f"{'single row' if not shards else f'{shards} shards':>12}: "
+            f"{len(latencies) / result['elapsed']:8.0f} holds/s  "
+            f"p50 {statistics.median(latencies) * 1000:7.2f} ms  "
+            f"p99 {p99 * 1000:7.2f} ms  "
+            f"retries {result['retries']}"
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from bookings.revenue import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = "Recompute the organizer revenue rollup from paid bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizer', type=int, help="Only rebuild this organizer's rows")
+
+    def handle(self, *args, **options):
+        rebuild_rollup(organizer_id=options['organizer'])
+        self.stdout.write(self.style.SUCCESS("Revenue rollup rebuilt."))
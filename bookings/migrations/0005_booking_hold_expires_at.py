@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_booking_organizer_revenue_booking_platform_fee'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, help_text='Seats are released if the booking is still unpaid at this time', null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_booking_hold_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='checkout_status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('ready', 'Ready'), ('failed', 'Failed')], default='queued', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='checkout_url',
+            field=models.URLField(blank=True, max_length=1000, null=True),
+        ),
+    ]
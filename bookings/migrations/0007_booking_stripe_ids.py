@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_booking_checkout_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='checkout_session_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='payment_intent_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:04
+
+from datetime import timezone as dt_timezone
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollup(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    OrganizerRevenueRollup = apps.get_model('bookings', 'OrganizerRevenueRollup')
+    OrganizerRevenueRollup.objects.bulk_create(
+        (
+            OrganizerRevenueRollup(
+                organizer_id=row['event__organizer_id'], event_id=row['event_id'], day=row['day'],
+                bookings_count=row['paid_count'], revenue=row['paid_revenue'], platform_fee=row['paid_fee'],
+            )
+            for row in Booking.objects.filter(status='paid')
+            .annotate(day=TruncDate('booked_at', tzinfo=dt_timezone.utc))
+            .values('event__organizer_id', 'event_id', 'day')
+            .annotate(paid_count=Count('id'), paid_revenue=Sum('organizer_revenue'), paid_fee=Sum('platform_fee'))
+            .order_by()
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_booking_stripe_ids'),
+        ('events', '0004_tickettype_shards'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizerRevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Booking date (UTC) of the paid bookings counted here')),
+                ('bookings_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('platform_fee', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_rollups', to='events.event')),
+                ('organizer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organizer', 'day'], name='revenue_rollup_org_day')],
+                'constraints': [models.UniqueConstraint(fields=('organizer', 'event', 'day'), name='unique_revenue_rollup')],
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
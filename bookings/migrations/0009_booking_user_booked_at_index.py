@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_organizerrevenuerollup'),
+        ('events', '0004_tickettype_shards'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', '-booked_at', '-id'], name='booking_user_booked_at'),
+        ),
+    ]
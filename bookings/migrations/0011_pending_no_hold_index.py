@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_hot_filter_indexes'),
+        ('events', '0007_event_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('hold_expires_at__isnull', True), ('status', 'pending')), fields=['booked_at'], name='booking_pending_no_hold'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:34
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def flag_legacy_pending(apps, schema_editor):
+    """
+    Bookings still pending from before seats were held at booking time never
+    took stock: flag them, so release gives nothing back and payment takes
+    the seats then, and take their lines back out of the event counters,
+    which 0007 counted as sold.
+    """
+    Booking = apps.get_model('bookings', 'Booking')
+    BookedTicket = apps.get_model('bookings', 'BookedTicket')
+    Event = apps.get_model('events', 'Event')
+
+    legacy = Booking.objects.filter(status='pending', hold_expires_at__isnull=True)
+    seats = BookedTicket.objects.filter(booking__in=legacy).values('booking__event_id').annotate(total=Sum('quantity')).order_by()
+    for row in seats:
+        Event.objects.filter(id=row['booking__event_id']).update(tickets_sold=F('tickets_sold') - row['total'])
+    legacy.update(holds_seats=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0012_booking_archive'),
+        ('events', '0008_event_counters_not_editable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedbooking',
+            name='holds_seats',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='holds_seats',
+            field=models.BooleanField(default=True, help_text="Whether this booking's seats came out of stock"),
+        ),
+        migrations.RunPython(flag_legacy_pending, migrations.RunPython.noop),
+    ]
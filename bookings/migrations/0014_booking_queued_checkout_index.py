@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0013_booking_holds_seats'),
+        ('events', '0008_event_counters_not_editable'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('checkout_status', 'queued'), ('status', 'pending')), fields=['booked_at'], name='booking_queued_checkout'),
+        ),
+    ]
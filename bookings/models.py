@@ -8,6 +8,11 @@ class Booking(models.Model):
         ('paid', 'Paid'),
         ('failed', 'Failed'),
     ]
+    CHECKOUT_STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='bookings')
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='bookings')
     platform_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -16,8 +21,27 @@ class Booking(models.Model):
     booked_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     receipt_url = models.URLField(blank=True, null=True)
+    checkout_status = models.CharField(max_length=10, choices=CHECKOUT_STATUS_CHOICES, default='queued')
+    checkout_url = models.URLField(max_length=1000, blank=True, null=True)
+    checkout_session_id = models.CharField(max_length=255, unique=True, blank=True, null=True)
+    payment_intent_id = models.CharField(max_length=255, unique=True, blank=True, null=True)
+    hold_expires_at = models.DateTimeField(blank=True, null=True, help_text="Seats are released if the booking is still unpaid at this time")
+    # Bookings made before seats were held at booking time (migration 0013) took none; they take them when paid
+    holds_seats = models.BooleanField(default=True, help_text="Whether this booking's seats came out of stock")
 
-
+    class Meta:
+        indexes = [
+            # Serves the keyset-paginated "my bookings" list
+            models.Index(fields=['user', '-booked_at', '-id'], name='booking_user_booked_at'),
+            # Organizer reporting joins through event and filters on status
+            models.Index(fields=['event', 'status'], name='booking_event_status'),
+            # The hold sweeper only looks at pending bookings
+            models.Index(fields=['hold_expires_at'], condition=models.Q(status='pending'), name='booking_pending_hold_expiry'),
+            # ...and, for bookings made before holds had an expiry time, at when they were made
+            models.Index(fields=['booked_at'], condition=models.Q(status='pending', hold_expires_at__isnull=True), name='booking_pending_no_hold'),
+            # Beat re-queues checkout for held bookings that never got a session
+            models.Index(fields=['booked_at'], condition=models.Q(status='pending', checkout_status='queued'), name='booking_queued_checkout'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.event.title}"
@@ -30,3 +54,64 @@ class BookedTicket(models.Model):
 
     def __str__(self):
         return f"{self.ticket_type.name} x{self.quantity}"
+
+
+# ------------------------ Archive tier (bookings/archive.py) ------------------------
+class ArchivedBooking(models.Model):
+    """A finished booking for a long-past event, moved out of the hot table with its id unchanged."""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='archived_bookings')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='archived_bookings')
+    platform_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    organizer_revenue = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    booked_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Booking.STATUS_CHOICES)
+    receipt_url = models.URLField(blank=True, null=True)
+    checkout_status = models.CharField(max_length=10, choices=Booking.CHECKOUT_STATUS_CHOICES)
+    checkout_url = models.URLField(max_length=1000, blank=True, null=True)
+    checkout_session_id = models.CharField(max_length=255, blank=True, null=True)
+    payment_intent_id = models.CharField(max_length=255, blank=True, null=True)
+    hold_expires_at = models.DateTimeField(blank=True, null=True)
+    holds_seats = models.BooleanField(default=True)
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Same shapes as the hot table: my-bookings history and organizer exports
+            models.Index(fields=['user', '-booked_at', '-id'], name='archived_booking_user'),
+            models.Index(fields=['event', 'status'], name='archived_booking_event_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.event.title} (archived)"
+
+
+class ArchivedBookedTicket(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    booking = models.ForeignKey(ArchivedBooking, on_delete=models.CASCADE, related_name='tickets')
+    ticket_type = models.ForeignKey(TicketType, on_delete=models.CASCADE, related_name='archived_booked_tickets')
+    quantity = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.ticket_type.name} x{self.quantity}"
+
+
+class OrganizerRevenueRollup(models.Model):
+    organizer = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='revenue_rollups')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='revenue_rollups')
+    day = models.DateField(help_text="Booking date (UTC) of the paid bookings counted here")
+    bookings_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    platform_fee = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['organizer', 'event', 'day'], name='unique_revenue_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['organizer', 'day'], name='revenue_rollup_org_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.event.title} {self.day}: {self.bookings_count} bookings"
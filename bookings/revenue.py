@@ -0,0 +1,102 @@
+"""
+Per organizer / event / day revenue rollup.
+
+Each paid booking adds itself to one rollup row in the same transaction that
+marks it paid, so revenue reports read a handful of pre-aggregated rows
+instead of scanning every booking.
+"""
+from datetime import timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from .models import ArchivedBooking, Booking, OrganizerRevenueRollup
+
+
+def add_paid_booking(lookup):
+    """Count the just-paid booking matching ``lookup``; call inside the transaction that paid it."""
+    booking = Booking.objects.values(
+        'event_id', 'event__organizer_id', 'booked_at', 'organizer_revenue', 'platform_fee'
+    ).get(**lookup)
+    key = {
+        'organizer_id': booking['event__organizer_id'],
+        'event_id': booking['event_id'],
+        'day': booking['booked_at'].astimezone(dt_timezone.utc).date(),
+    }
+    increments = {
+        'bookings_count': F('bookings_count') + 1,
+        'revenue': F('revenue') + booking['organizer_revenue'],
+        'platform_fee': F('platform_fee') + booking['platform_fee'],
+    }
+
+    if OrganizerRevenueRollup.objects.filter(**key).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            OrganizerRevenueRollup.objects.create(
+                **key, bookings_count=1, revenue=booking['organizer_revenue'], platform_fee=booking['platform_fee'],
+            )
+    except IntegrityError:
+        # Another payment created the row first
+        OrganizerRevenueRollup.objects.filter(**key).update(**increments)
+
+
+def paid_booking_totals(bookings):
+    return (
+        bookings.filter(status='paid')
+        .annotate(day=TruncDate('booked_at', tzinfo=dt_timezone.utc))
+        .values('event__organizer_id', 'event_id', 'day')
+        .annotate(paid_count=Count('id'), paid_revenue=Sum('organizer_revenue'), paid_fee=Sum('platform_fee'))
+        .order_by()
+    )
+
+
+def rebuild_rollup(organizer_id=None, batch_size=1000):
+    """Recompute rollup rows from the bookings tables, current and archived (backfill / repair)."""
+    rollups = OrganizerRevenueRollup.objects.all()
+    tiers = [Booking.objects.all(), ArchivedBooking.objects.all()]
+    if organizer_id is not None:
+        rollups = rollups.filter(organizer_id=organizer_id)
+        tiers = [bookings.filter(event__organizer_id=organizer_id) for bookings in tiers]
+
+    # An event's bookings for one day can be split across both tiers
+    totals = {}
+    for bookings in tiers:
+        for row in paid_booking_totals(bookings).iterator():
+            key = (row['event__organizer_id'], row['event_id'], row['day'])
+            count, revenue, fee = totals.get(key, (0, 0, 0))
+            totals[key] = (count + row['paid_count'], revenue + row['paid_revenue'], fee + row['paid_fee'])
+
+    with transaction.atomic():
+        rollups.delete()
+        OrganizerRevenueRollup.objects.bulk_create(
+            (
+                OrganizerRevenueRollup(
+                    organizer_id=organizer, event_id=event, day=day, bookings_count=count, revenue=revenue, platform_fee=fee,
+                )
+                for (organizer, event, day), (count, revenue, fee) in totals.items()
+            ),
+            batch_size=batch_size,
+        )
+
+
+def revenue_summary(organizer, start=None, end=None, event_id=None, group_by=None):
+    rollups = OrganizerRevenueRollup.objects.filter(organizer=organizer)
+    if start:
+        rollups = rollups.filter(day__gte=start)
+    if end:
+        rollups = rollups.filter(day__lte=end)
+    if event_id:
+        rollups = rollups.filter(event_id=event_id)
+
+    totals = {'total_bookings': Sum('bookings_count'), 'total_revenue': Sum('revenue'), 'total_platform_fee': Sum('platform_fee')}
+    summary = rollups.aggregate(**totals)
+
+    if group_by == 'event':
+        breakdown = rollups.values('event_id', event_title=F('event__title')).annotate(**totals).order_by('event_id')
+    elif group_by == 'day':
+        breakdown = rollups.values('day').annotate(**totals).order_by('day')
+    else:
+        breakdown = None
+    return summary, breakdown
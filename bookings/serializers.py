@@ -1,5 +1,8 @@
+from collections import Counter
+from django.db import transaction
 from rest_framework import serializers
 from .models import Booking, BookedTicket
+from .inventory import CapacityReached, InsufficientInventory, hold_expiry, reserve_tickets
 from events.models import TicketType, Event
 from events.serializers import TicketTypeSerializer
 
@@ -7,7 +10,7 @@ from events.serializers import TicketTypeSerializer
 # ---------------------- Input Ticket (for creating) ----------------------
 class BookedTicketInputSerializer(serializers.Serializer):
     ticket_type_id = serializers.IntegerField(required=True)
-    quantity = serializers.IntegerField(required=True)
+    quantity = serializers.IntegerField(required=True, min_value=1)
 
 # ---------------------- Output Ticket (for showing data) ----------------------
 class BookedTicketOutputSerializer(serializers.ModelSerializer):
@@ -47,6 +50,14 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         except Event.DoesNotExist:
             raise serializers.ValidationError("Invalid event ID.")
 
+        # Early rejection from the event's counters; the hold in create() enforces capacity
+        wanted = sum(ticket.get('quantity') or 0 for ticket in tickets)
+        if event.is_sold_out or (event.capacity and event.tickets_sold + wanted > event.capacity):
+            raise serializers.ValidationError("Not enough seats left for this event.")
+
+        # One query for every ticket type on the order; create() reuses these objects
+        ticket_types = TicketType.objects.in_bulk([ticket.get('ticket_type_id') for ticket in tickets])
+        requested = Counter()
 
         for ticket in tickets:
             ticket_type_id = ticket.get('ticket_type_id')
@@ -55,42 +66,54 @@ class BookingCreateSerializer(serializers.ModelSerializer):
             if ticket_type_id is None:
                 raise serializers.ValidationError("Each ticket must include 'ticket_type_id'.")
 
-            try:
-                ticket_type = TicketType.objects.get(id=ticket_type_id)
-            except TicketType.DoesNotExist:
+            ticket_type = ticket_types.get(ticket_type_id)
+            if ticket_type is None:
                 raise serializers.ValidationError(f"Ticket type {ticket_type_id} not found.")
 
             if ticket_type.event_id != event_id:
                 raise serializers.ValidationError(f"Ticket type {ticket_type.id} does not belong to the given event.")
 
-            if quantity > ticket_type.quantity:
+            # Early rejection only; the hold in create() is what actually guards the stock
+            requested[ticket_type_id] += quantity
+            if not ticket_type.shard_count and requested[ticket_type_id] > ticket_type.quantity:
                 raise serializers.ValidationError(f"Not enough tickets available for {ticket_type.name}.")
 
+        data['event'] = event
+        data['ticket_types'] = ticket_types
         return data
 
     def create(self, validated_data):
         tickets_data = validated_data.get('tickets')
-        event_id = validated_data.get('event_id')
-        event = Event.objects.get(id=event_id)
+        ticket_types = validated_data.get('ticket_types')
         user = self.context['request'].user
 
-        total_amount = 0
-        booking = Booking.objects.create(user=user, event=event, total_amount=0)
-
-        for ticket in tickets_data:
-            ticket_type = TicketType.objects.get(id=ticket['ticket_type_id'])
-            quantity = ticket['quantity']
+        total_amount = sum(ticket_types[ticket['ticket_type_id']].price * ticket['quantity'] for ticket in tickets_data)
+        shard_counts = {ticket_type.id: ticket_type.shard_count for ticket_type in ticket_types.values() if ticket_type.shard_count}
 
-            BookedTicket.objects.create(
-                booking=booking,
-                ticket_type=ticket_type,
-                quantity=quantity
+        with transaction.atomic():
+            # Hold the seats first: if any line is sold out nothing below is written.
+            try:
+                reserve_tickets(
+                    ((ticket['ticket_type_id'], ticket['quantity']) for ticket in tickets_data),
+                    shard_counts=shard_counts,
+                    event=validated_data['event'],
+                )
+            except CapacityReached:
+                raise serializers.ValidationError("Not enough seats left for this event.")
+            except InsufficientInventory as exc:
+                names = ", ".join(ticket_types[ticket_type_id].name for ticket_type_id in exc.ticket_type_ids)
+                raise serializers.ValidationError(f"Not enough tickets available for {names}.")
+
+            booking = Booking.objects.create(
+                user=user,
+                event=validated_data.get('event'),
+                total_amount=total_amount,
+                hold_expires_at=hold_expiry(),
             )
-
-            total_amount += ticket_type.price * quantity
-
-        booking.total_amount = total_amount
-        booking.save()
+            BookedTicket.objects.bulk_create([
+                BookedTicket(booking=booking, ticket_type=ticket_types[ticket['ticket_type_id']], quantity=ticket['quantity'])
+                for ticket in tickets_data
+            ])
         return booking
 
 
@@ -0,0 +1,7 @@
+from celery import shared_task
+from .inventory import release_expired_holds
+
+
+@shared_task
+def release_expired_holds_task():
+    return release_expired_holds()
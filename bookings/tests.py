@@ -1,3 +1,753 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from event_booking import db_router, metrics
+from event_booking.query_plans import captured_sequential_scans, sequential_scans
+from events.cache import catalog_cache
+from events.counters import recount_events, reconcile_counters
+from events.models import Event, TicketType
+from events.sharding import shard_ticket_type
+from users.models import CustomUser
+from .archive import archive_bookings
+from .async_views import booking_list, my_receipts
+from .inventory import (
+    CapacityReached, InsufficientInventory, _stale_holds, expired_bookings, mark_booking_paid, release_booking,
+    release_expired_holds, reserve_tickets,
+)
+from .models import ArchivedBooking, Booking, BookedTicket, OrganizerRevenueRollup
+from .revenue import rebuild_rollup
+
+
+def make_event(organizer, **kwargs):
+    now = timezone.now()
+    defaults = {
+        'title': 'Launch Party',
+        'description': 'Rooftop launch party',
+        'location': 'Berlin',
+        'category': 'music',
+        'start_time': now + timedelta(days=7),
+        'end_time': now + timedelta(days=7, hours=4),
+        'status': 'published',
+    }
+    defaults.update(kwargs)
+    return Event.objects.create(organizer=organizer, **defaults)
+
+
+def make_user(username, role='attendee'):
+    return CustomUser.objects.create_user(username=username, email=f'{username}@example.com', password='x', role=role)
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.organizer = make_user('organizer', role='organizer')
+        self.attendee = make_user('attendee')
+        self.event = make_event(self.organizer)
+        self.general = TicketType.objects.create(event=self.event, name='General', price='20.00', quantity=5)
+        self.vip = TicketType.objects.create(event=self.event, name='VIP', price='80.00', quantity=1)
+
+    def test_reserve_is_all_or_nothing(self):
+        with self.assertRaises(InsufficientInventory):
+            reserve_tickets([(self.general.id, 2), (self.vip.id, 2)])
+
+        self.general.refresh_from_db()
+        self.vip.refresh_from_db()
+        self.assertEqual((self.general.quantity, self.vip.quantity), (5, 1))
+
+    def test_duplicate_lines_are_checked_together(self):
+        with self.assertRaises(InsufficientInventory):
+            reserve_tickets([(self.vip.id, 1), (self.vip.id, 1)])
+
+    def test_release_returns_seats_once(self):
+        booking = Booking.objects.create(user=self.attendee, event=self.event, total_amount=40)
+        BookedTicket.objects.create(booking=booking, ticket_type=self.general, quantity=2)
+        reserve_tickets([(self.general.id, 2)])
+
+        self.assertTrue(release_booking(booking.id))
+        self.assertFalse(release_booking(booking.id))
+
+        self.general.refresh_from_db()
+        booking.refresh_from_db()
+        self.assertEqual(self.general.quantity, 5)
+        self.assertEqual(booking.status, 'failed')
+
+    def test_expired_holds_are_released(self):
+        expired = Booking.objects.create(user=self.attendee, event=self.event, total_amount=20,
+                                         hold_expires_at=timezone.now() - timedelta(minutes=1))
+        BookedTicket.objects.create(booking=expired, ticket_type=self.general, quantity=1)
+        live = Booking.objects.create(user=self.attendee, event=self.event, total_amount=20,
+                                      hold_expires_at=timezone.now() + timedelta(minutes=10))
+        BookedTicket.objects.create(booking=live, ticket_type=self.general, quantity=1)
+        reserve_tickets([(self.general.id, 2)])
+
+        self.assertEqual(release_expired_holds(), 1)
+
+        self.general.refresh_from_db()
+        self.assertEqual(self.general.quantity, 4)
+        self.assertEqual(Booking.objects.get(id=live.id).status, 'pending')
+
+    def test_sweeper_expires_in_batches_and_counts_them(self):
+        long_ago = timezone.now() - timedelta(minutes=settings.BOOKING_HOLD_TTL_MINUTES + 1)
+        bookings = [
+            Booking.objects.create(user=self.attendee, event=self.event, total_amount=20, hold_expires_at=long_ago),
+            Booking.objects.create(user=self.attendee, event=self.event, total_amount=20, hold_expires_at=long_ago),
+            # Made before holds: no expiry time, and no seats ever taken
+            Booking.objects.create(user=self.attendee, event=self.event, total_amount=20, holds_seats=False),
+        ]
+        Booking.objects.filter(id=bookings[2].id).update(booked_at=long_ago)
+        BookedTicket.objects.bulk_create([BookedTicket(booking=booking, ticket_type=self.general, quantity=1) for booking in bookings])
+        reserve_tickets([(self.general.id, 2)])
+        # Stands in for the Redis the worker and the web processes share
+        metrics.set_shared_store(metrics.LocalStore())
+        self.addCleanup(metrics.set_shared_store, None)
+
+        self.assertEqual(release_expired_holds(batch_size=2), 3)
+
+        self.assertEqual(expired_bookings.value(), 3)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('booking_holds_expired_total 3', body)
+        self.assertIn('booking_hold_sweep_duration_seconds_count 1', body)
+        self.assertEqual(set(Booking.objects.values_list('status', flat=True)), {'failed'})
+        # The two real holds came back; the legacy booking added nothing
+        self.assertEqual(TicketType.objects.get(id=self.general.id).quantity, 5)
+        event = Event.objects.get(id=self.event.id)
+        self.assertEqual((event.tickets_remaining, event.tickets_sold), (6, 0))
+        self.assertEqual(release_expired_holds(), 0)
+
+    def test_paying_a_held_booking_is_one_update(self):
+        earlier = Booking.objects.create(user=self.attendee, event=self.event, total_amount=10)
+        mark_booking_paid({'id': earlier.id})
+        booking = Booking.objects.create(user=self.attendee, event=self.event, total_amount='33.33')
+
+        # savepoint, UPDATE booking, read its amounts, UPDATE rollup row, release
+        with self.assertNumQueries(5):
+            self.assertEqual(mark_booking_paid({'id': booking.id}, payment_intent_id='pi_1'), [])
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'paid')
+        self.assertEqual((str(booking.platform_fee), str(booking.organizer_revenue)), ('3.33', '30.00'))
+        self.assertEqual(booking.payment_intent_id, 'pi_1')
+
+    def test_paying_a_lapsed_booking_retakes_every_line_or_reports_the_short_ones(self):
+        booking = Booking.objects.create(user=self.attendee, event=self.event, total_amount=100, status='failed')
+        BookedTicket.objects.bulk_create([
+            BookedTicket(booking=booking, ticket_type=self.general, quantity=1),
+            BookedTicket(booking=booking, ticket_type=self.vip, quantity=2),
+        ])
+
+        self.assertEqual(mark_booking_paid({'id': booking.id}), [self.vip.id])
+        self.assertEqual(Booking.objects.get(id=booking.id).status, 'failed')
+        self.assertEqual(TicketType.objects.get(id=self.general.id).quantity, 5)
+
+        TicketType.objects.filter(id=self.vip.id).update(quantity=2)
+        self.assertEqual(mark_booking_paid({'id': booking.id}), [])
+        self.assertEqual(Booking.objects.get(id=booking.id).status, 'paid')
+        self.assertEqual(
+            list(TicketType.objects.filter(event=self.event).order_by('id').values_list('quantity', flat=True)), [4, 0]
+        )
+
+    def test_bookings_made_before_holds_take_seats_when_paid_and_give_none_back(self):
+        # Pending from before seats were held at booking time (flagged by migration 0013)
+        paid_later, expired = [Booking.objects.create(user=self.attendee, event=self.event, total_amount=20, holds_seats=False) for _ in range(2)]
+        BookedTicket.objects.bulk_create([BookedTicket(booking=booking, ticket_type=self.general, quantity=2) for booking in (paid_later, expired)])
+
+        self.assertTrue(release_booking(expired.id))
+        self.assertEqual(TicketType.objects.get(id=self.general.id).quantity, 5)
+
+        self.assertEqual(mark_booking_paid({'id': paid_later.id}), [])
+        self.assertEqual(TicketType.objects.get(id=self.general.id).quantity, 3)
+        self.assertTrue(Booking.objects.get(id=paid_later.id).holds_seats)
+        reconcile_counters()
+        event = Event.objects.get(id=self.event.id)
+        self.assertEqual((event.tickets_remaining, event.tickets_sold), (4, 2))
+
+    def test_booking_holds_seats_at_creation(self):
+        client = APIClient()
+        client.force_authenticate(self.attendee)
+        payload = {'event_id': self.event.id, 'tickets': [{'ticket_type_id': self.vip.id, 'quantity': 1}]}
+
+        with mock.patch('bookings.views.create_checkout_session_task'):
+            first = client.post(reverse('booking-create'), payload, format='json')
+            second = client.post(reverse('booking-create'), payload, format='json')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 400)
+        self.vip.refresh_from_db()
+        self.assertEqual(self.vip.quantity, 0)
+        self.assertIsNotNone(Booking.objects.get().hold_expires_at)
+
+
+class EventCounterTests(TestCase):
+    def setUp(self):
+        self.organizer = make_user('organizer', role='organizer')
+        self.attendee = make_user('attendee')
+        self.event = make_event(self.organizer, capacity=4)
+        self.general = TicketType.objects.create(event=self.event, name='General', price='20.00', quantity=3)
+        self.vip = TicketType.objects.create(event=self.event, name='VIP', price='80.00', quantity=3)
+
+    def counters(self):
+        event = Event.objects.get(id=self.event.id)
+        return event.tickets_remaining, event.tickets_sold, event.is_sold_out
+
+    def test_holds_and_releases_move_the_counters(self):
+        self.assertEqual(self.counters(), (6, 0, False))
+        booking = Booking.objects.create(user=self.attendee, event=self.event, total_amount=80)
+        BookedTicket.objects.create(booking=booking, ticket_type=self.general, quantity=3)
+        reserve_tickets([(self.general.id, 3)])
+        self.assertEqual(self.counters(), (3, 3, False))
+
+        release_booking(booking.id)
+        self.assertEqual(self.counters(), (6, 0, False))
+
+    def test_capacity_is_enforced_on_the_event_row(self):
+        reserve_tickets([(self.general.id, 3)])
+        with self.assertRaises(CapacityReached):
+            reserve_tickets([(self.vip.id, 2)])
+        self.assertEqual(TicketType.objects.get(id=self.vip.id).quantity, 3)
+
+        reserve_tickets([(self.vip.id, 1)])
+        self.assertEqual(self.counters(), (2, 4, True))
+
+        client = APIClient()
+        client.force_authenticate(self.attendee)
+        response = client.post(reverse('booking-create'), {
+            'event_id': self.event.id, 'tickets': [{'ticket_type_id': self.vip.id, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Not enough seats left', str(response.data))
+
+    def test_events_without_capacity_keep_their_row_off_the_hold_path(self):
+        Event.objects.filter(id=self.event.id).update(capacity=0)
+        event = Event.objects.get(id=self.event.id)
+
+        with mock.patch('events.counters.cache.add', return_value=True) as debounce, \
+                mock.patch('events.tasks.recount_event_counters_task.apply_async') as recount:
+            with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+                reserve_tickets([(self.general.id, 2)], event=event)
+                reserve_tickets([(self.vip.id, 1)], event=event)
+
+        self.assertFalse([query for query in queries if 'UPDATE "events_event"' in query['sql']])
+        self.assertEqual(debounce.call_count, 2)
+        recount.assert_called_with(args=[self.event.id], countdown=settings.EVENT_COUNTER_RECOUNT_DELAY_SECONDS + 1)
+        # What the scheduled recount does (sold is counted from bookings, and these holds have none)
+        recount_events([self.event.id])
+        self.assertEqual(self.counters(), (3, 0, False))
+
+    def test_reconcile_fixes_drift(self):
+        booking = Booking.objects.create(user=self.attendee, event=self.event, total_amount=20)
+        BookedTicket.objects.create(booking=booking, ticket_type=self.general, quantity=1)
+        TicketType.objects.filter(id=self.general.id).update(quantity=2)  # around the counters
+        Event.objects.filter(id=self.event.id).update(tickets_remaining=0)
+
+        with self.assertLogs('events.counters', 'WARNING'):
+            self.assertEqual(reconcile_counters(batch_size=1), 1)
+        self.assertEqual(self.counters(), (5, 1, False))
+        self.assertEqual(reconcile_counters(), 0)
+
+    def test_saving_a_stale_event_leaves_the_counters_alone(self):
+        stale = Event.objects.get(id=self.event.id)
+        reserve_tickets([(self.general.id, 2)])
+
+        stale.title = 'Renamed'
+        stale.save()
+
+        self.assertEqual(self.counters(), (4, 2, False))
+        self.assertEqual(Event.objects.get(id=self.event.id).title, 'Renamed')
+
+    def test_creating_an_event_counts_its_ticket_types_once(self):
+        client = APIClient()
+        client.force_authenticate(self.organizer)
+        payload = {
+            'title': 'Meetup', 'description': 'Talks', 'location': 'Pune', 'category': 'tech', 'capacity': 0,
+            'start_time': self.event.start_time, 'end_time': self.event.end_time,
+            'ticket_types': [{'name': name, 'price': '5.00', 'quantity': 10} for name in ('A', 'B', 'C')],
+        }
+
+        with mock.patch('events.serializers.recount_events', wraps=recount_events) as recount:
+            response = client.post(reverse('event-list'), payload, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        recount.assert_called_once()
+        event = Event.objects.get(title='Meetup')
+        self.assertEqual((event.tickets_remaining, event.tickets_sold), (30, 0))
+
+    def test_public_listing_filters_and_sorts_by_availability(self):
+        roomy = make_event(self.organizer, title='Roomy')
+        TicketType.objects.create(event=roomy, name='General', price='10.00', quantity=50)
+        sold_out = make_event(self.organizer, title='Sold Out')
+        TicketType.objects.create(event=sold_out, name='General', price='10.00', quantity=0)
+        catalog_cache.local.clear()
+
+        def titles(**params):
+            return [event['title'] for event in self.client.get(reverse('public-event-list'), params).data['data']]
+
+        self.assertEqual(titles(sort='availability'), ['Roomy', 'Launch Party', 'Sold Out'])
+        self.assertEqual(titles(sort='availability', available=1), ['Roomy', 'Launch Party'])
+        self.assertEqual(titles(sort='price'), [])
+
+
+class OrganizerRevenueTests(TestCase):
+    def setUp(self):
+        self.organizer = make_user('organizer', role='organizer')
+        self.attendee = make_user('attendee')
+        self.launch = make_event(self.organizer)
+        self.gala = make_event(self.organizer, title='Gala')
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+
+    def pay(self, event, amount, days_ago=0):
+        booking = Booking.objects.create(user=self.attendee, event=event, total_amount=amount)
+        Booking.objects.filter(id=booking.id).update(booked_at=timezone.now() - timedelta(days=days_ago))
+        mark_booking_paid({'id': booking.id})
+        return booking
+
+    def rollup(self):
+        return sorted(OrganizerRevenueRollup.objects.values_list('event_id', 'day', 'bookings_count', 'revenue', 'platform_fee'))
+
+    def test_rollup_is_kept_in_step_with_payments(self):
+        self.pay(self.launch, 100)
+        self.pay(self.launch, 50)
+        self.pay(self.gala, 20, days_ago=3)
+        booking = self.pay(self.gala, 20, days_ago=3)
+        # Confirming again must not count it twice
+        mark_booking_paid({'id': booking.id})
+        Booking.objects.create(user=self.attendee, event=self.launch, total_amount=999)
+
+        incremental = self.rollup()
+        self.assertEqual([row[2] for row in incremental], [2, 2])
+        rebuild_rollup()
+        self.assertEqual(self.rollup(), incremental)
+
+    def test_revenue_totals_and_breakdowns(self):
+        self.pay(self.launch, 100)
+        self.pay(self.gala, 50, days_ago=3)
+        url = reverse('organizer-revenue')
+
+        with self.assertNumQueries(1):
+            data = self.client.get(url).data['data']
+        self.assertEqual(data, {'total_bookings': 2, 'total_revenue': 135.0, 'total_platform_fee': 15.0})
+
+        with self.assertNumQueries(2):
+            data = self.client.get(url, {'group_by': 'event'}).data['data']
+        self.assertEqual([(row['event_title'], row['total_revenue']) for row in data['breakdown']], [('Launch Party', 90.0), ('Gala', 45.0)])
+
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        data = self.client.get(url, {'start': since, 'group_by': 'day'}).data['data']
+        self.assertEqual((data['total_bookings'], len(data['breakdown'])), (1, 1))
+        self.assertEqual(self.client.get(url, {'event': self.gala.id}).data['data']['total_bookings'], 1)
+        self.assertEqual(self.client.get(url, {'start': 'yesterday'}).status_code, 400)
+
+
+class BookingArchiveTests(TestCase):
+    def setUp(self):
+        self.organizer = make_user('organizer', role='organizer')
+        self.attendee = make_user('attendee')
+        long_ago = timezone.now() - timedelta(days=settings.BOOKING_ARCHIVE_AFTER_DAYS + 10)
+        past = make_event(self.organizer, title='Past', start_time=long_ago, end_time=long_ago + timedelta(hours=2))
+        upcoming = make_event(self.organizer, title='Upcoming')
+        self.bookings = []
+        for event, booking_status in ((past, 'paid'), (past, 'failed'), (past, 'pending'), (upcoming, 'paid'), (past, 'paid')):
+            ticket_type = TicketType.objects.create(event=event, name=f'{event.title} {booking_status}', price='10.00', quantity=10)
+            booking = Booking.objects.create(user=self.attendee, event=event, total_amount='10.00', organizer_revenue='9.00',
+                                             status=booking_status, receipt_url='https://example.com/receipt')
+            BookedTicket.objects.create(booking=booking, ticket_type=ticket_type, quantity=1)
+            self.bookings.append(booking)
+        reconcile_counters()  # the bookings were written around the counters
+        rebuild_rollup()
+        self.client = APIClient()
+        self.client.force_authenticate(self.attendee)
+
+    def booking_ids(self, **params):
+        ids, url = [], reverse('booking-list')
+        while url:
+            response = self.client.get(url, {**params, 'page_size': 2} if 'cursor' not in url else None)
+            ids += [booking['id'] for booking in response.data['data']]
+            url = response.data['next']
+        return ids
+
+    def test_finished_bookings_of_past_events_move_and_history_still_reads_them(self):
+        rollup = OrganizerRevenueRollup.objects.order_by('event_id').values_list('event_id', 'bookings_count', 'revenue')
+        rollup_before = list(rollup)
+
+        self.assertEqual(archive_bookings(batch_size=2), 3)
+
+        archived = [self.bookings[index].id for index in (0, 1, 4)]
+        self.assertEqual(sorted(ArchivedBooking.objects.values_list('id', flat=True)), archived)
+        self.assertFalse(BookedTicket.objects.filter(booking_id__in=archived).exists())
+        self.assertEqual(ArchivedBooking.objects.get(id=archived[0]).tickets.get().quantity, 1)
+
+        newest_first = [booking.id for booking in reversed(self.bookings)]
+        self.assertEqual(self.booking_ids(), [self.bookings[3].id, self.bookings[2].id])
+        self.assertEqual(self.booking_ids(history=1), newest_first)
+
+        receipts = self.client.get(reverse('my_receipts'), {'history': 1}).data['data']
+        self.assertEqual([receipt['id'] for receipt in receipts], [self.bookings[4].id, self.bookings[3].id, self.bookings[0].id])
+
+        self.client.force_authenticate(self.organizer)
+        export = self.client.get(reverse('organizer-booking-export'), {'history': 1, 'status': 'paid'})
+        self.assertEqual(len(list(csv.DictReader(io.StringIO(b''.join(export.streaming_content).decode())))), 3)
+
+        # Revenue and seat counts are the same whichever tier a booking is in
+        rebuild_rollup()
+        self.assertEqual(list(rollup), rollup_before)
+        self.assertEqual(reconcile_counters(), 0)
+        self.assertEqual(archive_bookings(), 0)
+
+
+class RequestInstrumentationTests(TestCase):
+    def setUp(self):
+        self.attendee = make_user('attendee')
+        event = make_event(make_user('organizer', role='organizer'))
+        booking = Booking.objects.create(user=self.attendee, event=event, total_amount=20)
+        BookedTicket.objects.create(booking=booking, ticket_type=TicketType.objects.create(event=event, name='General', price='20.00', quantity=5), quantity=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.attendee)
+
+    @override_settings(REQUEST_QUERY_BUDGET=1)
+    def test_requests_over_the_query_budget_are_flagged(self):
+        with self.assertLogs('event_booking.requests', 'WARNING') as logs:
+            self.client.get(reverse('booking-list'))
+        record = json.loads(logs.records[-1].getMessage())
+
+        self.assertEqual((record['endpoint'], record['status']), ('/api/bookings/my-bookings/', 200))
+        self.assertGreaterEqual(record['db_queries'], 2)
+        self.assertGreater(record['serializer_ms'], 0)
+        self.assertTrue(record['over_query_budget'])
+
+    def test_every_request_is_logged_as_one_json_line(self):
+        with self.assertLogs('event_booking.requests', 'INFO') as logs:
+            self.client.get(reverse('booking-list'))
+        record = json.loads(logs.records[-1].getMessage())
+
+        self.assertEqual((logs.records[-1].levelname, record['endpoint']), ('INFO', '/api/bookings/my-bookings/'))
+        self.assertFalse(record['over_query_budget'])
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('booking-list'))
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('http_requests_total{endpoint="/api/bookings/my-bookings/",method="GET",status="200"}', body)
+        self.assertIn('http_request_db_queries_count{endpoint="/api/bookings/my-bookings/"}', body)
+
+        with override_settings(METRICS_TOKEN='scrape-me'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            self.assertEqual(self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer scrape-me'}).status_code, 200)
+
+    def test_label_values_are_escaped(self):
+        # A DRF format-suffix route, as _endpoint reports it
+        route = '/api/events/(?P<pk>[^/.]+)\\.(?P<format>[a-z0-9]+)/?$'
+        requests = metrics.counter('test_escaped_requests_total', "Escaping test.", ['endpoint', 'note'])
+        requests.inc(endpoint=route, note='say "hi"\nbye')
+
+        self.assertIn(
+            'test_escaped_requests_total{endpoint="/api/events/(?P<pk>[^/.]+)\\\\.(?P<format>[a-z0-9]+)/?$",note="say \\"hi\\"\\nbye"} 1',
+            metrics.render(),
+        )
+
+
+class OrganizerBookingExportTests(TestCase):
+    def setUp(self):
+        self.organizer = make_user('organizer', role='organizer')
+        self.attendee = make_user('attendee')
+        self.event = make_event(self.organizer)
+        self.general = TicketType.objects.create(event=self.event, name='General', price='10.00', quantity=5000)
+        other = make_event(make_user('rival', role='organizer'))
+        bookings = Booking.objects.bulk_create(
+            [Booking(user=self.attendee, event=self.event, total_amount='10.00', status='paid') for _ in range(700)]
+            + [Booking(user=self.attendee, event=other, total_amount='10.00', status='paid')]
+        )
+        BookedTicket.objects.bulk_create([BookedTicket(booking=booking, ticket_type=self.general, quantity=1) for booking in bookings[:700]])
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+
+    def export(self, **params):
+        response = self.client.get(reverse('organizer-booking-export'), params)
+        # One query however many blocks the rows are streamed in
+        with self.assertNumQueries(1):
+            body = b''.join(response.streaming_content)
+        return response, body
+
+    def test_csv_export_streams_only_the_organizers_lines(self):
+        response, body = self.export()
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertGreater(len(body), 64 * 1024)
+        self.assertEqual(len(rows), 700)
+        self.assertEqual({row['event_id'] for row in rows}, {str(self.event.id)})
+        self.assertEqual((rows[0]['ticket_type'], rows[0]['unit_price'], rows[0]['customer_email']), ('General', '10.00', 'attendee@example.com'))
+
+    def test_export_without_server_side_cursors_walks_keyset_pages(self):
+        with mock.patch('bookings.exports.CHUNK_SIZE', 300), \
+                mock.patch.dict(connection.settings_dict, {'DISABLE_SERVER_SIDE_CURSORS': True}):
+            response = self.client.get(reverse('organizer-booking-export'))
+            with self.assertNumQueries(3):
+                body = b''.join(response.streaming_content)
+        self.assertEqual(len(list(csv.DictReader(io.StringIO(body.decode())))), 700)
+
+    def test_gzipped_jsonl_export(self):
+        response, body = self.export(output='jsonl', gzip='1', status='paid')
+        lines = gzip.decompress(body).decode().splitlines()
+
+        self.assertIn('.jsonl.gz', response['Content-Disposition'])
+        self.assertEqual(len(lines), 700)
+        self.assertEqual(json.loads(lines[0])['quantity'], 1)
+        self.assertEqual(self.client.get(reverse('organizer-booking-export'), {'output': 'xml'}).status_code, 400)
+        self.client.force_authenticate(self.attendee)
+        self.assertEqual(self.client.get(reverse('organizer-booking-export')).status_code, 403)
+
+
+class BookingListTests(TestCase):
+    def setUp(self):
+        organizer = make_user('organizer', role='organizer')
+        self.attendee = make_user('attendee')
+        events = [make_event(organizer, title=f'Event {index}') for index in range(3)]
+        ticket_types = [
+            TicketType.objects.create(event=event, name=f'Tier {index}', price='10.00', quantity=100)
+            for event in events for index in range(3)
+        ]
+        bookings = Booking.objects.bulk_create([
+            Booking(user=self.attendee, event=events[index % 3], total_amount=30) for index in range(25)
+        ])
+        BookedTicket.objects.bulk_create([
+            BookedTicket(booking=booking, ticket_type=ticket_type, quantity=1)
+            for booking in bookings for ticket_type in ticket_types if ticket_type.event_id == booking.event_id
+        ])
+        # Several bookings share a timestamp, so pages must break ties on id
+        same_moment = timezone.now()
+        Booking.objects.filter(id__in=[booking.id for booking in bookings[5:15]]).update(booked_at=same_moment)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.attendee)
+
+    def test_pages_walk_every_booking_once_in_constant_queries(self):
+        expected = list(Booking.objects.order_by('-booked_at', '-id').values_list('id', flat=True))
+        seen, url = [], reverse('booking-list') + '?page_size=10'
+        while url:
+            # bookings, their tickets with ticket types; the event is joined in
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [booking['id'] for booking in response.data['data']]
+            url = response.data['next']
+
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(response.data['data'][0]['booked_tickets']), 3)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('booking-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_async_views_match_the_drf_views(self):
+        token = f'Bearer {AccessToken.for_user(self.attendee)}'
+        factory = AsyncRequestFactory()
+        Booking.objects.filter(id__in=Booking.objects.order_by('id').values('id')[:4]).update(status='paid')
+
+        for view, name in ((booking_list, 'booking-list'), (my_receipts, 'my_receipts')):
+            expected = self.client.get(reverse(name), {'page_size': 10}).json()
+            # The JWT user lookup plus the view's own queries
+            with self.assertNumQueries(3 if name == 'booking-list' else 2):
+                response = async_to_sync(view)(factory.get(reverse(name), {'page_size': 10}, headers={'Authorization': token}))
+            self.assertEqual(json.loads(response.content), expected)
+
+        self.assertEqual(async_to_sync(booking_list)(factory.get(reverse('booking-list'))).status_code, 401)
+        response = async_to_sync(booking_list)(factory.get(reverse('booking-list'), {'cursor': 'x'}, headers={'Authorization': token}))
+        self.assertEqual(response.status_code, 404)
+
+
+class BookingQueryPlanTests(TestCase):
+    def setUp(self):
+        self.organizer = make_user('organizer', role='organizer')
+        self.attendee = make_user('attendee')
+        other = make_user('other')
+        events = [make_event(self.organizer, title=f'Event {index}') for index in range(5)]
+        ticket_type = TicketType.objects.create(event=events[0], name='General', price='10.00', quantity=1000)
+        bookings = Booking.objects.bulk_create([
+            Booking(user=(self.attendee, other)[index % 2], event=events[index % 5], total_amount=10,
+                    status=('pending', 'paid', 'failed')[index % 3], hold_expires_at=timezone.now())
+            for index in range(90)
+        ])
+        BookedTicket.objects.bulk_create([BookedTicket(booking=booking, ticket_type=ticket_type, quantity=1) for booking in bookings])
+        rebuild_rollup()
+        self.client = APIClient()
+
+    def assert_endpoint_uses_indexes(self, user, url):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(captured_sequential_scans(queries.captured_queries), {})
+
+    def test_hot_booking_queries_use_indexes(self):
+        self.assert_endpoint_uses_indexes(self.attendee, reverse('booking-list'))
+        self.assert_endpoint_uses_indexes(self.organizer, reverse('organizer-revenue') + '?group_by=event')
+
+        for queryset in (
+            Booking.objects.filter(event__organizer=self.organizer, status='paid'),
+            Booking.objects.filter(_stale_holds(timezone.now()), status='pending'),
+        ):
+            self.assertEqual(sequential_scans(queryset), [], str(queryset.query))
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica_1'],
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'replica-tests'}},
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    # Not TestCase: its wrapping transaction would keep every read on the primary
+    def setUp(self):
+        db_router._lag_checks.clear()
+        self.router = db_router.ReplicaRouter()
+        self.attendee = make_user('attendee')
+        self.event = make_event(make_user('organizer', role='organizer'))
+        self.ticket_type = TicketType.objects.create(event=self.event, name='General', price='10.00', quantity=10)
+
+    def test_reads_use_a_fresh_replica_only_when_allowed(self):
+        self.assertEqual(self.router.db_for_read(Booking), 'default')
+        with mock.patch.object(db_router, 'replica_lag', return_value=0.2), db_router.replica_reads():
+            self.assertEqual(self.router.db_for_read(Booking), 'replica_1')
+            with transaction.atomic():
+                self.assertEqual(self.router.db_for_read(Booking), 'default')
+        self.assertEqual(self.router.db_for_write(Booking), 'default')
+
+        # Too far behind, or unreachable: back to the primary until the next check
+        for lag in (mock.Mock(return_value=30.0), mock.Mock(side_effect=OperationalError('down'))):
+            db_router._lag_checks.clear()
+            with mock.patch.object(db_router, 'replica_lag', lag), db_router.replica_reads(), self.assertLogs('event_booking.db_router', 'WARNING'):
+                self.assertEqual(self.router.db_for_read(Booking), 'default')
+
+    def test_users_read_their_own_writes_from_the_primary(self):
+        client = APIClient()
+        client.force_authenticate(self.attendee)
+        # Replica "reads" land on the primary here, so the responses stay checkable
+        with mock.patch.object(db_router, 'replica_is_fresh', return_value=False) as replica_consulted:
+            client.get(reverse('booking-list'))
+            self.assertTrue(replica_consulted.called)
+
+            with mock.patch('bookings.views.create_checkout_session_task'):
+                response = client.post(reverse('booking-create'), {
+                    'event_id': self.event.id, 'tickets': [{'ticket_type_id': self.ticket_type.id, 'quantity': 1}],
+                }, format='json')
+            self.assertEqual(response.status_code, 201)
+
+            replica_consulted.reset_mock()
+            self.assertEqual(len(client.get(reverse('booking-list')).data['data']), 1)
+            self.assertFalse(replica_consulted.called)
+            # Someone else's reads are unaffected
+            catalog_cache.local.clear()
+            self.client.get(reverse('public-event-list'), {'page_size': 3})
+            self.assertTrue(replica_consulted.called)
+
+
+class BookingCreateQueryCountTests(TestCase):
+    # event + ticket types, savepoints around the hold, one UPDATE, booking INSERT, tickets INSERT
+    # (no capacity, so the event counters are recounted later rather than updated in line)
+    EXPECTED_QUERIES = 9
+
+    def setUp(self):
+        organizer = make_user('organizer', role='organizer')
+        self.attendee = make_user('attendee')
+        self.event = make_event(organizer)
+        self.ticket_types = [
+            TicketType.objects.create(event=self.event, name=f'Tier {index}', price='10.00', quantity=100)
+            for index in range(20)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.attendee)
+
+    def book(self, lines):
+        payload = {
+            'event_id': self.event.id,
+            'tickets': [{'ticket_type_id': ticket_type.id, 'quantity': 2} for ticket_type in self.ticket_types[:lines]],
+        }
+        with mock.patch('bookings.views.create_checkout_session_task'):
+            with self.assertNumQueries(self.EXPECTED_QUERIES):
+                response = self.client.post(reverse('booking-create'), payload, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_query_count_does_not_grow_with_ticket_lines(self):
+        self.book(lines=1)
+        self.book(lines=20)
+
+        booking = Booking.objects.latest('id')
+        self.assertEqual(booking.tickets.count(), 20)
+        self.assertEqual(booking.total_amount, 400)
+        self.assertEqual(TicketType.objects.get(id=self.ticket_types[-1].id).quantity, 98)
+
+
+# ------------------------ Concurrency harness ------------------------
+class OversellTests(TransactionTestCase):
+    """
+    Hammer one hot ticket type from many threads at once and prove that the
+    number of seats handed out never exceeds the stock that was there.
+    """
+    STOCK = 25
+    WORKERS = 16
+    ATTEMPTS_PER_WORKER = 5
+
+    def setUp(self):
+        organizer = make_user('organizer', role='organizer')
+        self.event = make_event(organizer)
+        self.ticket_type = TicketType.objects.create(event=self.event, name='Early Bird', price='10.00', quantity=self.STOCK)
+
+    def _run_workers(self, quantity):
+        granted = []
+        lock = threading.Lock()
+        start = threading.Barrier(self.WORKERS)
+
+        def worker():
+            close_old_connections()
+            start.wait()
+            try:
+                for _ in range(self.ATTEMPTS_PER_WORKER):
+                    while True:
+                        try:
+                            reserve_tickets([(self.ticket_type.id, quantity)])
+                        except InsufficientInventory:
+                            break
+                        except OperationalError:
+                            # SQLite reports writer contention instead of blocking; retry the hold
+                            continue
+                        with lock:
+                            granted.append(quantity)
+                        break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return granted
+
+    def test_concurrent_holds_never_oversell(self):
+        granted = self._run_workers(quantity=2)
+
+        self.ticket_type.refresh_from_db()
+        self.assertLessEqual(sum(granted), self.STOCK)
+        self.assertEqual(self.ticket_type.quantity, self.STOCK - sum(granted))
+        # 80 attempts for 25 seats in pairs: every pair that fits must have been sold.
+        self.assertEqual(self.ticket_type.quantity, self.STOCK % 2)
+
+    def test_concurrent_holds_on_sharded_counters_never_oversell(self):
+        shard_ticket_type(self.ticket_type.id, 4)
+        granted = self._run_workers(quantity=2)
+
+        self.ticket_type.refresh_from_db()
+        self.assertLessEqual(sum(granted), self.STOCK)
+        self.assertEqual(self.ticket_type.available_quantity, self.STOCK - sum(granted))
+        self.assertEqual(self.ticket_type.available_quantity, self.STOCK % 2)
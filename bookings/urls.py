@@ -1,11 +1,16 @@
+from django.conf import settings
 from django.urls import path
-from .views import BookingCreateView, BookingListView, MyReceiptsView, OrganizerRevenueView
+from . import async_views
+from .views import BookingCreateView, BookingCheckoutStatusView, BookingListView, MyReceiptsView, OrganizerBookingExportView, OrganizerRevenueView
 
 urlpatterns = [
     path('create/', BookingCreateView.as_view(), name='booking-create'),
-    path('my-bookings/', BookingListView.as_view(), name='booking-list'),
-    path('orders/my_receipts/', MyReceiptsView.as_view(), name='my_receipts'),
+    # ASYNC_READ_API swaps in the async versions of the read-only views (see event_booking/async_api.py)
+    path('<int:pk>/checkout/', async_views.booking_checkout_status if settings.ASYNC_READ_API else BookingCheckoutStatusView.as_view(), name='booking-checkout-status'),
+    path('my-bookings/', async_views.booking_list if settings.ASYNC_READ_API else BookingListView.as_view(), name='booking-list'),
+    path('orders/my_receipts/', async_views.my_receipts if settings.ASYNC_READ_API else MyReceiptsView.as_view(), name='my_receipts'),
     path('organizers/revenue/', OrganizerRevenueView.as_view(), name='organizer-revenue'),
+    path('organizers/export/', OrganizerBookingExportView.as_view(), name='organizer-booking-export'),
 
 
 ]
@@ -1,17 +1,76 @@
+import logging
+
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from .models import Booking
+from .models import ArchivedBookedTicket, ArchivedBooking, Booking, BookedTicket
 from .serializers import BookingCreateSerializer, BookingListSerializer
-from payments.utils import create_stripe_checkout_session  
+from payments.tasks import create_checkout_session_task
+from django.db import transaction
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.dateparse import parse_date
+from operator import attrgetter
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound
+from event_booking.db_router import ReplicaReadsMixin
+from event_booking.pagination import KeysetPagination
 from .serializers import BookingReceiptSerializer
+from .revenue import revenue_summary
+from .exports import FORMATS, export_rows, export_stream
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+
+
+
+
+
+
+logger = logging.getLogger(__name__)
+
+
+def wants_history(params):
+    return params.get('history') in ('1', 'true')
+
+
+def receipt_querysets(user, history=False):
+    models = (Booking, ArchivedBooking) if history else (Booking,)
+    return [model.objects.filter(user=user, status='paid').select_related('event').order_by('-booked_at') for model in models]
 
 
+def newest_first(bookings):
+    return sorted(bookings, key=attrgetter('booked_at'), reverse=True)
 
 
+CHECKOUT_POLL_SECONDS = 1
+CHECKOUT_LONG_POLL_MAX_SECONDS = 20
 
 
+def checkout_status_response(booking):
+    """Body and headers for a checkout status poll; a queued checkout gets a ``Retry-After`` hint."""
+    queued = booking.checkout_status == 'queued'
+    return {
+        "status": "success",
+        "message": "Checkout status fetched successfully.",
+        "data": {
+            "booking_id": booking.id,
+            "booking_status": booking.status,
+            "checkout_status": booking.checkout_status,
+            "checkout_url": booking.checkout_url,
+            "poll_after_seconds": CHECKOUT_POLL_SECONDS if queued else None,
+        }
+    }, {'Retry-After': str(CHECKOUT_POLL_SECONDS)} if queued else None
+
+
+def queue_checkout(booking_id):
+    try:
+        create_checkout_session_task.delay(booking_id)
+    except Exception as exc:
+        # Broker down: the booking stays queued and redispatch_queued_checkouts_task queues it later
+        logger.warning("Could not queue checkout for booking %s: %s", booking_id, exc)
+
 
 # ------------------------ CREATE Booking View ------------------------
 class BookingCreateView(generics.CreateAPIView):
@@ -23,33 +82,74 @@ class BookingCreateView(generics.CreateAPIView):
         serializer.is_valid(raise_exception=True)
         booking = serializer.save()
 
-        checkout_url = create_stripe_checkout_session(booking)
+        # Talking to Stripe happens on a Celery worker, not on this request
+        transaction.on_commit(lambda: queue_checkout(booking.id))
 
         return Response({
-            "message": "Booking successful. Proceed to payment.",
-            "checkout_url": checkout_url
+            "message": "Booking successful. Checkout is being prepared.",
+            "booking_id": booking.id,
+            "status_url": request.build_absolute_uri(reverse('booking-checkout-status', args=[booking.id])),
         }, status=status.HTTP_201_CREATED)
 
 
 
+# ------------------------ Booking Checkout Status ------------------------
+class BookingCheckoutStatusView(APIView):
+    """
+    Poll for the Stripe checkout URL of a booking.
+
+    Answers at once; while the session is still being created the response
+    carries ``Retry-After``. Long-polling (``?wait=<seconds>``) is served by the
+    async view (``async_views.booking_checkout_status``) so the wait doesn't hold
+    a sync worker.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        booking = get_object_or_404(Booking, pk=pk, user=request.user)
+        payload, headers = checkout_status_response(booking)
+        return Response(payload, status=status.HTTP_200_OK, headers=headers)
+
+
+
+
+
 # ------------------------ LIST User Bookings ------------------------
-class BookingListView(generics.ListAPIView):
+class BookingListView(ReplicaReadsMixin, generics.ListAPIView):
     serializer_class = BookingListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-booked_at', '-id')
 
     def get_queryset(self):
-        return Booking.objects.filter(user=self.request.user).order_by('-booked_at')
+        # Event and ticket types come in with the page: two queries however many bookings and lines
+        return Booking.objects.filter(user=self.request.user).select_related('event').prefetch_related(
+            Prefetch('tickets', queryset=BookedTicket.objects.select_related('ticket_type'))
+        )
+
+    def get_querysets(self):
+        # ?history=1 adds the archive tier (bookings/archive.py)
+        querysets = [self.get_queryset()]
+        if wants_history(self.request.query_params):
+            querysets.append(ArchivedBooking.objects.filter(user=self.request.user).select_related('event').prefetch_related(
+                Prefetch('tickets', queryset=ArchivedBookedTicket.objects.select_related('ticket_type'))
+            ))
+        return querysets
 
     def list(self, request, *args, **kwargs):
         try:
-            queryset = self.get_queryset()
-            serializer = self.get_serializer(queryset, many=True)
+            page = self.paginator.paginate_querysets(self.get_querysets(), request, view=self)
+            serializer = self.get_serializer(page, many=True)
             return Response({
                 "status": "success",
                 "message": "Bookings fetched successfully.",
-                "data": serializer.data
+                "data": serializer.data,
+                "next": self.paginator.get_next_link(),
             }, status=status.HTTP_200_OK)
 
+        except NotFound:
+            raise
+
         except Exception as e:
             return Response({
                 "status": "error",
@@ -61,13 +161,14 @@ class BookingListView(generics.ListAPIView):
 
 # ------------------------ Get Order/My Receipts ------------------------
 
-class MyReceiptsView(APIView):
+class MyReceiptsView(ReplicaReadsMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         try:
             user = request.user
-            bookings = Booking.objects.filter(user=user, status='paid').order_by('-booked_at')
+            querysets = receipt_querysets(user, wants_history(request.query_params))
+            bookings = newest_first(booking for queryset in querysets for booking in queryset)
             serializer = BookingReceiptSerializer(bookings, many=True)
 
             return Response({
@@ -98,21 +199,46 @@ class OrganizerRevenueView(APIView):
                 "message": "Permission denied. Only organizers can access revenue data."
             }, status=status.HTTP_403_FORBIDDEN)
 
+        params = request.query_params
+        try:
+            start = parse_date(params['start']) if params.get('start') else None
+            end = parse_date(params['end']) if params.get('end') else None
+        except ValueError:
+            start = end = None
+        group_by = params.get('group_by')
+        if (params.get('start') and start is None) or (params.get('end') and end is None) \
+                or group_by not in (None, 'event', 'day') or not (params.get('event') or '0').isdigit():
+            return Response({
+                "status": "error",
+                "message": "Use YYYY-MM-DD for start/end, a numeric event id, and group_by=event or group_by=day."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            organizer_bookings = Booking.objects.filter(event__organizer=user, status='paid')
+            # Reads the pre-aggregated rollup, so the cost doesn't grow with booking history
+            summary, breakdown = revenue_summary(
+                user, start=start, end=end, event_id=params.get('event'), group_by=group_by
+            )
 
-            total_revenue = sum(booking.organizer_revenue for booking in organizer_bookings)
-            total_platform_fee = sum(booking.platform_fee for booking in organizer_bookings)
-            total_bookings = organizer_bookings.count()
+            data = {
+                'total_bookings': summary['total_bookings'] or 0,
+                'total_revenue': float(summary['total_revenue'] or 0),
+                'total_platform_fee': float(summary['total_platform_fee'] or 0),
+            }
+            if breakdown is not None:
+                data['breakdown'] = [
+                    {
+                        **{key: row[key] for key in row if not key.startswith('total_')},
+                        'total_bookings': row['total_bookings'],
+                        'total_revenue': float(row['total_revenue']),
+                        'total_platform_fee': float(row['total_platform_fee']),
+                    }
+                    for row in breakdown
+                ]
 
             return Response({
                 "status": "success",
                 "message": "Organizer revenue fetched successfully.",
-                "data": {
-                    'total_bookings': total_bookings,
-                    'total_revenue': float(total_revenue),
-                    'total_platform_fee': float(total_platform_fee),
-                }
+                "data": data
             }, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -121,3 +247,48 @@ class OrganizerRevenueView(APIView):
                 "message": "Failed to fetch revenue.",
                 "error": str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ------------------------ Export Bookings (Organizer) ------------------------
+class OrganizerBookingExportView(APIView):
+    """
+    Streams every ticket line of the organizer's bookings as CSV (default) or
+    JSON Lines: ``?output=csv|jsonl&gzip=1&event=&status=&start=&end=``;
+    ``?history=1`` adds the archived bookings after the current ones.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        if user.role != 'organizer':
+            return Response({
+                "status": "error",
+                "message": "Permission denied. Only organizers can export bookings."
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        # Not ?format=, which DRF keeps for picking a renderer
+        params = request.query_params
+        fmt = params.get('output', 'csv')
+        try:
+            start = parse_date(params['start']) if params.get('start') else None
+            end = parse_date(params['end']) if params.get('end') else None
+        except ValueError:
+            start = end = None
+        if fmt not in FORMATS or (params.get('start') and start is None) or (params.get('end') and end is None) \
+                or params.get('status', 'paid') not in dict(Booking.STATUS_CHOICES) or not (params.get('event') or '0').isdigit():
+            return Response({
+                "status": "error",
+                "message": "Use output=csv or output=jsonl, YYYY-MM-DD for start/end, a booking status and a numeric event id."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        compress = params.get('gzip') in ('1', 'true')
+        rows = export_rows(user, event_id=params.get('event'), status=params.get('status'), start=start, end=end,
+                           history=wants_history(request.query_params))
+        filename = f"bookings-{timezone.localdate().isoformat()}.{fmt}" + ('.gz' if compress else '')
+
+        response = StreamingHttpResponse(
+            export_stream(rows, fmt, compress=compress),
+            content_type='application/gzip' if compress else ('text/csv' if fmt == 'csv' else 'application/x-ndjson'),
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
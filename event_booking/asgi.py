@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'event_booking.settings')
+# Under an ASGI server the read-only hot endpoints run as async views (event_booking/async_api.py)
+os.environ.setdefault('ASYNC_READ_API', 'true')
+# Async views run each request on its own thread, so per-thread persistent connections would
+# pile up; with DJANGO_ASGI set, settings.py defaults DB_CONN_MODE to pool and refuses persistent
+os.environ['DJANGO_ASGI'] = 'true'
 
 application = get_asgi_application()
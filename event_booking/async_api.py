@@ -0,0 +1,71 @@
+"""
+Plumbing for the async read endpoints, routed in place of their DRF views
+when ``ASYNC_READ_API`` is on (the default under ``asgi.py``).
+
+DRF's ``APIView`` only dispatches synchronously, so these are plain Django
+async views. They reuse the DRF view classes for querysets, paginators and
+serializers, and do their database and cache I/O with ``await`` so a waiting
+request doesn't hold a worker thread. Responses match the DRF ones.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+_jwt = JWTAuthentication()
+
+
+def json_response(payload, status=status.HTTP_200_OK, headers=None):
+    # DRF's encoder, so decimals, datetimes and lazy strings render as they do through Response
+    return JsonResponse(payload, status=status, encoder=JSONEncoder, safe=False, headers=headers)
+
+
+async def authenticate(request):
+    """The user behind the request's JWT, or ``None`` without one; raises ``AuthenticationFailed`` for a bad token."""
+    header = _jwt.get_header(request)
+    raw_token = _jwt.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    # Signature and expiry checks are CPU only; the user lookup is the one query
+    validated_token = _jwt.get_validated_token(raw_token)
+    return await sync_to_async(_jwt.get_user)(validated_token)
+
+
+def async_api_view(authenticated=True):
+    """
+    Wrap ``view(request, user)``: GET only, JWT-authenticated (or not at
+    all for public views), with DRF-style error bodies.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return json_response({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+            try:
+                user = None
+                if authenticated:
+                    user = await authenticate(request)
+                    if user is None:
+                        raise NotAuthenticated()
+                return await view(request, user, *args, **kwargs)
+            except APIException as exc:
+                headers = {'WWW-Authenticate': _jwt.authenticate_header(request)} if exc.status_code == 401 else None
+                detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+                return json_response(detail, exc.status_code, headers=headers)
+        return wrapper
+    return decorator
+
+
+def view_for(view_class, request, user=None):
+    """An instance of the DRF ``view_class`` set up for ``request`` without dispatching it."""
+    view = view_class()
+    view.args, view.kwargs, view.format_kwarg = (), {}, None
+    view.request = Request(request, authenticators=())
+    view.request.user = user or AnonymousUser()
+    return view
@@ -0,0 +1,237 @@
+"""
+Two-tier cache: a small in-process LRU in front of the shared Django cache
+(Redis).
+
+``TieredCache.get_or_set`` coalesces concurrent misses on a key. Within a
+process the first caller computes and the rest wait for its result; across
+processes a short-lived lock key in Redis elects one computer while the
+others poll for the value it writes.
+
+``aget_or_set`` does the same for async views: Redis calls run in worker
+threads off the event loop, and concurrent misses in a process await one
+task.
+
+The shared tier fails open: if Redis is unreachable, reads miss and writes
+are skipped, so callers fall back to computing rather than erroring.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+
+from event_booking import metrics
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+cache_requests = metrics.counter(
+    'cache_requests_total', "Tiered cache lookups by cache, tier that answered and outcome.", ['cache', 'result'])
+
+
+class LocalLRU:
+    def __init__(self, max_entries, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (value, self.clock() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = MISSING
+
+
+class TieredCache:
+    def __init__(self, name, local_entries=1000, alias='default', lock_timeout=10, poll_interval=0.05):
+        self.name = name
+        self.alias = alias
+        self.local = LocalLRU(local_entries)
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._fill_tasks = {}
+        self._warned_at = 0
+
+    # ------------------------ Shared tier (fails open) ------------------------
+    def _shared(self, operation, *args, default=MISSING):
+        try:
+            return getattr(caches[self.alias], operation)(*args)
+        except Exception as exc:
+            # Log at most once a minute while the shared cache is down
+            if time.monotonic() - self._warned_at > 60:
+                self._warned_at = time.monotonic()
+                logger.warning("Shared cache unavailable for %s (%s); serving uncached.", self.name, exc)
+            return default
+
+    def shared_get(self, key):
+        return self._shared('get', key, MISSING)
+
+    def shared_version(self, key):
+        """Read a counter from the shared tier: 0 if unset, ``None`` if the tier is unreachable."""
+        return self._shared('get', key, 0, default=None)
+
+    def shared_set(self, key, value, timeout):
+        self._shared('set', key, value, timeout, default=None)
+
+    def shared_incr(self, key):
+        """Atomically increment a counter in the shared tier; ``None`` if it is unreachable."""
+        if self._shared('add', key, 0, None, default=None) is None:
+            return None
+        return self._shared('incr', key, default=None)
+
+    # ------------------------ Lookup ------------------------
+    def get_or_set(self, key, compute, timeout):
+        value = self.local.get(key)
+        if value is not MISSING:
+            cache_requests.inc(cache=self.name, result='local_hit')
+            return value
+
+        value = self.shared_get(key)
+        if value is not MISSING:
+            cache_requests.inc(cache=self.name, result='shared_hit')
+            self.local.set(key, value, timeout)
+            return value
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait(self.lock_timeout)
+            if flight.value is not MISSING:
+                cache_requests.inc(cache=self.name, result='coalesced')
+                return flight.value
+            return compute()
+
+        try:
+            flight.value = self._fill(key, compute, timeout)
+            return flight.value
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _fill(self, key, compute, timeout):
+        lock_key = f'{key}:filling'
+        if self._shared('add', lock_key, 1, self.lock_timeout, default=True):
+            cache_requests.inc(cache=self.name, result='miss')
+            try:
+                value = compute()
+                self.shared_set(key, value, timeout)
+            finally:
+                self._shared('delete', lock_key, default=None)
+        else:
+            # Another process is computing this key; wait for it rather than hitting the database too
+            value = self._wait_for(key)
+            if value is MISSING:
+                cache_requests.inc(cache=self.name, result='miss')
+                value = compute()
+            else:
+                cache_requests.inc(cache=self.name, result='coalesced')
+
+        self.local.set(key, value, timeout)
+        return value
+
+    def _wait_for(self, key):
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = self.shared_get(key)
+            if value is not MISSING:
+                return value
+        return MISSING
+
+    # ------------------------ Async lookup ------------------------
+    async def aget_or_set(self, key, compute, timeout):
+        """``get_or_set`` for async callers; ``compute`` is a coroutine function."""
+        value = self.local.get(key)
+        if value is not MISSING:
+            cache_requests.inc(cache=self.name, result='local_hit')
+            return value
+
+        value = await _off_loop(self.shared_get, key)
+        if value is not MISSING:
+            cache_requests.inc(cache=self.name, result='shared_hit')
+            self.local.set(key, value, timeout)
+            return value
+
+        # Tasks belong to a loop; WSGI runs each async view on a fresh one
+        loop = asyncio.get_running_loop()
+        task = self._fill_tasks.get((loop, key))
+        if task is None:
+            task = self._fill_tasks[(loop, key)] = loop.create_task(self._afill(key, compute, timeout))
+            task.add_done_callback(lambda _: self._fill_tasks.pop((loop, key), None))
+        else:
+            cache_requests.inc(cache=self.name, result='coalesced')
+        # A cancelled waiter must not cancel the fill the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _afill(self, key, compute, timeout):
+        lock_key = f'{key}:filling'
+        if await _off_loop(self._shared, 'add', lock_key, 1, self.lock_timeout, default=True):
+            cache_requests.inc(cache=self.name, result='miss')
+            try:
+                value = await compute()
+                await _off_loop(self.shared_set, key, value, timeout)
+            finally:
+                await _off_loop(self._shared, 'delete', lock_key, default=None)
+        else:
+            value = await self._await_shared(key)
+            if value is MISSING:
+                cache_requests.inc(cache=self.name, result='miss')
+                value = await compute()
+            else:
+                cache_requests.inc(cache=self.name, result='coalesced')
+
+        self.local.set(key, value, timeout)
+        return value
+
+    async def _await_shared(self, key):
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            value = await _off_loop(self.shared_get, key)
+            if value is not MISSING:
+                return value
+        return MISSING
+
+
+async def _off_loop(func, *args, **kwargs):
+    # Django's Redis backend is sync-only; thread_sensitive=False keeps it off the shared sync thread
+    return await sync_to_async(func, thread_sensitive=False)(*args, **kwargs)
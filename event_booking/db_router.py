@@ -0,0 +1,182 @@
+"""
+Read-replica routing.
+
+Reads go to a replica only inside ``replica_reads()`` / ``areplica_reads()``,
+which the read-heavy views opt into (``ReplicaReadsMixin`` for DRF views).
+Everything else, including every write, anything inside a transaction and
+the whole booking and payment flow, stays on the primary.
+
+Read-your-writes: ``primary_pin_middleware`` pins a user to the primary for
+``DB_PRIMARY_PIN_SECONDS`` after any successful write request, so their next
+reads see it even if the replicas haven't caught up. Pins live in the shared
+cache; if it is unreachable, reads go to the primary.
+
+Lag: each replica's replication lag is checked at most every
+``DB_REPLICA_LAG_CHECK_SECONDS``. Replicas further behind than
+``DB_REPLICA_MAX_LAG_SECONDS``, or unreachable, are skipped until the next
+check; with none left, reads fall back to the primary.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_lag_checks = {}  # alias -> (checked at, fresh enough)
+_lag_checks_lock = threading.Lock()
+
+# Zero while the replica has replayed everything it received, so an idle primary doesn't read as lag
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+# ------------------------ Read-your-writes ------------------------
+def _pin_key(user_id):
+    return f'db:primary-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    if not settings.DATABASE_REPLICAS:
+        return
+    try:
+        cache.set(_pin_key(user_id), 1, settings.DB_PRIMARY_PIN_SECONDS)
+    except Exception as exc:
+        logger.warning("Could not pin user %s to the primary database (%s).", user_id, exc)
+
+
+def is_pinned(user):
+    if user is None or not user.is_authenticated:
+        return False
+    try:
+        return cache.get(_pin_key(user.pk)) is not None
+    except Exception:
+        # Can't tell whether they just wrote something; the primary is always current
+        return True
+
+
+@contextmanager
+def replica_reads(user=None):
+    """Let reads in this block go to a replica, unless ``user`` wrote something moments ago."""
+    token = _replica_reads.set(bool(settings.DATABASE_REPLICAS) and not is_pinned(user))
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@asynccontextmanager
+async def areplica_reads(user=None):
+    # The pin lookup is a Redis call, so it runs off the event loop
+    pinned = await sync_to_async(is_pinned, thread_sensitive=False)(user)
+    token = _replica_reads.set(bool(settings.DATABASE_REPLICAS) and not pinned)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaReadsMixin:
+    """For read-only DRF views: the handler's queries may be served by a replica."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Entered once the request is authenticated, so the pin check knows who is asking
+        self._replica_reads = replica_reads(request.user)
+        self._replica_reads.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica_block = getattr(self, '_replica_reads', None)
+        if replica_block is not None:
+            self._replica_reads = None
+            replica_block.__exit__(None, None, None)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def _pin_after_write(request, response):
+    # DRF copies the JWT user onto the Django request once the view authenticated it
+    user = getattr(request, 'user', None)
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 \
+            and user is not None and user.is_authenticated:
+        pin_to_primary(user.pk)
+
+
+@sync_and_async_middleware
+def primary_pin_middleware(get_response):
+    # Async-capable, so it doesn't push the async read views back onto a thread under ASGI
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            response = await get_response(request)
+            if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+                await sync_to_async(_pin_after_write)(request, response)
+            return response
+    else:
+        def middleware(request):
+            response = get_response(request)
+            _pin_after_write(request, response)
+            return response
+    return middleware
+
+
+# ------------------------ Lag ------------------------
+def replica_lag(alias):
+    """Seconds ``alias`` is behind the primary; 0 for backends without replication."""
+    replica = connections[alias]
+    if replica.vendor != 'postgresql':
+        return 0.0
+    with replica.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        return float(cursor.fetchone()[0] or 0)
+
+
+def replica_is_fresh(alias):
+    now = time.monotonic()
+    checked = _lag_checks.get(alias)
+    if checked and now - checked[0] < settings.DB_REPLICA_LAG_CHECK_SECONDS:
+        return checked[1]
+
+    try:
+        lag = replica_lag(alias)
+    except Exception as exc:
+        logger.warning("Replica %s unavailable (%s); reading from the primary.", alias, exc)
+        lag = None
+    fresh = lag is not None and lag <= settings.DB_REPLICA_MAX_LAG_SECONDS
+    if lag is not None and not fresh:
+        logger.warning("Replica %s is %.1fs behind; reading from the primary.", alias, lag)
+    with _lag_checks_lock:
+        _lag_checks[alias] = (now, fresh)
+    return fresh
+
+
+# ------------------------ Router ------------------------
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Reads inside a transaction must see that transaction's writes (and its row locks)
+        if not _replica_reads.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        fresh = [alias for alias in settings.DATABASE_REPLICAS if replica_is_fresh(alias)]
+        return random.choice(fresh) if fresh else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return db == DEFAULT_DB_ALIAS
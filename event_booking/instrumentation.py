@@ -0,0 +1,207 @@
+"""
+Per-request performance instrumentation.
+
+``instrumentation_middleware`` records, for every request, the wall time,
+the number of database queries and the time spent in them, the time spent
+rendering DRF serializers, and the time spent calling external services
+(SMTP). Each request is logged as one JSON line on the
+``event_booking.requests`` logger and folded into the metrics
+(``event_booking.metrics``) that ``metrics_view`` serves at ``/metrics``.
+
+Stripe is only called from Celery tasks, outside any request, so a
+request's ``external_ms`` never has a ``stripe`` entry. Stripe time is
+recorded by the worker in ``external_call_duration_seconds`` and the
+``stripe_*`` metrics, which are shared metrics: the worker writes them to
+Redis and ``/metrics`` on the web processes serves them.
+
+Requests that run more than ``REQUEST_QUERY_BUDGET`` queries are logged at
+WARNING and counted, so an N+1 that slips into an endpoint shows up in
+production rather than only in the query-count tests.
+
+Queries are seen through an execute wrapper installed on every database
+connection when it is opened, so queries an async view runs on worker
+threads are counted too. Time spent in the database while a serializer
+renders (lazy relations) counts towards both. A streaming response is
+measured up to the point it starts streaming.
+"""
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.mail.backends.smtp import EmailBackend
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.serializers import BaseSerializer
+
+from event_booking import metrics
+
+logger = logging.getLogger('event_booking.requests')
+
+_current = ContextVar('request_stats', default=None)
+
+request_duration = metrics.histogram(
+    'http_request_duration_seconds', "Wall time per request, by endpoint.", ['endpoint', 'method'])
+request_count = metrics.counter(
+    'http_requests_total', "Requests by endpoint and status code.", ['endpoint', 'method', 'status'])
+request_queries = metrics.histogram(
+    'http_request_db_queries', "Database queries per request, by endpoint.", ['endpoint'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+request_db_time = metrics.histogram(
+    'http_request_db_duration_seconds', "Database time per request, by endpoint.", ['endpoint'])
+request_serializer_time = metrics.histogram(
+    'http_request_serializer_duration_seconds', "Serializer rendering time per request, by endpoint.", ['endpoint'])
+over_budget = metrics.counter(
+    'http_requests_over_query_budget_total', "Requests that ran more than REQUEST_QUERY_BUDGET queries.", ['endpoint'])
+external_time = metrics.histogram(
+    'external_call_duration_seconds', "Calls to external services (Stripe, SMTP), in or out of a request, by any process.",
+    ['service'], shared=True)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.external_seconds = {}
+        self.serializing = False
+
+
+# ------------------------ Collectors ------------------------
+def record_external(service, seconds):
+    """Count ``seconds`` spent calling ``service`` towards the metrics and the current request, if any."""
+    external_time.observe(seconds, service=service)
+    stats = _current.get()
+    if stats is not None:
+        stats.external_seconds[service] = stats.external_seconds.get(service, 0.0) + seconds
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def _install_query_recorder(sender, connection, **kwargs):
+    # Reconnects reuse the same wrapper object, so install once
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _instrument_serializers():
+    original = BaseSerializer.data.fget
+    if getattr(original, 'instrumented', False):
+        return
+
+    def data(self):
+        stats = _current.get()
+        # Only the outermost .data: nested serializers render inside it
+        if stats is None or stats.serializing:
+            return original(self)
+        stats.serializing = True
+        started = time.perf_counter()
+        try:
+            return original(self)
+        finally:
+            stats.serializing = False
+            stats.serializer_seconds += time.perf_counter() - started
+
+    data.instrumented = True
+    # Serializer.data and ListSerializer.data reach this through super()
+    BaseSerializer.data = property(data)
+
+
+class TimedSMTPBackend(EmailBackend):
+    """Django's SMTP backend, with its sends counted as external time."""
+
+    def send_messages(self, email_messages):
+        started = time.perf_counter()
+        try:
+            return super().send_messages(email_messages)
+        finally:
+            record_external('smtp', time.perf_counter() - started)
+
+
+# ------------------------ Middleware ------------------------
+def _endpoint(request):
+    match = getattr(request, 'resolver_match', None)
+    # The URL pattern, not the path, so /api/events/42/ and /api/events/43/ are one series
+    return '/' + match.route if match is not None else 'unmatched'
+
+
+def _finish(request, response, stats, started):
+    elapsed = time.perf_counter() - started
+    endpoint = _endpoint(request)
+    request_duration.observe(elapsed, endpoint=endpoint, method=request.method)
+    request_count.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    request_queries.observe(stats.queries, endpoint=endpoint)
+    request_db_time.observe(stats.db_seconds, endpoint=endpoint)
+    request_serializer_time.observe(stats.serializer_seconds, endpoint=endpoint)
+
+    budget_exceeded = stats.queries > settings.REQUEST_QUERY_BUDGET
+    if budget_exceeded:
+        over_budget.inc(endpoint=endpoint)
+    logger.log(logging.WARNING if budget_exceeded else logging.INFO, json.dumps({
+        'endpoint': endpoint,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round(elapsed * 1000, 2),
+        'db_queries': stats.queries,
+        'db_ms': round(stats.db_seconds * 1000, 2),
+        'serializer_ms': round(stats.serializer_seconds * 1000, 2),
+        'external_ms': {service: round(seconds * 1000, 2) for service, seconds in stats.external_seconds.items()},
+        'over_query_budget': budget_exceeded,
+    }))
+
+
+@sync_and_async_middleware
+def instrumentation_middleware(get_response):
+    connection_created.connect(_install_query_recorder, dispatch_uid='event_booking.instrumentation')
+    # ...and on this thread's connections opened before the middleware was loaded
+    for connection in connections.all(initialized_only=True):
+        _install_query_recorder(None, connection)
+    _instrument_serializers()
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            stats, started = RequestStats(), time.perf_counter()
+            token = _current.set(stats)
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            _finish(request, response, stats, started)
+            return response
+    else:
+        def middleware(request):
+            stats, started = RequestStats(), time.perf_counter()
+            token = _current.set(stats)
+            try:
+                response = get_response(request)
+            finally:
+                _current.reset(token)
+            _finish(request, response, stats, started)
+            return response
+    return middleware
+
+
+# ------------------------ /metrics ------------------------
+def metrics_view(request):
+    """Prometheus text exposition of this process's metrics and the shared ones; needs ``Bearer <METRICS_TOKEN>`` when that is set."""
+    if settings.METRICS_TOKEN:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not constant_time_compare(supplied, settings.METRICS_TOKEN):
+            return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,249 @@
+"""
+Metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are registered once by name and shared by
+every caller in the process; ``render()`` dumps them all.
+
+Metrics registered with ``shared=True`` live in a Redis hash per metric
+(``METRICS_REDIS_URL``) instead of process memory. Those are the ones
+written by Celery workers (the hold sweeper, Stripe calls), which serve no
+HTTP: every process adds to the same series and ``/metrics`` on any web
+process reads them back. The store fails open; while Redis is unreachable
+shared writes are dropped and shared series are left out of the scrape.
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_registry = {}
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {sorted(labelnames)}, got {sorted(labels)}.")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _escape(value):
+    # The exposition format's escapes for label values: URL patterns can hold backslashes and quotes
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    # The Redis store hands floats back; keep whole counts looking like counts
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+# ------------------------ Value stores ------------------------
+class _LocalValues:
+    """One metric's values in process memory, keyed by (label values..., part)."""
+
+    def __init__(self, name):
+        self._values = {}
+
+    def add(self, field, amount):
+        with _lock:
+            self._values[field] = self._values.get(field, 0) + amount
+
+    def set(self, field, value):
+        with _lock:
+            self._values[field] = value
+
+    def get(self, field):
+        return self._values.get(field, 0)
+
+    def items(self):
+        with _lock:
+            return list(self._values.items())
+
+
+class LocalStore:
+    """In-memory stand-in for Redis, for ``METRICS_REDIS_URL=''`` (a single process) and tests."""
+
+    def __init__(self):
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def hincrbyfloat(self, name, key, amount):
+        with self._lock:
+            fields = self._hashes.setdefault(name, {})
+            fields[key] = float(fields.get(key, 0)) + amount
+            return fields[key]
+
+    def hset(self, name, key, value):
+        with self._lock:
+            self._hashes.setdefault(name, {})[key] = value
+
+    def hget(self, name, key):
+        return self._hashes.get(name, {}).get(key)
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._hashes.get(name, {}))
+
+
+_store = None
+_store_down_until = 0
+
+
+def get_shared_store():
+    global _store
+    if _store is None:
+        url = settings.METRICS_REDIS_URL
+        _store = redis.Redis.from_url(
+            url, decode_responses=True, socket_connect_timeout=0.5, socket_timeout=0.5,
+        ) if url else LocalStore()
+    return _store
+
+
+def set_shared_store(store):
+    """Use ``store`` (a Redis client or ``LocalStore``) for shared metrics; ``None`` rebuilds it from settings."""
+    global _store, _store_down_until
+    _store, _store_down_until = store, 0
+
+
+def _shared_call(operation, *args, default=None):
+    global _store_down_until
+    if time.monotonic() < _store_down_until:
+        return default
+    try:
+        return getattr(get_shared_store(), operation)(*args)
+    except redis.RedisError as exc:
+        # Don't pay a connect timeout on every write while Redis is down
+        _store_down_until = time.monotonic() + 30
+        logger.warning("Shared metrics store unavailable (%s); dropping shared metrics for 30s.", exc)
+        return default
+
+
+class _SharedValues:
+    """One metric's values in a Redis hash, so every process adds to the same series."""
+
+    def __init__(self, name):
+        self.redis_key = f'metrics:{name}'
+
+    def add(self, field, amount):
+        _shared_call('hincrbyfloat', self.redis_key, json.dumps(field), amount)
+
+    def set(self, field, value):
+        _shared_call('hset', self.redis_key, json.dumps(field), value)
+
+    def get(self, field):
+        return _number(float(_shared_call('hget', self.redis_key, json.dumps(field)) or 0))
+
+    def items(self):
+        stored = _shared_call('hgetall', self.redis_key, default={})
+        return [(tuple(json.loads(field)), _number(float(value))) for field, value in stored.items()]
+
+
+# ------------------------ Metrics ------------------------
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), shared=False):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = (_SharedValues if shared else _LocalValues)(name)
+
+    def samples(self):
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in self._values.items()]
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels))
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self._values.add(_label_key(self.labelnames, labels), amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        self._values.set(_label_key(self.labelnames, labels), value)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), shared=False, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, shared)
+        self.buckets = tuple(sorted(buckets))
+
+    # Stored as the non-cumulative count per bucket plus sum and count, under (label values..., part)
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self._values.add(key + (str(index),), 1)
+        self._values.add(key + ('sum',), value)
+        self._values.add(key + ('count',), 1)
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels) + ('count',))
+
+    def samples(self):
+        series = {}
+        for field, value in self._values.items():
+            series.setdefault(field[:-1], {})[field[-1]] = value
+        samples = []
+        for key, parts in series.items():
+            cumulative = 0
+            for index, bound in enumerate(self.buckets):
+                cumulative += parts.get(str(index), 0)
+                samples.append((f'{self.name}_bucket', _format_labels(self.labelnames, key, [('le', bound)]), cumulative))
+            samples.append((f'{self.name}_bucket', _format_labels(self.labelnames, key, [('le', '+Inf')]), parts.get('count', 0)))
+            samples.append((f'{self.name}_sum', _format_labels(self.labelnames, key), parts.get('sum', 0)))
+            samples.append((f'{self.name}_count', _format_labels(self.labelnames, key), parts.get('count', 0)))
+        return samples
+
+
+def _register(cls, name, documentation, labelnames, **kwargs):
+    with _lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, documentation, labelnames, **kwargs)
+    if not isinstance(metric, cls):
+        raise ValueError(f"Metric {name} is already registered as a {metric.kind}.")
+    return metric
+
+
+def counter(name, documentation, labelnames=(), shared=False):
+    return _register(Counter, name, documentation, labelnames, shared=shared)
+
+
+def gauge(name, documentation, labelnames=(), shared=False):
+    return _register(Gauge, name, documentation, labelnames, shared=shared)
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, shared=False):
+    return _register(Histogram, name, documentation, labelnames, shared=shared, buckets=buckets)
+
+
+def render():
+    lines = []
+    for name, metric in sorted(_registry.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        lines.extend(f'{sample}{labels} {value}' for sample, labels, value in metric.samples())
+    return '\n'.join(lines) + '\n'
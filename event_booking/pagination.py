@@ -0,0 +1,131 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are cut with ``WHERE (a, b) < (last_a, last_b)`` on the view's ordering
+instead of ``OFFSET``, so page 1000 costs the same as page 1 as long as an
+index covers the ordering. The cursor is the last row's ordering values,
+base64-encoded.
+"""
+import base64
+import json
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Views override this with ``keyset_ordering``; the last field must be unique (e.g. ``id``)
+    ordering = ('-id',)
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_query, page_size = self._page_query(queryset, request, view)
+        return self._cut_page(list(page_query), page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Same page, fetched through the async ORM
+        page_query, page_size = self._page_query(queryset, request, view)
+        return self._cut_page([row async for row in page_query], page_size)
+
+    def paginate_querysets(self, querysets, request, view=None):
+        """
+        Page through several querysets as if they were one, e.g. a hot table
+        and its archive: each contributes its own next page and the merged
+        rows are cut to one page. Row ids must be unique across them.
+        """
+        rows = []
+        for queryset in querysets:
+            page_query, page_size = self._page_query(queryset, request, view)
+            rows += page_query
+        return self._cut_page(self._merge(rows), page_size)
+
+    async def apaginate_querysets(self, querysets, request, view=None):
+        rows = []
+        for queryset in querysets:
+            page_query, page_size = self._page_query(queryset, request, view)
+            rows += [row async for row in page_query]
+        return self._cut_page(self._merge(rows), page_size)
+
+    def _merge(self, rows):
+        # Stable sorts from the last ordering field to the first, each in its own direction
+        for field, ordering in reversed(list(zip(self.fields, self.ordering))):
+            rows.sort(key=attrgetter(field), reverse=ordering.startswith('-'))
+        return rows
+
+    def _page_query(self, queryset, request, view):
+        self.request = request
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        page_size = self.get_page_size(request)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self._after(position))
+        # One row past the page tells whether there is a next one
+        return queryset.order_by(*self.ordering)[:page_size + 1], page_size
+
+    def _cut_page(self, rows, page_size):
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_position = [getattr(rows[-1], field) for field in self.fields] if self.has_next else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def _after(self, position):
+        # (a, b, c) past (x, y, z)  ==  a > x  OR  (a = x AND b > y)  OR  (a = x AND b = y AND c > z),
+        # with < instead of > for descending fields
+        after = Q()
+        for depth, (field, ordering) in enumerate(zip(self.fields, self.ordering)):
+            equal = {name: value for name, value in zip(self.fields[:depth], position)}
+            strict = 'lt' if ordering.startswith('-') else 'gt'
+            after |= Q(**equal, **{f'{field}__{strict}': position[depth]})
+        # The redundant bound on the leading column gives the planner an index range to scan
+        inclusive = 'lte' if self.ordering[0].startswith('-') else 'gte'
+        return Q(**{f'{self.fields[0]}__{inclusive}': position[0]}) & after
+
+    # ------------------------ Cursor encoding ------------------------
+    def encode_cursor(self, position):
+        values = json.dumps(position, default=lambda value: value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        return base64.urlsafe_b64encode(values.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [self._to_python(model, field, value) for field, value in zip(self.fields, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def _to_python(self, model, field, value):
+        try:
+            return model._meta.get_field(field).to_python(value)
+        except FieldDoesNotExist:
+            # An annotation such as a search rank; JSON already restored it
+            return value
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
@@ -0,0 +1,49 @@
+"""
+Query plan inspection for the hot-path regression tests.
+
+``sequential_scans(sql)`` runs ``EXPLAIN`` on a SELECT (a queryset, or SQL as
+captured by ``CaptureQueriesContext``) and returns the tables the plan reads
+in full. On PostgreSQL sequential scans are disabled for the EXPLAIN, so one
+still showing up means no index can serve the query at all; on a small test
+table the planner would otherwise rightly prefer a seq scan.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+_SEQUENTIAL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    # "SCAN t" reads the whole table; "SCAN t USING INDEX i" walks an index in order (ORDER BY ... LIMIT)
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! USING (?:COVERING )?INDEX)'),
+}
+
+
+def explain(sql, params=(), using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def sequential_scans(sql, params=(), using=DEFAULT_DB_ALIAS):
+    if hasattr(sql, 'query'):
+        using = sql.db
+        sql, params = sql.query.sql_with_params()
+    vendor = connections[using].vendor
+    if vendor not in _SEQUENTIAL_SCAN:
+        raise NotImplementedError(f"No plan parser for {vendor}.")
+    return _SEQUENTIAL_SCAN[vendor].findall(explain(sql, params, using))
+
+
+def captured_sequential_scans(captured_queries, using=DEFAULT_DB_ALIAS):
+    """Map each captured SELECT that reads a table in full to those tables."""
+    scans = {}
+    for query in captured_queries:
+        if query['sql'].lstrip().upper().startswith('SELECT'):
+            tables = sequential_scans(query['sql'], using=using)
+            if tables:
+                scans[query['sql']] = tables
+    return scans
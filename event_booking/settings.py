@@ -12,9 +12,11 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 from pathlib import Path
 from decimal import Decimal
+from django.core.exceptions import ImproperlyConfigured
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
@@ -43,10 +45,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'django_filters',
     'drf_yasg',
+    'django_celery_beat',
     'users',
     'events',
     'bookings',
@@ -70,17 +74,50 @@ load_dotenv(dotenv_path=env_path)
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+PAYMENT_GATEWAY = os.getenv("PAYMENT_GATEWAY", "payments.gateway.StripeGateway")
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")  # e.g. http://localhost:12111 for a local stripe-mock
+STRIPE_CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", "2"))
+STRIPE_READ_TIMEOUT = float(os.getenv("STRIPE_READ_TIMEOUT", "10"))
+STRIPE_MAX_CONNECTIONS = int(os.getenv("STRIPE_MAX_CONNECTIONS", "10"))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "1"))
+STRIPE_BREAKER_FAILURE_THRESHOLD = int(os.getenv("STRIPE_BREAKER_FAILURE_THRESHOLD", "5"))
+STRIPE_BREAKER_RESET_SECONDS = float(os.getenv("STRIPE_BREAKER_RESET_SECONDS", "30"))
 PLATFORM_FEE_PERCENTAGE = Decimal(os.getenv('PLATFORM_FEE_PERCENTAGE', '10.0'))
+# Stripe checkout sessions live at least 30 minutes, and one is never set to expire before its hold does,
+# so keep holds longer than that or every session would outlive the seats it is selling
+BOOKING_HOLD_TTL_MINUTES = int(os.getenv('BOOKING_HOLD_TTL_MINUTES', '35'))
+# The hold sweeper fails lapsed pending bookings this many at a time, every BOOKING_EXPIRY_INTERVAL_SECONDS
+BOOKING_EXPIRY_BATCH_SIZE = int(os.getenv('BOOKING_EXPIRY_BATCH_SIZE', '500'))
+BOOKING_EXPIRY_INTERVAL_SECONDS = int(os.getenv('BOOKING_EXPIRY_INTERVAL_SECONDS', '60'))
+# Rows one POST /api/events/import/ imports before asking the client to continue from start_line
+EVENT_IMPORT_MAX_ROWS = int(os.getenv('EVENT_IMPORT_MAX_ROWS', '5000'))
+# Beat evens out drained inventory shards of hot ticket types this often (events/sharding.py)
+INVENTORY_REBALANCE_INTERVAL_SECONDS = int(os.getenv('INVENTORY_REBALANCE_INTERVAL_SECONDS', '30'))
+# Holds on events without a capacity leave the event row alone; its counters are recounted this long after
+EVENT_COUNTER_RECOUNT_DELAY_SECONDS = int(os.getenv('EVENT_COUNTER_RECOUNT_DELAY_SECONDS', '5'))
+# Beat recounts every event's tickets_remaining / tickets_sold this often, repairing drift
+EVENT_COUNTER_RECONCILE_INTERVAL_SECONDS = int(os.getenv('EVENT_COUNTER_RECONCILE_INTERVAL_SECONDS', '3600'))
+# Held bookings still waiting for a checkout session after this long are queued again, this many per run
+CHECKOUT_REDISPATCH_AFTER_SECONDS = int(os.getenv('CHECKOUT_REDISPATCH_AFTER_SECONDS', '120'))
+CHECKOUT_REDISPATCH_BATCH_SIZE = int(os.getenv('CHECKOUT_REDISPATCH_BATCH_SIZE', '500'))
+# Stripe webhook inbox rows still pending after this long are queued again, this many per run
+WEBHOOK_REDISPATCH_AFTER_SECONDS = int(os.getenv('WEBHOOK_REDISPATCH_AFTER_SECONDS', '300'))
+WEBHOOK_REDISPATCH_BATCH_SIZE = int(os.getenv('WEBHOOK_REDISPATCH_BATCH_SIZE', '500'))
+# Paid and failed bookings move to the archive tables this many days after their event ends
+BOOKING_ARCHIVE_AFTER_DAYS = int(os.getenv('BOOKING_ARCHIVE_AFTER_DAYS', '90'))
 
 
 
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Outermost after security, so its timings cover the rest of the stack
+    'event_booking.instrumentation.instrumentation_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'event_booking.db_router.primary_pin_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -104,35 +141,136 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'event_booking.wsgi.application'
 
+# Requests running more queries than this are logged at WARNING and counted (event_booking/instrumentation.py)
+REQUEST_QUERY_BUDGET = int(os.getenv('REQUEST_QUERY_BUDGET', '30'))
+# Bearer token /metrics asks for; unset serves it to anyone who can reach it
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Redis for metrics every process adds to, Celery workers included (event_booking/metrics.py); empty keeps them in-process
+METRICS_REDIS_URL = os.getenv('METRICS_REDIS_URL', os.getenv('REDIS_CACHE_URL', 'redis://localhost:6379/1'))
+
+# manage.py test: the per-request JSON lines would drown the test output; tests read them with assertLogs
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        # Request records are already JSON
+        'message_only': {
+            'format': '%(message)s',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
         },
+        'requests': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message_only',
+        },
+        'null': {
+            'class': 'logging.NullHandler',
+        },
     },
     'loggers': {
-        'payments.views': {
+        'payments': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'bookings': {
             'handlers': ['console'],
             'level': 'INFO',
         },
+        'events': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'event_booking': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        # One JSON line per request; REQUEST_LOG_LEVEL=WARNING keeps only the ones over the query budget
+        'event_booking.requests': {
+            'handlers': ['null'] if TESTING else ['requests'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
     },
 }
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DB_CONN_MODE picks how workers get their connections:
+#   persistent - keep one per worker for DB_CONN_MAX_AGE seconds, health-checked before reuse
+#                (default under WSGI, refused under ASGI)
+#   pool       - a psycopg 3 pool per worker process (default under ASGI)
+#   pgbouncer  - persistent connections to a PgBouncer in transaction pooling mode
+#   none       - connect and disconnect on every request
+# Under ASGI persistent connections are kept per thread, and async views run on a fresh thread
+# per request, so each worker would open connections until Postgres runs out. asgi.py sets DJANGO_ASGI.
+DJANGO_ASGI = os.getenv('DJANGO_ASGI', 'false').lower() == 'true'
+DB_CONN_MODE = os.getenv('DB_CONN_MODE', 'pool' if DJANGO_ASGI else 'persistent')
+if DB_CONN_MODE not in ('persistent', 'pool', 'pgbouncer', 'none'):
+    raise ImproperlyConfigured(f"Unknown DB_CONN_MODE {DB_CONN_MODE!r}.")
+if DJANGO_ASGI and DB_CONN_MODE == 'persistent':
+    raise ImproperlyConfigured(
+        "DB_CONN_MODE=persistent leaks a connection per thread under ASGI; use pool, pgbouncer or none."
+    )
+if DB_CONN_MODE == 'pool':
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        raise ImproperlyConfigured(
+            'DB_CONN_MODE=pool needs psycopg 3 with its pool: pip install "psycopg[binary,pool]".'
+        ) from None
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'event_booking',
-        'USER': 'vivek',
-        'PASSWORD': 'vivek123',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.getenv('DB_NAME', 'event_booking'),
+        'USER': os.getenv('DB_USER', 'vivek'),
+        'PASSWORD': os.getenv('DB_PASSWORD', 'vivek123'),
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+        # Pools manage connection lifetime themselves and refuse CONN_MAX_AGE
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')) if DB_CONN_MODE in ('persistent', 'pgbouncer') else 0,
+        'CONN_HEALTH_CHECKS': DB_CONN_MODE in ('persistent', 'pgbouncer'),
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+        },
     }
 }
 
+if DB_CONN_MODE == 'pool':
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),  # seconds to wait for a free connection
+    }
+elif DB_CONN_MODE == 'pgbouncer':
+    # Transaction pooling may hand the next transaction another server connection, so
+    # named cursors (.iterator() on PostgreSQL) can't outlive the transaction that opened them
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Read replicas: DB_REPLICA_HOSTS=host[:port],... are streaming replicas of the database above
+# (same name and credentials). Only views that opt in read from them; see event_booking/db_router.py
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['event_booking.db_router.ReplicaRouter']
+DB_PRIMARY_PIN_SECONDS = float(os.getenv('DB_PRIMARY_PIN_SECONDS', '5'))  # reads stay on the primary this long after a write
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '5'))
+DB_REPLICA_LAG_CHECK_SECONDS = float(os.getenv('DB_REPLICA_LAG_CHECK_SECONDS', '2'))
+
 ALLOWED_HOSTS = ['*']  
 
 
@@ -160,6 +298,47 @@ AUTH_PASSWORD_VALIDATORS = [
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+# Seeded into django-celery-beat's tables when beat starts; tune them from the admin afterwards
+CELERY_BEAT_SCHEDULE = {
+    'release-expired-holds': {
+        'task': 'bookings.tasks.release_expired_holds_task',
+        'schedule': BOOKING_EXPIRY_INTERVAL_SECONDS,
+    },
+    'redispatch-queued-checkouts': {
+        'task': 'payments.tasks.redispatch_queued_checkouts_task',
+        'schedule': 60,
+    },
+    'redispatch-pending-webhooks': {
+        'task': 'payments.tasks.redispatch_pending_webhooks_task',
+        'schedule': 120,
+    },
+    'rebalance-inventory-shards': {
+        'task': 'events.tasks.rebalance_inventory_shards_task',
+        'schedule': INVENTORY_REBALANCE_INTERVAL_SECONDS,
+    },
+    'reconcile-event-counters': {
+        'task': 'events.tasks.reconcile_event_counters_task',
+        'schedule': EVENT_COUNTER_RECONCILE_INTERVAL_SECONDS,
+    },
+}
+
+
+# Cache (Redis, next to the Celery broker)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_CACHE_URL', 'redis://localhost:6379/1'),
+        'OPTIONS': {'socket_connect_timeout': 0.5, 'socket_timeout': 0.5},
+    }
+}
+# Public event pages: shared TTL, in-process LRU size, and how often each process re-reads the catalog version
+PUBLIC_EVENT_CACHE_TTL = int(os.getenv('PUBLIC_EVENT_CACHE_TTL', '60'))
+PUBLIC_EVENT_LOCAL_CACHE_SIZE = int(os.getenv('PUBLIC_EVENT_LOCAL_CACHE_SIZE', '1000'))
+PUBLIC_EVENT_VERSION_CHECK_SECONDS = float(os.getenv('PUBLIC_EVENT_VERSION_CHECK_SECONDS', '1'))
+
+# Serve the read-only hot endpoints from async views; asgi.py turns this on
+ASYNC_READ_API = os.getenv('ASYNC_READ_API', 'false').lower() in ('1', 'true', 'yes')
 
 
 # Internationalization
@@ -174,7 +353,7 @@ USE_I18N = True
 USE_TZ = True
 
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = 'event_booking.instrumentation.TimedSMTPBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -17,6 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from users.views import ResetPasswordHTMLView
+from event_booking.instrumentation import metrics_view
 
 
 urlpatterns = [
@@ -27,6 +28,7 @@ urlpatterns = [
     path('api/payments/', include('payments.urls')),
     path('payment/', include('payments.urls')),
     path('reset-password/<uuid:token>/', ResetPasswordHTMLView.as_view(), name='reset_password_html'),
+    path('metrics', metrics_view, name='metrics'),
 
 
 ]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Event, TicketType
+from .models import Event, TicketType, TicketTypeShard
 
 class TicketTypeInline(admin.TabularInline):
     model = TicketType
@@ -10,10 +10,17 @@ class EventAdmin(admin.ModelAdmin):
     list_display = ('title', 'organizer', 'category', 'start_time', 'end_time', 'status', 'capacity')
     list_filter = ('status', 'category', 'start_time')
     search_fields = ('title', 'description', 'location', 'organizer__username')
+    # Kept by bookings.inventory and reconcile_event_counters, never typed in
+    readonly_fields = ('tickets_remaining', 'tickets_sold', 'is_sold_out')
     inlines = [TicketTypeInline]
 
 @admin.register(TicketType)
 class TicketTypeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'event', 'price', 'quantity')
+    list_display = ('name', 'event', 'price', 'quantity', 'shard_count')
     list_filter = ('event',)
     search_fields = ('name', 'event__title')
+
+@admin.register(TicketTypeShard)
+class TicketTypeShardAdmin(admin.ModelAdmin):
+    list_display = ('ticket_type', 'index', 'quantity')
+    list_filter = ('ticket_type',)
@@ -0,0 +1,13 @@
+from event_booking.async_api import async_api_view, json_response, view_for
+from event_booking.db_router import areplica_reads
+from .cache import acached_catalog_page
+from .views import PublicEventListView
+
+
+# --------- Public Event Discovery (async) ---------
+@async_api_view(authenticated=False)
+async def public_event_list(request, user):
+    view = view_for(PublicEventListView, request)
+    async with areplica_reads():
+        payload = await acached_catalog_page(view.request, view.acatalog_page)
+    return json_response(payload)
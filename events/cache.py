@@ -0,0 +1,100 @@
+"""
+Response cache for public event discovery.
+
+Pages are cached under the normalized query string plus a catalog version.
+Any edit to a published event bumps the version of the ``all`` scope, and
+of the ``day:<date>`` scope for the days the event started on before and
+after the edit. A dated query (``?date=``) only depends on its own day, so an
+edit to some other day's event leaves it cached. Edits to events that
+weren't and aren't published touch nothing. Bumping a version orphans the
+old keys, which then simply expire.
+
+Seat counts (and so ``?available=`` and ``?sort=availability``) also change
+through bookings, which don't go through these signals, so entries still
+expire after ``PUBLIC_EVENT_CACHE_TTL``.
+"""
+import hashlib
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from event_booking.cache import LocalLRU, MISSING, TieredCache
+
+# Case-insensitive search terms; their case and spacing don't change the result
+TEXT_PARAMS = {'q', 'title', 'location', 'category'}
+
+catalog_cache = TieredCache('public_events', local_entries=settings.PUBLIC_EVENT_LOCAL_CACHE_SIZE)
+_local_versions = LocalLRU(max_entries=1000)
+
+
+def _version_key(scope):
+    return f'public-events:version:{scope}'
+
+
+def normalize_params(params):
+    items = []
+    for name in sorted(params):
+        value = params.get(name, '').strip()
+        if name in TEXT_PARAMS:
+            value = ' '.join(value.lower().split())
+        items.append((name, value))
+    return urlencode(items)
+
+
+def catalog_version(scope):
+    """Current version of ``scope``, re-read from Redis at most once a second; ``None`` if Redis is down."""
+    version = _local_versions.get(scope)
+    if version is MISSING:
+        version = catalog_cache.shared_version(_version_key(scope))
+        if version is None:
+            return None
+        _local_versions.set(scope, version, settings.PUBLIC_EVENT_VERSION_CHECK_SECONDS)
+    return version
+
+
+def catalog_key(request):
+    params = request.query_params
+    try:
+        day = parse_date(params.get('date', ''))
+    except ValueError:
+        day = None
+    scope = f'day:{day.isoformat()}' if day else 'all'
+    version = catalog_version(scope)
+    if version is None:
+        return None
+    # The host is part of the key because cached pages carry absolute "next" links
+    digest = hashlib.sha1(f'{request.get_host()}?{normalize_params(params)}'.encode()).hexdigest()
+    return f'public-events:{scope}:{version}:{digest}'
+
+
+def cached_catalog_page(request, compute):
+    key = catalog_key(request)
+    if key is None:
+        # Without the shared versions we can't tell whether an entry is stale
+        return compute()
+    return catalog_cache.get_or_set(key, compute, settings.PUBLIC_EVENT_CACHE_TTL)
+
+
+async def acached_catalog_page(request, compute):
+    # The version lookup may go to Redis, so it runs off the event loop too
+    key = await sync_to_async(catalog_key, thread_sensitive=False)(request)
+    if key is None:
+        return await compute()
+    return await catalog_cache.aget_or_set(key, compute, settings.PUBLIC_EVENT_CACHE_TTL)
+
+
+# ------------------------ Invalidation ------------------------
+def invalidate_catalog(start_times):
+    """Bump ``all`` and the day of every start time, once the current transaction commits."""
+    scopes = {'all'} | {f'day:{timezone.localtime(start_time).date().isoformat()}' for start_time in start_times if start_time}
+
+    def bump():
+        for scope in scopes:
+            catalog_cache.shared_incr(_version_key(scope))
+            _local_versions.delete(scope)
+
+    transaction.on_commit(bump)
@@ -0,0 +1,122 @@
+"""
+Availability counters on ``Event``.
+
+"Is it sold out" and "how many are left" are a column read on the event
+(``tickets_remaining``, ``tickets_sold`` and the generated ``is_sold_out``).
+
+For an event with a ``capacity`` they are moved by ``F()`` updates in the
+same transaction as every hold and restock (``bookings.inventory``): that
+conditional update is what enforces the capacity, at the cost of every
+buyer of the event queueing on its row. Events without a capacity, where
+ticket type stock is the only limit, keep their row off the hold path so
+sharded stock (``events.sharding``) isn't serialized again behind it:
+holds and restocks schedule ``recount_soon``, one recount a few seconds
+after the burst, and the counters trail the stock by that long.
+
+Anything that changes stock in bulk (organizer edits, imports) recounts the
+event with ``recount_events``, and ``reconcile_counters`` sweeps every event
+to catch drift from writes that went around both (admin, raw SQL).
+
+Lock order is always event row first, then ticket type rows, the same order
+an organizer edit takes them in.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+
+from .models import Event, TicketType
+
+logger = logging.getLogger(__name__)
+
+
+def event_of(lines):
+    """The event (id and capacity only) the ticket types in ``lines`` belong to."""
+    ticket_type_id = next(iter(lines))[0]
+    return Event.objects.only('id', 'capacity').filter(ticket_types__id=ticket_type_id).first()
+
+
+def count_hold(event, quantity):
+    """
+    Count ``quantity`` seats as sold, unless that would pass the event's
+    capacity; returns whether the hold may go ahead. Only an event with a
+    capacity is updated in line.
+    """
+    if not event.capacity:
+        recount_soon(event.id)
+        return True
+    return bool(Event.objects.filter(id=event.id, capacity__gte=F('tickets_sold') + quantity).update(
+        tickets_remaining=Greatest(F('tickets_remaining') - quantity, Value(0)),
+        tickets_sold=F('tickets_sold') + quantity,
+    ))
+
+
+def count_restock(event_id, quantity):
+    # Matches (and locks) the row only when the event has a capacity to enforce
+    if not Event.objects.filter(id=event_id, capacity__gt=0).update(
+        tickets_remaining=F('tickets_remaining') + quantity,
+        tickets_sold=Greatest(F('tickets_sold') - quantity, Value(0)),
+    ):
+        recount_soon(event_id)
+
+
+def recount_soon(event_id):
+    """
+    Recount ``event_id`` ``EVENT_COUNTER_RECOUNT_DELAY_SECONDS`` after the
+    current transaction commits. A key in the shared cache lets one recount
+    cover every hold in that window; it expires just before the recount runs,
+    so a hold committed after the recount read the stock schedules the next one.
+    """
+    transaction.on_commit(lambda: _schedule_recount(event_id))
+
+
+def _schedule_recount(event_id):
+    from .tasks import recount_event_counters_task
+
+    delay = settings.EVENT_COUNTER_RECOUNT_DELAY_SECONDS
+    try:
+        if cache.add(f'events:recount:{event_id}', 1, delay):
+            recount_event_counters_task.apply_async(args=[event_id], countdown=delay + 1)
+    except Exception as exc:
+        # Broker or cache down: the beat reconcile catches the counters up
+        logger.warning("Could not schedule a counter recount for event %s: %s", event_id, exc)
+
+
+def recount_events(event_ids):
+    """
+    Recompute the counters of ``event_ids`` from the inventory and booking
+    rows and fix the ones that drifted. Returns the events that had drifted,
+    with their old ``(remaining, sold)`` in ``drift``.
+    """
+    with transaction.atomic():
+        # With the event rows locked no hold or restock can move stock under the recount
+        list(Event.objects.select_for_update().filter(id__in=event_ids).values_list('id', flat=True))
+        drifted = list(
+            Event.objects.filter(id__in=event_ids).with_counted_stock()
+            .filter(~Q(tickets_remaining=F('counted_remaining')) | ~Q(tickets_sold=F('counted_sold')))
+            .only('id', 'tickets_remaining', 'tickets_sold')
+        )
+        for event in drifted:
+            event.drift = (event.tickets_remaining, event.tickets_sold)
+            event.tickets_remaining, event.tickets_sold = event.counted_remaining, event.counted_sold
+        Event.objects.bulk_update(drifted, ['tickets_remaining', 'tickets_sold'])
+    return drifted
+
+
+def reconcile_counters(batch_size=1000):
+    """Recount every event, ``batch_size`` events per transaction; returns how many had drifted."""
+    fixed, last_id = 0, 0
+    while True:
+        batch = list(Event.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            return fixed
+        for event in recount_events(batch):
+            logger.warning(
+                "Event %s counters drifted: remaining %s, sold %s; recounted %s and %s.",
+                event.id, *event.drift, event.tickets_remaining, event.tickets_sold,
+            )
+            fixed += 1
+        last_id = batch[-1]
@@ -0,0 +1,129 @@
+"""
+Bulk import of events with their ticket types.
+
+Input is JSON Lines (one event object per line) or CSV (one event per row,
+``ticket_types`` holding a JSON array). Rows are read as a stream, validated
+with ``EventSerializer`` and written a chunk at a time: one ``bulk_create``
+for the events and one for their ticket types, in one transaction per chunk.
+A bad row is reported with its line number and skipped; the rest of its
+chunk is still imported.
+
+Every chunk commits on its own, so an interrupted import is resumed by
+passing the reported ``last_line`` + 1 as ``start_line``. The API caps the
+rows one request imports (``EVENT_IMPORT_MAX_ROWS``) the same way: a longer
+upload stops there and is continued from ``start_line``.
+"""
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+
+from .cache import invalidate_catalog
+from .models import Event, TicketType
+from .serializers import EventSerializer
+
+FORMATS = ('jsonl', 'csv')
+
+
+def read_rows(lines, fmt, start_line=1):
+    """
+    Yield ``(line number, row)`` from an iterable of byte lines, starting at
+    ``start_line``. A row that can't be parsed comes back as a ``ValueError``.
+    """
+    text = codecs.iterdecode(lines, 'utf-8-sig', errors='replace')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            if reader.line_num < start_line:
+                continue
+            row = {field: value for field, value in row.items() if value not in (None, '')}
+            try:
+                row['ticket_types'] = json.loads(row.get('ticket_types', '[]'))
+            except ValueError:
+                row['ticket_types'] = ValueError("ticket_types must be a JSON array.")
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(text, start=1):
+        if number < start_line or not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, ValueError("Not valid JSON.")
+
+
+def _validate(row):
+    if isinstance(row, ValueError):
+        return None, {'non_field_errors': [str(row)]}
+    if isinstance(row, dict) and isinstance(row.get('ticket_types'), ValueError):
+        return None, {'ticket_types': [str(row['ticket_types'])]}
+    serializer = EventSerializer(data=row)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    return serializer.validated_data, None
+
+
+def _write_chunk(organizer, chunk):
+    events = [
+        Event(
+            organizer=organizer,
+            tickets_remaining=sum(ticket['quantity'] for ticket in data['ticket_types']),
+            **{field: value for field, value in data.items() if field != 'ticket_types'},
+        )
+        for data in chunk
+    ]
+    with transaction.atomic():
+        Event.objects.bulk_create(events)
+        TicketType.objects.bulk_create([
+            TicketType(event=event, **{field: value for field, value in ticket.items() if field != 'id'})
+            for event, data in zip(events, chunk) for ticket in data['ticket_types']
+        ])
+        # bulk_create sends no signals
+        published = [event.start_time for event in events if event.status == 'published']
+        if published:
+            invalidate_catalog(published)
+    return events
+
+
+def import_events(organizer, rows, batch_size=1000, max_errors=1000, max_rows=None, progress=None):
+    """
+    Import ``(line number, row)`` pairs from ``read_rows`` for ``organizer``.
+    Returns a report with the counts, up to ``max_errors`` row errors and the
+    last line committed; ``progress`` is called with that report after every
+    chunk. With ``max_rows``, stops after that many rows and reports
+    ``complete: False`` if there were more.
+    """
+    report = {'created_events': 0, 'created_ticket_types': 0, 'failed_rows': 0, 'errors': [], 'last_line': None, 'complete': True}
+    rows = iter(rows)
+    left = max_rows
+
+    while True:
+        if left == 0:
+            report['complete'] = next(rows, None) is None
+            return report
+        batch = list(islice(rows, batch_size if left is None else min(batch_size, left)))
+        if not batch:
+            return report
+        if left is not None:
+            left -= len(batch)
+
+        chunk = []
+        for number, row in batch:
+            data, errors = _validate(row)
+            if errors:
+                report['failed_rows'] += 1
+                if len(report['errors']) < max_errors:
+                    report['errors'].append({'line': number, 'errors': errors})
+            else:
+                chunk.append(data)
+
+        if chunk:
+            _write_chunk(organizer, chunk)
+            report['created_events'] += len(chunk)
+            report['created_ticket_types'] += sum(len(data['ticket_types']) for data in chunk)
+        report['last_line'] = batch[-1][0]
+        if progress:
+            progress(report)
@@ -0,0 +1,60 @@
+"""Synthetic catalog shared by the event benchmarks; seeded once and reused between runs."""
+import random
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from events.models import Event
+from users.models import CustomUser
+
+ADJECTIVES = ['Summer', 'Midnight', 'Acoustic', 'Electric', 'Grand', 'Underground', 'Open Air', 'Classic', 'Indie', 'Global']
+SUBJECTS = ['Jazz Night', 'Tech Meetup', 'Food Festival', 'Film Screening', 'Comedy Show', 'Art Fair',
+            'Marathon', 'Book Launch', 'Wine Tasting', 'Hackathon', 'Opera Gala', 'Startup Pitch']
+CITIES = ['Berlin', 'Bangalore', 'Barcelona', 'Boston', 'Lisbon', 'London', 'Mumbai', 'New York', 'Paris', 'Tokyo']
+CATEGORIES = ['music', 'technology', 'food', 'film', 'comedy', 'art', 'sports', 'books']
+
+
+def catalog_organizer():
+    organizer, _ = CustomUser.objects.get_or_create(
+        username='bench-search-organizer', defaults={'email': 'bench-search@example.com', 'role': 'organizer'}
+    )
+    return organizer
+
+
+def seed_catalog(total, batch_size, stdout):
+    organizer = catalog_organizer()
+    existing = Event.objects.filter(organizer=organizer).count()
+    rng = random.Random(existing)
+    now = timezone.now()
+    while existing < total:
+        size = min(batch_size, total - existing)
+        Event.objects.bulk_create([_fake_event(organizer, rng, now) for _ in range(size)], batch_size=batch_size)
+        existing += size
+        stdout.write(f"Seeded {existing}/{total} events", ending='\r')
+    stdout.write('')
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE events_event')
+    return organizer
+
+
+def drop_catalog():
+    organizer = catalog_organizer()
+    Event.objects.filter(organizer=organizer).delete()
+    organizer.delete()
+
+
+def _fake_event(organizer, rng, now):
+    subject = rng.choice(SUBJECTS)
+    start = now + timedelta(minutes=rng.randrange(365 * 24 * 60))
+    return Event(
+        organizer=organizer,
+        title=f"{rng.choice(ADJECTIVES)} {subject} #{rng.randrange(10_000)}",
+        description=f"{subject} with {rng.choice(ADJECTIVES).lower()} vibes in {rng.choice(CITIES)}.",
+        location=rng.choice(CITIES),
+        category=rng.choice(CATEGORIES),
+        start_time=start,
+        end_time=start + timedelta(hours=3),
+        status='published' if rng.random() < 0.8 else 'draft',
+    )
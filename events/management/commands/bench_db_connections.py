@@ -0,0 +1,58 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+# mode -> settings_dict overrides; "configured" measures DB_CONN_MODE as deployed
+MODES = {
+    'none': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+    'persistent': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True},
+    'configured': {},
+}
+
+
+class Command(BaseCommand):
+    help = "Measure the database connection cost per request: connect every request vs persistent connections."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Simulated requests per mode")
+        parser.add_argument('--mode', choices=MODES, action='append', help="Defaults to every mode")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"DB_CONN_MODE={settings.DB_CONN_MODE}, {connection.vendor} at {connection.settings_dict.get('HOST') or 'local'}")
+        for mode in options['mode'] or list(MODES):
+            connects, timings = self._run(MODES[mode], options['requests'])
+            self.stdout.write(
+                f"{mode:>10}: {connects:5d} connects | p50 {statistics.median(timings):7.2f} ms "
+                f"p95 {timings[int(len(timings) * 0.95)]:7.2f} ms mean {statistics.mean(timings):7.2f} ms per request"
+            )
+
+    def _run(self, overrides, requests):
+        connects = []
+
+        def count(**kwargs):
+            connects.append(1)
+
+        saved = {key: connection.settings_dict[key] for key in overrides}
+        connection.close()
+        connection.settings_dict.update(overrides)
+        connection_created.connect(count)
+        try:
+            timings = []
+            for _ in range(requests):
+                began = time.perf_counter()
+                # What Django does around every request: close_old_connections() on start and finish
+                request_started.send(sender=self.__class__)
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                request_finished.send(sender=self.__class__)
+                timings.append((time.perf_counter() - began) * 1000)
+        finally:
+            connection_created.disconnect(count)
+            connection.close()
+            connection.settings_dict.update(saved)
+        return len(connects), sorted(timings)
@@ -0,0 +1,67 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from event_booking.pagination import KeysetPagination
+from events.models import Event
+from events.serializers import EventSummarySerializer
+from events.views import PublicEventListView
+from ._synthetic_catalog import drop_catalog, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Benchmark deep pages of public event discovery: keyset cursor vs OFFSET (cache bypassed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1_000_000, help="Catalog size")
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--pages', type=int, nargs='+', default=[1, 10_000])
+        parser.add_argument('--runs', type=int, default=20, help="Timed runs per page")
+        parser.add_argument('--drop', action='store_true', help="Delete the synthetic catalog afterwards")
+
+    def handle(self, *args, **options):
+        seed_catalog(options['events'], options['batch_size'], self.stdout)
+        self.factory = APIRequestFactory()
+        size = options['page_size']
+        published = Event.objects.filter(status='published').defer('search_vector', 'description').order_by('start_time', 'id')
+
+        try:
+            for page in options['pages']:
+                offset = (page - 1) * size
+                params = {'page_size': size}
+                if offset:
+                    last = published.values_list('start_time', 'id')[offset - 1:offset].first()
+                    if last is None:
+                        self.stdout.write(f"page {page}: catalog too small, skipped")
+                        continue
+                    params['cursor'] = KeysetPagination().encode_cursor(list(last))
+
+                keyset = self._time(lambda: self._keyset_page(params), options['runs'])
+                offset_page = self._time(
+                    lambda: EventSummarySerializer(published.with_ticket_summary()[offset:offset + size], many=True).data, options['runs'])
+                self.stdout.write(
+                    f"page {page:>7}: keyset p50 {keyset[0]:8.2f} ms p95 {keyset[1]:8.2f} ms | "
+                    f"OFFSET p50 {offset_page[0]:8.2f} ms p95 {offset_page[1]:8.2f} ms"
+                )
+        finally:
+            if options['drop']:
+                drop_catalog()
+
+    def _keyset_page(self, params):
+        # The view's own page builder, without the response cache in front of it
+        view = PublicEventListView()
+        view.args, view.kwargs, view.format_kwarg = (), {}, None
+        view.request = view.initialize_request(self.factory.get('/api/public/events/', params))
+        return view.catalog_page()
+
+    def _time(self, fetch, runs):
+        timings = []
+        for _ in range(runs):
+            began = time.perf_counter()
+            fetch()
+            timings.append((time.perf_counter() - began) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))]
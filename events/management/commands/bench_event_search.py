@@ -0,0 +1,70 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from events.models import Event
+from events.search import search_events, uses_postgres_search
+from ._synthetic_catalog import drop_catalog, seed_catalog
+
+# (label, free text, fuzzy filters); typos are deliberate
+SEARCHES = [
+    ('free text', 'jazz berlin', {}),
+    ('title', None, {'title': 'hackathon'}),
+    ('title typo', None, {'title': 'hakathon'}),
+    ('location', None, {'location': 'lisbon'}),
+    ('location typo', None, {'location': 'barcelna'}),
+    ('title + category', None, {'title': 'wine', 'category': 'food'}),
+]
+
+
+class Command(BaseCommand):
+    help = "Benchmark public event search against a synthetic catalog (reused between runs)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1_000_000, help="Catalog size")
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--runs', type=int, default=20, help="Timed runs per search")
+        parser.add_argument('--drop', action='store_true', help="Delete the synthetic catalog afterwards")
+
+    def handle(self, *args, **options):
+        seed_catalog(options['events'], options['batch_size'], self.stdout)
+
+        self.stdout.write(f"Backend: {connection.vendor} ({'full-text + trigram' if uses_postgres_search() else 'substring fallback'})")
+        try:
+            for label, q, fuzzy in SEARCHES:
+                legacy = self._time(lambda: self._legacy(q, fuzzy), options['runs'])
+                ranked = self._time(lambda: list(search_events(self._published(), q=q, **fuzzy)[:20]), options['runs'])
+                self.stdout.write(
+                    f"{label:>18}: icontains p50 {legacy[0]:8.2f} ms p95 {legacy[1]:8.2f} ms | "
+                    f"search p50 {ranked[0]:8.2f} ms p95 {ranked[1]:8.2f} ms"
+                )
+            if connection.vendor == 'postgresql':
+                label, q, fuzzy = SEARCHES[2]
+                self.stdout.write(f"\nPlan for '{label}':\n" + search_events(self._published(), q=q, **fuzzy)[:20].explain(analyze=True))
+        finally:
+            if options['drop']:
+                drop_catalog()
+
+    def _published(self):
+        return Event.objects.filter(status='published').defer('search_vector')
+
+    def _legacy(self, q, fuzzy):
+        # What PublicEventListView did before: ILIKE '%term%' on every filter
+        queryset = self._published()
+        for field, term in fuzzy.items():
+            queryset = queryset.filter(**{f'{field}__icontains': term})
+        if q:
+            for word in q.split():
+                queryset = queryset.filter(title__icontains=word)
+        return list(queryset[:20])
+
+    def _time(self, search, runs):
+        timings = []
+        for _ in range(runs):
+            began = time.perf_counter()
+            search()
+            timings.append((time.perf_counter() - began) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))]
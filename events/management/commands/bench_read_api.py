@@ -0,0 +1,87 @@
+import statistics
+import threading
+import time
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+# Read-only hot endpoints; the booking ones need --token
+PATHS = {
+    'public-events': ('/api/public/events/?page_size=20', False),
+    'my-bookings': ('/api/bookings/my-bookings/?page_size=20', True),
+    'my-receipts': ('/api/bookings/orders/my_receipts/', True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the read-only endpoints of running deployments and compare them, e.g. "
+        "--target wsgi=http://localhost:8000 --target asgi=http://localhost:8001"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, help="label=base URL; repeat to compare deployments")
+        parser.add_argument('--endpoint', choices=PATHS, action='append', help="Defaults to every endpoint the token allows")
+        parser.add_argument('--token', help="JWT access token for the booking endpoints")
+        parser.add_argument('--concurrency', type=int, default=50, help="Simultaneous clients")
+        parser.add_argument('--duration', type=float, default=20, help="Seconds per endpoint and target")
+        parser.add_argument('--timeout', type=float, default=10)
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            label, _, url = target.partition('=')
+            if not url:
+                raise CommandError(f"--target must look like label=http://host:port, not {target!r}.")
+            targets.append((label, url.rstrip('/')))
+        endpoints = options['endpoint'] or [name for name, (_, needs_token) in PATHS.items() if options['token'] or not needs_token]
+
+        for endpoint in endpoints:
+            path, needs_token = PATHS[endpoint]
+            if needs_token and not options['token']:
+                raise CommandError(f"{endpoint} needs --token.")
+            headers = {'Authorization': f"Bearer {options['token']}"} if needs_token else {}
+            for label, base in targets:
+                result = self._run(base + path, headers, options)
+                self.stdout.write(
+                    f"{endpoint:>14} {label:>8}: {result['throughput']:8.1f} req/s | p50 {result['p50']:7.1f} ms "
+                    f"p95 {result['p95']:7.1f} ms p99 {result['p99']:7.1f} ms | {result['errors']} errors"
+                )
+
+    def _run(self, url, headers, options):
+        deadline = time.monotonic() + options['duration']
+        timings, errors, lock = [], [0], threading.Lock()
+
+        def client():
+            # One keep-alive connection per simulated client
+            session = requests.Session()
+            while time.monotonic() < deadline:
+                began = time.perf_counter()
+                try:
+                    ok = session.get(url, headers=headers, timeout=options['timeout']).status_code == 200
+                except requests.RequestException:
+                    ok = False
+                elapsed = (time.perf_counter() - began) * 1000
+                with lock:
+                    if ok:
+                        timings.append(elapsed)
+                    else:
+                        errors[0] += 1
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=client) for _ in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        completed = len(timings)
+        timings = sorted(timings) or [0.0]
+        return {
+            'throughput': completed / elapsed,
+            'p50': statistics.median(timings),
+            'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+            'p99': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+            'errors': errors[0],
+        }
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from events.importer import FORMATS, import_events, read_rows
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Bulk import events with their ticket types from a JSON Lines or CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--organizer', type=int, required=True, help="Organizer (user id) the events belong to")
+        parser.add_argument('--format', dest='fmt', choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per transaction")
+        parser.add_argument('--start-line', type=int, default=1, help="Resume from this line (last committed line + 1)")
+
+    def handle(self, *args, **options):
+        organizer = CustomUser.objects.filter(pk=options['organizer'], role='organizer').first()
+        if organizer is None:
+            raise CommandError(f"No organizer with id {options['organizer']}.")
+        fmt = options['fmt'] or ('csv' if options['path'].endswith('.csv') else 'jsonl')
+
+        with open(options['path'], 'rb') as lines:
+            report = import_events(organizer, read_rows(lines, fmt, start_line=options['start_line']),
+                                   batch_size=options['batch_size'], progress=self._progress)
+
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created_events']} events and {report['created_ticket_types']} ticket types; "
+            f"{report['failed_rows']} rows failed. Last line: {report['last_line']}."
+        ))
+
+    def _progress(self, report):
+        # Enough to resume with --start-line if the import is interrupted
+        self.stdout.write(f"Committed through line {report['last_line']} ({report['created_events']} events).")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from events.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Recount every event's availability counters from its inventory and bookings, fixing any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Events recounted per transaction")
+
+    def handle(self, *args, **options):
+        fixed = reconcile_counters(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Counters reconciled; {fixed} events had drifted."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from events.models import TicketType
+from events.sharding import rebalance_drained_shards, shard_ticket_type
+
+
+class Command(BaseCommand):
+    help = "Split a ticket type's stock across N counter shards (0 collapses them), or rebalance drained shards."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ticket_type_id', nargs='?', type=int)
+        parser.add_argument('--shards', type=int, default=8)
+        parser.add_argument('--rebalance', action='store_true', help="Even out drained shards of every sharded ticket type")
+
+    def handle(self, *args, **options):
+        if options['rebalance']:
+            moved = rebalance_drained_shards()
+            self.stdout.write(self.style.SUCCESS(f"Rebalanced {len(moved)} ticket type(s)."))
+            return
+
+        if options['ticket_type_id'] is None:
+            raise CommandError("Pass a ticket type id or --rebalance.")
+        if options['shards'] < 0:
+            raise CommandError("--shards must be 0 or more.")
+
+        try:
+            ticket_type = shard_ticket_type(options['ticket_type_id'], options['shards'])
+        except TicketType.DoesNotExist:
+            raise CommandError(f"Ticket type {options['ticket_type_id']} not found.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{ticket_type.name}: {ticket_type.available_quantity} tickets across {ticket_type.shard_count} shard(s)."
+        ))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_remove_tickettype_capacity_event_capacity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tickettype',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0, help_text="Number of inventory shards holding this ticket type's stock (0 keeps it on this row)"),
+        ),
+        migrations.CreateModel(
+            name='TicketTypeShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('ticket_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='events.tickettype')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ticket_type', 'index'), name='unique_ticket_type_shard')],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:08
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# PostgreSQL only: the trigger keeps search_vector in step with every write
+# (including bulk ones), GIN indexes serve full-text and trigram matching.
+CREATE_SEARCH_SQL = """
+CREATE OR REPLACE FUNCTION events_event_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.category, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.location, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER events_event_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, location, category ON events_event
+    FOR EACH ROW EXECUTE FUNCTION events_event_search_vector_update();
+
+UPDATE events_event SET title = title;
+
+CREATE INDEX event_search_vector_gin ON events_event USING gin (search_vector);
+CREATE INDEX event_title_trgm ON events_event USING gin (title gin_trgm_ops);
+CREATE INDEX event_location_trgm ON events_event USING gin (location gin_trgm_ops);
+CREATE INDEX event_category_trgm ON events_event USING gin (category gin_trgm_ops);
+"""
+
+DROP_SEARCH_SQL = """
+DROP INDEX IF EXISTS event_category_trgm;
+DROP INDEX IF EXISTS event_location_trgm;
+DROP INDEX IF EXISTS event_title_trgm;
+DROP INDEX IF EXISTS event_search_vector_gin;
+DROP TRIGGER IF EXISTS events_event_search_vector_trigger ON events_event;
+DROP FUNCTION IF EXISTS events_event_search_vector_update();
+"""
+
+
+def create_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SEARCH_SQL)
+
+
+def drop_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_tickettype_shards'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='event',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_objects, drop_search_objects),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    TicketType = apps.get_model('events', 'TicketType')
+    TicketTypeShard = apps.get_model('events', 'TicketTypeShard')
+    BookedTicket = apps.get_model('bookings', 'BookedTicket')
+
+    def total(queryset, group_by):
+        return Coalesce(Subquery(queryset.values(group_by).annotate(total=Sum('quantity')).values('total')[:1]), 0)
+
+    Event.objects.update(
+        tickets_remaining=total(TicketType.objects.filter(event=OuterRef('pk')), 'event')
+        + total(TicketTypeShard.objects.filter(ticket_type__event=OuterRef('pk')), 'ticket_type__event'),
+        tickets_sold=total(
+            BookedTicket.objects.filter(booking__event=OuterRef('pk'), booking__status__in=['pending', 'paid']), 'booking__event'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_hot_filter_indexes'),
+        ('events', '0006_hot_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='tickets_remaining',
+            field=models.PositiveIntegerField(default=0, help_text='Unsold stock across all ticket types'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='tickets_sold',
+            field=models.PositiveIntegerField(default=0, help_text='Seats held by pending or paid bookings'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['-tickets_remaining', 'start_time', 'id'], name='event_published_availability'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='is_sold_out',
+            field=models.GeneratedField(db_persist=True, expression=models.Q(('tickets_remaining', 0), models.Q(('capacity__gt', 0), ('tickets_sold__gte', models.F('capacity'))), _connector='OR'), output_field=models.BooleanField()),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
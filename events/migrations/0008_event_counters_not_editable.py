@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_event_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='tickets_remaining',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Unsold stock across all ticket types'),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='tickets_sold',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Seats held by pending or paid bookings'),
+        ),
+    ]
@@ -1,6 +1,52 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import F, Min, OuterRef, Prefetch, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from users.models import CustomUser
 
+def _total(queryset, group_by, field='quantity'):
+    return Coalesce(Subquery(
+        queryset.values(group_by).annotate(total=Sum(field)).values('total')[:1]
+    ), 0)
+
+
+class EventQuerySet(models.QuerySet):
+    def with_ticket_summary(self):
+        """Annotate ``min_price`` with a correlated subquery: one query for any number of events; seats come from the counters."""
+        return self.annotate(
+            min_price=Subquery(
+                TicketType.objects.filter(event=OuterRef('pk')).values('event').annotate(low=Min('price')).values('low')[:1]
+            ),
+        )
+
+    def with_counted_stock(self):
+        """
+        Annotate ``counted_remaining`` and ``counted_sold``: what the
+        ``tickets_remaining`` / ``tickets_sold`` counters should hold, summed
+        from the inventory and booking rows.
+        """
+        from bookings.models import ArchivedBookedTicket, BookedTicket
+
+        return self.annotate(
+            # Stock of sharded ticket types sits in their shard rows
+            counted_remaining=_total(TicketType.objects.filter(event=OuterRef('pk')), 'event')
+            + _total(TicketTypeShard.objects.filter(ticket_type__event=OuterRef('pk')), 'ticket_type__event'),
+            # Pending bookings hold their seats until paid or released (unless made before holds); old paid ones may be archived
+            counted_sold=_total(
+                BookedTicket.objects.filter(
+                    booking__event=OuterRef('pk'), booking__status__in=['pending', 'paid'], booking__holds_seats=True,
+                ), 'booking__event'
+            ) + _total(
+                ArchivedBookedTicket.objects.filter(booking__event=OuterRef('pk'), booking__status='paid'), 'booking__event'
+            ),
+        )
+
+    def with_ticket_types(self):
+        return self.prefetch_related(
+            Prefetch('ticket_types', queryset=TicketType.objects.prefetch_related('shards').order_by('id'))
+        )
+
+
 class Event(models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
@@ -17,20 +63,72 @@ class Event(models.Model):
     end_time = models.DateTimeField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
     capacity = models.PositiveIntegerField(help_text="Total maximum capacity for this event", default=0)
+    # Maintained in the same transaction as every hold and restock (bookings.inventory); see events/counters.py
+    tickets_remaining = models.PositiveIntegerField(default=0, editable=False, help_text="Unsold stock across all ticket types")
+    tickets_sold = models.PositiveIntegerField(default=0, editable=False, help_text="Seats held by pending or paid bookings")
+    is_sold_out = models.GeneratedField(
+        expression=Q(tickets_remaining=0) | Q(capacity__gt=0, tickets_sold__gte=F('capacity')),
+        output_field=models.BooleanField(),
+        db_persist=True,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger on PostgreSQL (migration 0005_event_search)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = EventQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            # Public discovery only ever looks at published events, by day or in start order
+            models.Index(fields=['start_time', 'id'], condition=Q(status='published'), name='event_published_start'),
+            # ?sort=availability on public discovery
+            models.Index(fields=['-tickets_remaining', 'start_time', 'id'], condition=Q(status='published'), name='event_published_availability'),
+        ]
 
     def __str__(self):
         return self.title
 
+    COUNTER_FIELDS = ('tickets_remaining', 'tickets_sold')
+
+    def save(self, *args, **kwargs):
+        # The counters move with every hold and restock; writing back the values this instance
+        # loaded would undo any that happened since, so a plain save() leaves them out
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and not field.generated and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class TicketType(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='ticket_types')
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=8, decimal_places=2)
     quantity = models.PositiveIntegerField()
+    shard_count = models.PositiveSmallIntegerField(default=0, help_text="Number of inventory shards holding this ticket type's stock (0 keeps it on this row)")
 
 
     def __str__(self):
         return f"{self.name} - {self.event.title}"
+
+    @property
+    def available_quantity(self):
+        if not self.shard_count:
+            return self.quantity
+        return self.quantity + sum(shard.quantity for shard in self.shards.all())
+
+
+class TicketTypeShard(models.Model):
+    ticket_type = models.ForeignKey(TicketType, on_delete=models.CASCADE, related_name='shards')
+    index = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ticket_type', 'index'], name='unique_ticket_type_shard'),
+        ]
+
+    def __str__(self):
+        return f"{self.ticket_type.name} shard {self.index} ({self.quantity})"
@@ -0,0 +1,58 @@
+"""
+Public event search.
+
+On PostgreSQL, free-text queries (``q``) hit ``Event.search_vector``. A
+trigger keeps that column up to date on every insert/update, and a GIN index
+covers it. ``title``, ``location`` and ``category`` match fuzzily through
+``pg_trgm`` word similarity, which is also backed by trigram GIN indexes.
+Results come back best match first.
+
+Other databases (SQLite in tests) fall back to case-insensitive substring
+matching over the same fields.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+
+SEARCH_CONFIG = 'english'
+FUZZY_FIELDS = ('title', 'location', 'category')
+
+
+def uses_postgres_search():
+    return connection.vendor == 'postgresql'
+
+
+def search_events(queryset, q=None, **fuzzy):
+    """
+    Filter ``queryset`` by a free-text ``q`` and by fuzzy ``title`` /
+    ``location`` / ``category`` terms. Blank terms are ignored. The result is
+    annotated with ``rank`` and ordered by it when any term was given.
+    """
+    fuzzy = {field: term for field, term in fuzzy.items() if field in FUZZY_FIELDS and term}
+    if not (q or fuzzy):
+        return queryset
+
+    if not uses_postgres_search():
+        return _substring_search(queryset, q, fuzzy)
+
+    rank = Value(0.0, output_field=FloatField())
+    if q:
+        query = SearchQuery(q, config=SEARCH_CONFIG, search_type='websearch')
+        queryset = queryset.filter(search_vector=query)
+        rank = rank + SearchRank(F('search_vector'), query)
+    for field, term in fuzzy.items():
+        # ``<%`` (word similarity) finds the term inside longer values and can use the trigram index
+        queryset = queryset.filter(**{f'{field}__trigram_word_similar': term})
+        rank = rank + TrigramWordSimilarity(term, field)
+
+    return queryset.annotate(rank=rank).order_by('-rank', 'start_time', 'id')
+
+
+def _substring_search(queryset, q, fuzzy):
+    if q:
+        queryset = queryset.filter(
+            Q(title__icontains=q) | Q(description__icontains=q) | Q(location__icontains=q) | Q(category__icontains=q)
+        )
+    for field, term in fuzzy.items():
+        queryset = queryset.filter(**{f'{field}__icontains': term})
+    return queryset.annotate(rank=Value(0.0, output_field=FloatField())).order_by('start_time', 'id')
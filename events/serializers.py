@@ -1,11 +1,35 @@
 from rest_framework import serializers
-from .models import Event, TicketType
+from django.db import transaction
+
+from bookings.models import ArchivedBookedTicket, BookedTicket
+from .counters import recount_events
+from .models import Event, TicketType, TicketTypeShard
+from .sharding import spread_across_shards
 
 class TicketTypeSerializer(serializers.ModelSerializer):
+    # Writable so an event update can say which existing ticket type an entry is
+    id = serializers.IntegerField(required=False)
+
     class Meta:
         model = TicketType
         fields = ['id', 'name', 'price', 'quantity']
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Sharded stock lives in the shard rows; report what is actually left
+        data['quantity'] = instance.available_quantity
+        return data
+
+class EventSummarySerializer(serializers.ModelSerializer):
+    # Expects Event.objects.with_ticket_summary()
+    min_price = serializers.DecimalField(max_digits=8, decimal_places=2, read_only=True, allow_null=True)
+    tickets_available = serializers.IntegerField(source='tickets_remaining', read_only=True)
+
+    class Meta:
+        model = Event
+        fields = ['id', 'title', 'location', 'category', 'start_time', 'end_time', 'status', 'capacity', 'min_price', 'tickets_available', 'is_sold_out']
+
+
 class EventSerializer(serializers.ModelSerializer):
     ticket_types = TicketTypeSerializer(many=True)
 
@@ -15,20 +39,92 @@ class EventSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         ticket_data = validated_data.pop('ticket_types')
-        event = Event.objects.create(**validated_data)
-        for ticket in ticket_data:
-            TicketType.objects.create(event=event, **ticket)
+        with transaction.atomic():
+            event = Event.objects.create(**validated_data)
+            for ticket in ticket_data:
+                ticket.pop('id', None)
+            # One insert and one recount however many ticket types; bulk writes send no signals
+            TicketType.objects.bulk_create([TicketType(event=event, **ticket) for ticket in ticket_data])
+            recount_events([event.id])
         return event
 
     def update(self, instance, validated_data):
-        ticket_data = validated_data.pop('ticket_types', [])
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        ticket_data = validated_data.pop('ticket_types', None)
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
 
-        # Update ticket types (you can enhance this)
-        instance.ticket_types.all().delete()
-        for ticket in ticket_data:
-            TicketType.objects.create(event=instance, **ticket)
+            # Left out of the request means left alone
+            if ticket_data is not None:
+                self._sync_ticket_types(instance, ticket_data)
+            # Bulk writes send no signals, so the ticket type changes above are counted here
+            recount_events([instance.id])
 
         return instance
+
+    def _sync_ticket_types(self, event, ticket_data):
+        """
+        Make the event's ticket types match ``ticket_data``: entries with an
+        ``id`` update that ticket type, entries without one are new, and
+        ticket types not listed are deleted. The statement count doesn't
+        depend on how many ticket types there are. Ticket types that have
+        bookings are never deleted.
+        """
+        # Locked, so concurrent holds can't change stock between the comparison and the write
+        existing = {ticket_type.id: ticket_type for ticket_type in event.ticket_types.select_for_update().order_by('id')}
+        shards = {}
+        if any(ticket_type.shard_count for ticket_type in existing.values()):
+            for shard in TicketTypeShard.objects.select_for_update().filter(ticket_type__event=event).order_by('ticket_type_id', 'index'):
+                shards.setdefault(shard.ticket_type_id, []).append(shard)
+
+        incoming_ids = [ticket['id'] for ticket in ticket_data if 'id' in ticket]
+        unknown = sorted(set(incoming_ids) - set(existing))
+        if unknown or len(incoming_ids) != len(set(incoming_ids)):
+            raise serializers.ValidationError({'ticket_types': f"Unknown or repeated ticket type ids: {unknown or incoming_ids}."})
+        if any(not {'name', 'price', 'quantity'} <= set(ticket) for ticket in ticket_data if 'id' not in ticket):
+            raise serializers.ValidationError({'ticket_types': "New ticket types need a name, price and quantity."})
+
+        removed = set(existing) - set(incoming_ids)
+        booked = sorted(
+            {name for model in (BookedTicket, ArchivedBookedTicket)
+             for name in model.objects.filter(ticket_type_id__in=removed).values_list('ticket_type__name', flat=True).distinct()}
+        ) if removed else []
+        if booked:
+            raise serializers.ValidationError({'ticket_types': f"Ticket types with bookings can't be removed: {', '.join(booked)}."})
+
+        changed, changed_shards, created = [], [], []
+        for ticket in ticket_data:
+            if 'id' not in ticket:
+                created.append(TicketType(event=event, **ticket))
+                continue
+
+            ticket_type = existing[ticket['id']]
+            stock = ticket_type.quantity + sum(shard.quantity for shard in shards.get(ticket_type.id, []))
+            before = (ticket_type.name, ticket_type.price, stock)
+            after = (ticket.get('name', before[0]), ticket.get('price', before[1]), ticket.get('quantity', before[2]))
+            if after == before:
+                continue
+
+            ticket_type.name, ticket_type.price = after[:2]
+            if ticket_type.shard_count and ticket_type.id in shards:
+                # Sharded stock lives in the shard rows: spread the new total over them
+                ticket_type.quantity = 0
+                changed_shards += spread_across_shards(shards[ticket_type.id], after[2])
+            else:
+                ticket_type.quantity = after[2]
+            changed.append(ticket_type)
+
+        # Bulk writes send no signals; the event.save() above already refreshed the public catalog
+        if changed:
+            TicketType.objects.bulk_update(changed, ['name', 'price', 'quantity'])
+        if changed_shards:
+            TicketTypeShard.objects.bulk_update(changed_shards, ['quantity'])
+        if created:
+            TicketType.objects.bulk_create(created)
+        if removed:
+            # Raw deletes: TicketType's per-row post_delete receivers would otherwise cost queries for every
+            # removed row. Their work is done once here: the catalog by event.save(), the counters by update().
+            # None of them has bookings (checked above), so their shards are all that points at them.
+            TicketTypeShard.objects.filter(ticket_type_id__in=removed)._raw_delete(TicketTypeShard.objects.db)
+            TicketType.objects.filter(event=event, id__in=removed)._raw_delete(TicketType.objects.db)
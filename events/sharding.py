@@ -0,0 +1,120 @@
+import random
+
+from django.db import transaction
+from django.db.models import Count, F, Min, Sum
+
+from .models import TicketType, TicketTypeShard
+
+
+def _spread(total, shards):
+    base, extra = divmod(total, shards)
+    return [base + (1 if index < extra else 0) for index in range(shards)]
+
+
+# ------------------------ Split / collapse stock ------------------------
+def shard_ticket_type(ticket_type_id, shards):
+    """
+    Move a ticket type's stock into ``shards`` independent counter rows.
+
+    ``shards=0`` collapses the counters back onto the ticket type row.
+    """
+    with transaction.atomic():
+        ticket_type = TicketType.objects.select_for_update().get(id=ticket_type_id)
+        existing = TicketTypeShard.objects.select_for_update().filter(ticket_type=ticket_type).order_by('index')
+        total = ticket_type.quantity + sum(shard.quantity for shard in existing)
+        TicketTypeShard.objects.filter(ticket_type=ticket_type).delete()
+
+        if shards:
+            TicketTypeShard.objects.bulk_create(
+                TicketTypeShard(ticket_type=ticket_type, index=index, quantity=quantity)
+                for index, quantity in enumerate(_spread(total, shards))
+            )
+            ticket_type.quantity = 0
+        else:
+            ticket_type.quantity = total
+
+        ticket_type.shard_count = shards
+        ticket_type.save(update_fields=['quantity', 'shard_count'])
+    return ticket_type
+
+
+def spread_across_shards(shards, total):
+    """Set one ticket type's (locked) shard rows to an even split of ``total``; returns the rows that changed."""
+    shards = sorted(shards, key=lambda shard: shard.index)
+    changed = []
+    for shard, quantity in zip(shards, _spread(total, len(shards))):
+        if shard.quantity != quantity:
+            shard.quantity = quantity
+            changed.append(shard)
+    return changed
+
+
+# ------------------------ Allocate / restock ------------------------
+def take_from_shards(ticket_type_id, shard_count, quantity):
+    """
+    Take ``quantity`` seats from one shard, starting at a random one so that
+    concurrent writers spread over different rows instead of queueing on one.
+    """
+    start = random.randrange(shard_count)
+    for offset in range(shard_count):
+        updated = TicketTypeShard.objects.filter(
+            ticket_type_id=ticket_type_id, index=(start + offset) % shard_count, quantity__gte=quantity
+        ).update(quantity=F('quantity') - quantity)
+        if updated:
+            return True
+    return _take_across_shards(ticket_type_id, quantity)
+
+
+def _take_across_shards(ticket_type_id, quantity):
+    # No single shard covers the line, but together they might: drain several under row locks.
+    with transaction.atomic():
+        shards = list(
+            TicketTypeShard.objects.select_for_update()
+            .filter(ticket_type_id=ticket_type_id, quantity__gt=0)
+            .order_by('index')
+        )
+        if sum(shard.quantity for shard in shards) < quantity:
+            return False
+
+        remaining = quantity
+        for shard in shards:
+            taken = min(shard.quantity, remaining)
+            shard.quantity -= taken
+            remaining -= taken
+            if not remaining:
+                break
+        TicketTypeShard.objects.bulk_update(shards, ['quantity'])
+    return True
+
+
+def return_to_shards(ticket_type_id, shard_count, quantity):
+    TicketTypeShard.objects.filter(
+        ticket_type_id=ticket_type_id, index=random.randrange(shard_count)
+    ).update(quantity=F('quantity') + quantity)
+
+
+# ------------------------ Rebalancing ------------------------
+def rebalance_ticket_type(ticket_type_id):
+    with transaction.atomic():
+        shards = list(TicketTypeShard.objects.select_for_update().filter(ticket_type_id=ticket_type_id).order_by('index'))
+        if not shards:
+            return False
+
+        changed = spread_across_shards(shards, sum(shard.quantity for shard in shards))
+        TicketTypeShard.objects.bulk_update(changed, ['quantity'])
+    return bool(changed)
+
+
+def rebalance_drained_shards(threshold=0.5):
+    """
+    Even out every sharded ticket type whose emptiest shard has fallen below
+    ``threshold`` times the mean shard size. Returns the ticket type ids moved.
+    """
+    skewed = [
+        row['ticket_type_id']
+        for row in TicketTypeShard.objects.values('ticket_type_id').annotate(
+            low=Min('quantity'), total=Sum('quantity'), shards=Count('id')
+        )
+        if row['low'] * row['shards'] < threshold * row['total']
+    ]
+    return [ticket_type_id for ticket_type_id in skewed if rebalance_ticket_type(ticket_type_id)]
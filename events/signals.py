@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import invalidate_catalog
+from .counters import recount_events
+from .models import Event, TicketType
+
+
+@receiver(pre_save, sender=Event)
+def remember_published_state(sender, instance, **kwargs):
+    # What the public catalog showed before this save
+    instance._catalog_before = Event.objects.filter(pk=instance.pk).values('status', 'start_time').first() if instance.pk else None
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, **kwargs):
+    before = getattr(instance, '_catalog_before', None)
+    was_public = before is not None and before['status'] == 'published'
+    if was_public or instance.status == 'published':
+        invalidate_catalog([before['start_time'] if before else None, instance.start_time])
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    if instance.status == 'published':
+        invalidate_catalog([instance.start_time])
+
+
+@receiver(post_save, sender=TicketType)
+@receiver(post_delete, sender=TicketType)
+def ticket_type_changed(sender, instance, **kwargs):
+    if TicketType.event.is_cached(instance):
+        event = {'status': instance.event.status, 'start_time': instance.event.start_time}
+    else:
+        event = Event.objects.filter(pk=instance.event_id).values('status', 'start_time').first()
+    if event and event['status'] == 'published':
+        invalidate_catalog([event['start_time']])
+
+
+@receiver(post_save, sender=TicketType)
+@receiver(post_delete, sender=TicketType)
+def recount_after_ticket_type_change(sender, instance, **kwargs):
+    # Stock added, edited or removed one row at a time (admin, shell); bulk writes recount themselves
+    recount_events([instance.event_id])
@@ -0,0 +1,18 @@
+from celery import shared_task
+from .counters import recount_events, reconcile_counters
+from .sharding import rebalance_drained_shards
+
+
+@shared_task
+def rebalance_inventory_shards_task():
+    return rebalance_drained_shards()
+
+
+@shared_task
+def reconcile_event_counters_task():
+    return reconcile_counters()
+
+
+@shared_task
+def recount_event_counters_task(event_id):
+    return len(recount_events([event_id]))
@@ -1,3 +1,440 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.db import connection
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from event_booking.cache import TieredCache
+from event_booking.pagination import KeysetPagination
+from event_booking.query_plans import captured_sequential_scans
+from users.models import CustomUser
+from .async_views import public_event_list
+from .cache import _local_versions, catalog_cache
+from .models import Event, TicketType, TicketTypeShard
+from .serializers import EventSerializer, TicketTypeSerializer
+from .sharding import rebalance_drained_shards, shard_ticket_type, take_from_shards
+
+
+def make_event(organizer, **kwargs):
+    now = timezone.now()
+    defaults = {
+        'title': 'Jazz Night',
+        'description': 'Late night jazz',
+        'location': 'Lisbon',
+        'category': 'music',
+        'start_time': now + timedelta(days=3),
+        'end_time': now + timedelta(days=3, hours=3),
+        'status': 'published',
+    }
+    defaults.update(kwargs)
+    return Event.objects.create(organizer=organizer, **defaults)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'catalog-tests'}})
+class CatalogCacheTestCase(TestCase):
+    # Public listing tests get a private, empty catalog cache so pages can't leak between tests
+    def setUp(self):
+        super().setUp()
+        self.clear_catalog_cache()
+
+    def clear_catalog_cache(self):
+        caches['default'].clear()
+        catalog_cache.local.clear()
+        _local_versions.clear()
+
+
+class ShardedInventoryTests(TestCase):
+    def setUp(self):
+        organizer = CustomUser.objects.create_user(username='organizer', email='o@example.com', password='x', role='organizer')
+        self.event = make_event(organizer)
+        self.ticket_type = TicketType.objects.create(event=self.event, name='General', price='15.00', quantity=10)
+
+    def shard_quantities(self):
+        return list(TicketTypeShard.objects.filter(ticket_type=self.ticket_type).order_by('index').values_list('quantity', flat=True))
+
+    def test_sharding_spreads_stock_and_keeps_the_total(self):
+        ticket_type = shard_ticket_type(self.ticket_type.id, 4)
+
+        self.assertEqual(self.shard_quantities(), [3, 3, 2, 2])
+        self.assertEqual(ticket_type.quantity, 0)
+        self.assertEqual(ticket_type.available_quantity, 10)
+        self.assertEqual(TicketTypeSerializer(ticket_type).data['quantity'], 10)
+
+    def test_collapsing_shards_restores_the_row(self):
+        shard_ticket_type(self.ticket_type.id, 4)
+        ticket_type = shard_ticket_type(self.ticket_type.id, 0)
+
+        self.assertEqual((ticket_type.quantity, ticket_type.shard_count), (10, 0))
+        self.assertFalse(TicketTypeShard.objects.exists())
+
+    def test_large_line_drains_several_shards(self):
+        shard_ticket_type(self.ticket_type.id, 4)
+
+        self.assertTrue(take_from_shards(self.ticket_type.id, 4, 7))
+        self.assertEqual(sum(self.shard_quantities()), 3)
+        self.assertFalse(take_from_shards(self.ticket_type.id, 4, 4))
+
+    def test_rebalance_evens_out_drained_shards(self):
+        shard_ticket_type(self.ticket_type.id, 2)
+        TicketTypeShard.objects.filter(ticket_type=self.ticket_type, index=0).update(quantity=0)
+
+        self.assertEqual(rebalance_drained_shards(), [self.ticket_type.id])
+        self.assertEqual(self.shard_quantities(), [3, 2])
+
+
+class PublicEventSearchTests(CatalogCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        organizer = CustomUser.objects.create_user(username='organizer', email='o@example.com', password='x', role='organizer')
+        now = timezone.now()
+        self.jazz = make_event(organizer)
+        self.hackathon = make_event(organizer, title='Climate Hackathon', description='Build tools for jazz clubs',
+                                    location='Berlin', category='technology', start_time=now + timedelta(days=1))
+        make_event(organizer, title='Jazz Brunch', status='draft')
+
+    def search(self, **params):
+        response = self.client.get(reverse('public-event-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return [event['title'] for event in response.data['data']]
+
+    def test_free_text_matches_any_field_and_skips_drafts(self):
+        self.assertEqual(self.search(q='jazz'), ['Climate Hackathon', 'Jazz Night'])
+        self.assertEqual(self.search(q='jazz', location='lisbon'), ['Jazz Night'])
+
+    def test_field_filters_and_unknown_params(self):
+        self.assertEqual(self.search(title='hack'), ['Climate Hackathon'])
+        self.assertEqual(self.search(category='MUSIC'), ['Jazz Night'])
+        self.assertEqual(self.search(venue='Berlin'), [])
+
+
+class EventQueryPlanTests(CatalogCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        organizer = CustomUser.objects.create_user(username='organizer', email='o@example.com', password='x', role='organizer')
+        now = timezone.now()
+        for index in range(60):
+            event = make_event(organizer, title=f'Event {index}', start_time=now + timedelta(hours=index * 12),
+                               status=('published', 'draft', 'cancelled')[index % 3])
+            TicketType.objects.create(event=event, name='General', price='10.00', quantity=100)
+        self.day = (now + timedelta(days=3)).date().isoformat()
+
+    def test_public_listing_queries_use_indexes(self):
+        for params in ({}, {'date': self.day}, {'date': self.day, 'title': 'Event'}):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('public-event-list'), params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(captured_sequential_scans(queries.captured_queries), {}, params)
+
+
+class PublicEventCacheTests(CatalogCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.organizer = CustomUser.objects.create_user(username='organizer', email='o@example.com', password='x', role='organizer')
+        self.event = make_event(self.organizer)
+        self.draft = make_event(self.organizer, title='Secret Gig', status='draft', start_time=self.event.start_time + timedelta(days=1))
+
+    def titles(self, **params):
+        return [event['title'] for event in self.client.get(reverse('public-event-list'), params).data['data']]
+
+    def test_repeat_requests_are_served_from_memory(self):
+        self.assertEqual(self.titles(title='jazz'), ['Jazz Night'])
+        with self.assertNumQueries(0):
+            # Same search, different case and spacing
+            self.assertEqual(self.titles(title='  JAZZ '), ['Jazz Night'])
+
+    def test_edits_invalidate_only_the_affected_pages(self):
+        event_day = timezone.localtime(self.event.start_time).date().isoformat()
+        draft_day = timezone.localtime(self.draft.start_time).date().isoformat()
+        self.titles()
+        self.titles(date=event_day)
+        self.titles(date=draft_day)
+
+        # Drafts aren't public, so editing one leaves every page cached
+        with self.captureOnCommitCallbacks(execute=True):
+            self.draft.title = 'Still Secret'
+            self.draft.save()
+        with self.assertNumQueries(0):
+            self.titles()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.title = 'Jazz Night Live'
+            self.event.save()
+        _local_versions.clear()  # as if the version check interval had passed
+        self.assertEqual(self.titles(), ['Jazz Night Live'])
+        self.assertEqual(self.titles(date=event_day), ['Jazz Night Live'])
+        with self.assertNumQueries(0):
+            self.titles(date=draft_day)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TicketType.objects.create(event=self.event, name='VIP', price='50.00', quantity=5)
+        _local_versions.clear()
+        summary = self.client.get(reverse('public-event-list')).data['data'][0]
+        self.assertEqual((summary['min_price'], summary['tickets_available']), ('50.00', 5))
+
+    def test_concurrent_misses_compute_once(self):
+        cache = TieredCache('test', local_entries=10)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'page'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_set('key', compute, 60))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual((len(calls), results), (1, ['page'] * 8))
+
+    def test_concurrent_async_misses_compute_once(self):
+        cache = TieredCache('test', local_entries=10)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.2)
+            return 'page'
+
+        async def burst():
+            return await asyncio.gather(*[cache.aget_or_set('key', compute, 60) for _ in range(8)])
+
+        self.assertEqual((async_to_sync(burst)(), len(calls)), (['page'] * 8, 1))
+
+
+class PublicEventPaginationTests(CatalogCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        organizer = CustomUser.objects.create_user(username='organizer', email='o@example.com', password='x', role='organizer')
+        start = timezone.now() + timedelta(days=1)
+        # Pairs of events share a start time, so pages must break ties on id
+        for index in range(45):
+            make_event(organizer, title=f'Event {index}', start_time=start + timedelta(hours=index // 2))
+        make_event(organizer, title='Draft', status='draft')
+
+    def walk(self, **params):
+        titles, url, data = [], reverse('public-event-list'), params
+        while url:
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 200)
+            titles += [event['title'] for event in response.data['data']]
+            url, data = response.data['next'], None
+        return titles
+
+    def test_pages_follow_start_time_then_id(self):
+        expected = list(Event.objects.filter(status='published').order_by('start_time', 'id').values_list('title', flat=True))
+        self.assertEqual(self.walk(page_size=20), expected)
+        self.assertEqual(self.walk(q='event', page_size=7), expected)
+
+    def test_page_size_is_bounded_and_empty_results_take_one_query(self):
+        with mock.patch.object(KeysetPagination, 'max_page_size', 10):
+            self.assertEqual(len(self.client.get(reverse('public-event-list'), {'page_size': 500}).data['data']), 10)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('public-event-list'), {'title': 'no such event'})
+        self.assertEqual((response.data['message'], response.data['data']), ('No matching events found.', []))
+
+
+    def test_async_route_serves_the_same_pages(self):
+        url = reverse('public-event-list')
+        view = async_to_sync(public_event_list)
+        expected = self.client.get(url, {'page_size': 20}).json()
+        self.clear_catalog_cache()
+
+        with self.assertNumQueries(1):
+            response = view(AsyncRequestFactory().get(url, {'page_size': 20}))
+        self.assertEqual(json.loads(response.content), expected)
+
+        next_page = view(AsyncRequestFactory().get(expected['next']))
+        self.assertEqual(len(json.loads(next_page.content)['data']), 20)
+        self.assertEqual(view(AsyncRequestFactory().get(url, {'cursor': 'bogus'})).status_code, 404)
+
+
+class EventListQueryCountTests(CatalogCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.organizer = CustomUser.objects.create_user(username='organizer', email='o@example.com', password='x', role='organizer')
+        self.client.force_login(self.organizer)
+
+    def seed(self, count):
+        start = timezone.now() + timedelta(days=1)
+        events = Event.objects.bulk_create([
+            Event(organizer=self.organizer, title=f'Event {index}', description='', location='Lisbon', category='music',
+                  start_time=start, end_time=start + timedelta(hours=2), status='published', tickets_remaining=20)
+            for index in range(Event.objects.count(), Event.objects.count() + count)
+        ])
+        TicketType.objects.bulk_create([
+            TicketType(event=event, name=name, price=price, quantity=10)
+            for event in events for name, price in (('General', '20.00'), ('VIP', '80.00'))
+        ])
+
+    def test_list_queries_do_not_grow_with_events(self):
+        api = APIClient()
+        api.force_authenticate(self.organizer)
+        for count in (10, 990):
+            self.seed(count)  # bulk_create sends no signals
+            self.clear_catalog_cache()
+            with self.assertNumQueries(1):
+                events = api.get(reverse('event-list')).data['data']
+            with self.assertNumQueries(1):
+                page = self.client.get(reverse('public-event-list'), {'page_size': 100}).data['data']
+
+        self.assertEqual(len(events), 1000)
+        self.assertEqual(len(page), 100)
+        self.assertEqual((events[0]['min_price'], events[0]['tickets_available']), ('20.00', 20))
+        self.assertNotIn('description', page[0])
+
+    def test_sharded_stock_counts_towards_availability(self):
+        self.seed(1)
+        ticket_type = TicketType.objects.get(name='VIP')
+        shard_ticket_type(ticket_type.id, 3)
+
+        event = Event.objects.with_counted_stock().get()
+        self.assertEqual((event.tickets_remaining, event.counted_remaining), (20, 20))
+
+        with self.assertNumQueries(3):
+            detail = EventSerializer(Event.objects.with_ticket_types().get()).data
+        self.assertEqual([ticket['quantity'] for ticket in detail['ticket_types']], [10, 10])
+
+
+class EventUpdateTests(CatalogCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.organizer = CustomUser.objects.create_user(username='organizer', email='o@example.com', password='x', role='organizer')
+        self.api = APIClient()
+        self.api.force_authenticate(self.organizer)
+
+    def event_with_ticket_types(self, count):
+        event = make_event(self.organizer)
+        TicketType.objects.bulk_create([TicketType(event=event, name=f'Tier {index}', price='10.00', quantity=10) for index in range(count)])
+        return event, list(event.ticket_types.order_by('id').values_list('id', flat=True))
+
+    def update(self, event, ticket_types):
+        return self.api.patch(reverse('event-detail', args=[event.id]), {'ticket_types': ticket_types}, format='json')
+
+    def test_query_count_does_not_grow_with_ticket_types(self):
+        for count in (3, 60):
+            event, ids = self.event_with_ticket_types(count)
+            kept = ids[:-(count // 3)]
+            # Rename one, keep some as they are, drop a third of them and add one
+            payload = [{'id': ids[0], 'name': 'Early bird'}] + [{'id': ticket_type_id} for ticket_type_id in kept[1:]]
+            payload.append({'name': 'Door', 'price': '25.00', 'quantity': 5})
+            with CaptureQueriesContext(connection) as queries:
+                response = self.update(event, payload)
+            self.assertEqual(response.status_code, 200, response.data)
+            if count == 3:
+                baseline = len(queries)
+            self.assertEqual(len(queries), baseline)
+
+            names = list(event.ticket_types.order_by('id').values_list('id', 'name'))
+            self.assertEqual(names[0], (ids[0], 'Early bird'))
+            self.assertEqual([ticket_type_id for ticket_type_id, _ in names[:-1]], kept)
+            self.assertEqual(names[-1][1], 'Door')
+            self.assertEqual(Event.objects.get(id=event.id).tickets_remaining, 10 * len(kept) + 5)
+
+    def test_booked_ticket_types_are_not_deleted(self):
+        from bookings.models import BookedTicket, Booking
+
+        event, ids = self.event_with_ticket_types(2)
+        booking = Booking.objects.create(user=self.organizer, event=event, total_amount='10.00')
+        BookedTicket.objects.create(booking=booking, ticket_type_id=ids[1], quantity=1)
+
+        response = self.update(event, [{'id': ids[0]}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Tier 1', str(response.data['errors']))
+        self.assertEqual(event.ticket_types.count(), 2)
+
+        # Leaving ticket_types out of a PATCH leaves them alone
+        response = self.api.patch(reverse('event-detail', args=[event.id]), {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(event.ticket_types.order_by('id').values_list('id', flat=True)), ids)
+
+    def test_sharded_quantity_is_spread_over_the_shards(self):
+        event, ids = self.event_with_ticket_types(1)
+        shard_ticket_type(ids[0], 4)
+
+        response = self.update(event, [{'id': ids[0], 'quantity': 22}])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['data']['ticket_types'][0]['quantity'], 22)
+        self.assertEqual(TicketType.objects.get(id=ids[0]).quantity, 0)
+        self.assertEqual(list(TicketTypeShard.objects.filter(ticket_type_id=ids[0]).order_by('index').values_list('quantity', flat=True)), [6, 6, 5, 5])
+
+
+class EventImportTests(CatalogCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.organizer = CustomUser.objects.create_user(username='organizer', email='o@example.com', password='x', role='organizer')
+        self.api = APIClient()
+        self.api.force_authenticate(self.organizer)
+
+    def row(self, index, **overrides):
+        start = timezone.now() + timedelta(days=2)
+        row = {
+            'title': f'Import {index}', 'description': 'Bulk imported', 'location': 'Lisbon', 'category': 'music', 'status': 'published',
+            'start_time': start.isoformat(), 'end_time': (start + timedelta(hours=2)).isoformat(),
+            'ticket_types': [{'name': 'General', 'price': '10.00', 'quantity': 50}, {'name': 'VIP', 'price': '40.00', 'quantity': 5}],
+        }
+        row.update(overrides)
+        return row
+
+    def post(self, body, content_type='application/x-ndjson', **params):
+        url = reverse('event-import')
+        if params:
+            url += '?' + '&'.join(f'{name}={value}' for name, value in params.items())
+        return self.api.generic('POST', url, body.encode(), content_type=content_type)
+
+    def test_jsonl_import_reports_bad_rows_and_writes_in_bulk(self):
+        lines = [json.dumps(self.row(index)) for index in range(120)]
+        lines[5] = '{"title": '
+        lines[7] = json.dumps(self.row(7, start_time='tomorrow'))
+
+        with CaptureQueriesContext(connection) as queries:
+            report = self.post('\n'.join(lines)).data['data']
+
+        self.assertEqual((report['created_events'], report['created_ticket_types'], report['failed_rows']), (118, 236, 2))
+        self.assertEqual([error['line'] for error in report['errors']], [6, 8])
+        self.assertIn('start_time', report['errors'][1]['errors'])
+        self.assertEqual(report['last_line'], 120)
+        self.assertLess(len(queries), 10)
+        self.assertEqual(Event.objects.filter(organizer=self.organizer).count(), 118)
+
+    @override_settings(EVENT_IMPORT_MAX_ROWS=3)
+    def test_import_stops_at_the_row_limit_and_continues_from_start_line(self):
+        body = '\n'.join(json.dumps(self.row(index)) for index in range(5))
+
+        first = self.post(body).data['data']
+        second = self.post(body, start_line=first['next_start_line']).data['data']
+
+        self.assertEqual((first['created_events'], first['last_line'], first['complete'], first['next_start_line']), (3, 3, False, 4))
+        self.assertEqual((second['created_events'], second['last_line'], second['complete']), (2, 5, True))
+        self.assertNotIn('next_start_line', second)
+        self.assertEqual(Event.objects.filter(organizer=self.organizer).count(), 5)
+
+    def test_csv_import_resumes_from_a_line(self):
+        tickets = json.dumps([{'name': 'General', 'price': '10.00', 'quantity': 50}])
+        rows = [self.row(index) for index in range(4)]
+        header = 'title,description,location,category,status,start_time,end_time,ticket_types'
+        body = '\n'.join([header] + [
+            ','.join([row['title'], row['description'], row['location'], row['category'], row['status'], row['start_time'], row['end_time'],
+                      '"' + tickets.replace('"', '""') + '"'])
+            for row in rows
+        ])
+
+        report = self.post(body, content_type='text/csv', start_line=4).data['data']
+
+        self.assertEqual((report['created_events'], report['failed_rows'], report['last_line']), (2, 0, 5))
+        self.assertEqual(sorted(Event.objects.values_list('title', flat=True)), ['Import 2', 'Import 3'])
+        self.assertEqual(TicketType.objects.filter(event__title='Import 3').get().quantity, 50)
+        self.assertEqual(self.post(body, content_type='text/csv', start_line=0).status_code, 400)
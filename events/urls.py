@@ -1,12 +1,16 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import EventViewSet, PublicEventListView
+from . import async_views
+from .views import EventImportView, EventViewSet, PublicEventListView
 
 router = DefaultRouter()
 router.register(r'events', EventViewSet, basename='event')
 
 urlpatterns = [
+    # Ahead of the router, whose events/<pk>/ route would otherwise claim it
+    path('events/import/', EventImportView.as_view(), name='event-import'),
     path('', include(router.urls)),
-    path('public/events/', PublicEventListView.as_view(), name='public-event-list'),
+    path('public/events/', async_views.public_event_list if settings.ASYNC_READ_API else PublicEventListView.as_view(), name='public-event-list'),
 
 ]
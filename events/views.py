@@ -1,10 +1,20 @@
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, permissions, serializers, status
 from rest_framework.response import Response
 from rest_framework import generics
+from rest_framework.views import APIView
+from django.conf import settings
 from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import datetime, timedelta
 
 from .models import Event
-from .serializers import EventSerializer
+from .serializers import EventSerializer, EventSummarySerializer
+from .search import search_events
+from .cache import TEXT_PARAMS, cached_catalog_page
+from .importer import import_events, read_rows
+from event_booking.db_router import ReplicaReadsMixin
+from event_booking.pagination import KeysetPagination
 from rest_framework.permissions import AllowAny
 
 
@@ -24,7 +34,16 @@ class EventViewSet(viewsets.ModelViewSet):
     permission_classes = [IsOrganizer]
 
     def get_queryset(self):
-        return self.queryset.filter(organizer=self.request.user)
+        queryset = self.queryset.filter(organizer=self.request.user)
+        if self.action == 'list':
+            return queryset.with_ticket_summary()
+        return queryset.with_ticket_types()
+
+    def get_serializer_class(self):
+        # Lists get the flat summary; the nested ticket types are only for a single event
+        if self.action == 'list':
+            return EventSummarySerializer
+        return EventSerializer
 
     def perform_create(self, serializer):
         serializer.save(organizer=self.request.user)
@@ -63,7 +82,17 @@ class EventViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
 
         if serializer.is_valid():
-            event = serializer.save()
+            try:
+                event = serializer.save()
+            except serializers.ValidationError as exc:
+                # Raised by the ticket type diff, e.g. removing a ticket type that has bookings
+                return Response({
+                    "status": "error",
+                    "message": "Failed to update event.",
+                    "errors": exc.detail
+                }, status=status.HTTP_400_BAD_REQUEST)
+            # The ticket types were prefetched before the update changed them
+            event._prefetched_objects_cache = {}
             return Response({
                 "status": "success",
                 "message": "Event updated successfully.",
@@ -88,62 +117,133 @@ class EventViewSet(viewsets.ModelViewSet):
         )
 
 
+# --------- Organizer's Bulk Import ---------
+class EventImportView(APIView):
+    """
+    Streams a JSON Lines (default) or ``text/csv`` body into events and
+    ticket types. Chunks commit as they go; resume a cut-off upload with
+    ``?start_line=<last_line + 1>``.
+
+    One request imports at most ``EVENT_IMPORT_MAX_ROWS`` rows so it can't
+    hold a worker for the length of a huge file: past that the report says
+    ``complete: false`` with the ``next_start_line`` to post the body again
+    from. Whole files belong to the ``import_events`` command.
+    """
+    permission_classes = [IsOrganizer]
+
+    def post(self, request):
+        try:
+            start_line = int(request.query_params.get('start_line', 1))
+        except ValueError:
+            start_line = 0
+        if start_line < 1:
+            return Response({
+                "status": "error",
+                "message": "start_line must be a positive integer."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # The raw body, read line by line rather than parsed into memory
+        stream = request.stream
+        if stream is None:
+            return Response({
+                "status": "error",
+                "message": "Nothing to import."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = 'csv' if request.content_type.startswith('text/csv') else 'jsonl'
+        report = import_events(request.user, read_rows(stream, fmt, start_line=start_line), max_rows=settings.EVENT_IMPORT_MAX_ROWS)
+
+        message = f"Imported {report['created_events']} events; {report['failed_rows']} rows failed."
+        if not report['complete']:
+            report['next_start_line'] = report['last_line'] + 1
+            message += f" Stopped at the {settings.EVENT_IMPORT_MAX_ROWS} row limit; post again with start_line={report['next_start_line']}."
+        return Response({
+            "status": "success",
+            "message": message,
+            "data": report
+        }, status=status.HTTP_200_OK)
+
 
 # --------- Public Event Discovery View ---------
-class PublicEventListView(generics.ListAPIView):
-    serializer_class = EventSerializer
+class PublicEventListView(ReplicaReadsMixin, generics.ListAPIView):
+    serializer_class = EventSummarySerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+
+    @property
+    def keyset_ordering(self):
+        # ?sort=availability: most seats left first (event_published_availability index)
+        if self.request.query_params.get('sort') == 'availability':
+            return ('-tickets_remaining', 'start_time', 'id')
+        # Searches page through results best match first; plain browsing goes by start time
+        if any(self.request.query_params.get(name) for name in TEXT_PARAMS):
+            return ('-rank', 'start_time', 'id')
+        return ('start_time', 'id')
 
     def get_queryset(self):
-        allowed_params = {'location', 'category', 'title', 'date'}
+        allowed_params = {'q', 'location', 'category', 'title', 'date', 'available', 'sort', 'cursor', 'page_size'}
         request_params = set(self.request.query_params.keys())
 
 
         if not request_params.issubset(allowed_params):
             return Event.objects.none()
 
-        queryset = Event.objects.filter(status='published')
-
-        # Case-insensitive filters
-        location = self.request.query_params.get('location')
-        category = self.request.query_params.get('category')
-        title = self.request.query_params.get('title')
-        date = self.request.query_params.get('date')  # Format: YYYY-MM-DD
-
-        if location:
-            queryset = queryset.filter(location__icontains=location)
-        if category:
-            queryset = queryset.filter(category__icontains=category)
-        if title:
-            queryset = queryset.filter(title__icontains=title)
-        if date:
-            queryset = queryset.filter(start_time__date=date)
-
-        return queryset
+        queryset = Event.objects.filter(status='published').defer('search_vector', 'description').with_ticket_summary()
+        params = self.request.query_params
+
+        if params.get('date'):  # Format: YYYY-MM-DD
+            try:
+                day = parse_date(params['date'])
+            except ValueError:  # well-formed but impossible, e.g. 2026-02-30
+                day = None
+            if day is None:
+                return Event.objects.none()
+            # A range on start_time (not start_time__date) can use the published start_time index
+            day_start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            queryset = queryset.filter(start_time__gte=day_start, start_time__lt=day_start + timedelta(days=1))
+
+        if params.get('sort', 'availability') != 'availability' or params.get('available', '1') not in ('0', '1'):
+            return Event.objects.none()
+        if params.get('available') == '1':
+            # The generated is_sold_out column, kept current by the counters
+            queryset = queryset.filter(is_sold_out=False)
+
+        # Full-text `q` plus fuzzy title/location/category, best match first
+        return search_events(
+            queryset,
+            q=params.get('q'),
+            title=params.get('title'),
+            location=params.get('location'),
+            category=params.get('category'),
+        )
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        # Anonymous and read-heavy: pages stay cached until an organizer changes the catalog
+        payload = cached_catalog_page(request, self.catalog_page)
+        return Response(payload, status=status.HTTP_200_OK)
 
-        if not queryset.exists():
-            return Response({
-                "status": "success",
-                "message": "No matching events found.",
-                "data": []
-            }, status=status.HTTP_200_OK)
+    def catalog_page(self):
+        # One bounded page query; an empty first page is the "no matches" answer, no exists() needed
+        return self._catalog_payload(self.paginate_queryset(self.get_queryset()))
 
+    async def acatalog_page(self):
+        # catalog_page for the async route (events.async_views)
+        return self._catalog_payload(await self.paginator.apaginate_queryset(self.get_queryset(), self.request, view=self))
 
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response({
+    def _catalog_payload(self, page):
+        if not page and not self.request.query_params.get('cursor'):
+            return {
                 "status": "success",
-                "message": "Events fetched successfully.",
-                "data": serializer.data
-            })
+                "message": "No matching events found.",
+                "data": [],
+                "next": None,
+            }
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response({
+        serializer = self.get_serializer(page, many=True)
+        return {
             "status": "success",
             "message": "Events fetched successfully.",
-            "data": serializer.data
-        }, status=status.HTTP_200_OK)
+            # A plain list pickles without dragging the serializer along
+            "data": list(serializer.data),
+            "next": self.paginator.get_next_link(),
+        }
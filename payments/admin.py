@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import WebhookEvent
 
-# Register your models here.
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('stripe_event_id', 'event_type', 'status', 'attempts', 'stripe_created', 'processed_at')
+    list_filter = ('status', 'event_type')
+    search_fields = ('stripe_event_id', 'ordering_key')
@@ -0,0 +1,91 @@
+"""
+Offline stand-in for the Stripe gateway.
+
+Select it with ``PAYMENT_GATEWAY=payments.fake_stripe.FakeStripeGateway`` to
+run the booking and checkout flow without network access. Sessions live in
+memory, and ``fail_next()`` queues errors to exercise the retry path.
+"""
+import hashlib
+import hmac
+import itertools
+import time
+import uuid
+from types import SimpleNamespace
+
+import stripe
+
+
+def signature_header(payload, secret, timestamp=None):
+    """Build a ``Stripe-Signature`` header the way Stripe signs webhook deliveries."""
+    timestamp = int(timestamp or time.time())
+    signed = f'{timestamp}.'.encode() + (payload if isinstance(payload, bytes) else payload.encode())
+    digest = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={digest}'
+
+
+def fake_event(event_type, obj, created=None):
+    """A Stripe-shaped event envelope around ``obj``."""
+    return {
+        'id': f'evt_fake_{uuid.uuid4().hex}',
+        'object': 'event',
+        'type': event_type,
+        'created': int(created or time.time()),
+        'data': {'object': obj},
+    }
+
+
+def checkout_events(booking_id, created=None):
+    """The events Stripe sends for one paid checkout: the charge first, then the session."""
+    created = int(created or time.time())
+    suffix = uuid.uuid4().hex[:16]
+    payment_intent = f'pi_fake_{suffix}'
+    charge = {
+        'id': f'ch_fake_{suffix}', 'object': 'charge', 'payment_intent': payment_intent,
+        'receipt_url': f'https://pay.stripe.com/receipts/fake/{suffix}',
+    }
+    session = {
+        'id': f'cs_fake_{suffix}', 'object': 'checkout.session', 'payment_intent': payment_intent,
+        'client_reference_id': str(booking_id), 'metadata': {'booking_id': str(booking_id)},
+    }
+    return [fake_event('charge.succeeded', charge, created), fake_event('checkout.session.completed', session, created + 1)]
+
+
+class FakeStripeGateway:
+    def __init__(self):
+        self.sessions = {}
+        self._failures = []
+        self._ids = itertools.count(1)
+
+    def fail_next(self, *exceptions):
+        self._failures.extend(exceptions)
+
+    def _maybe_fail(self):
+        if self._failures:
+            raise self._failures.pop(0)
+
+    def create_checkout_session(self, params):
+        self._maybe_fail()
+        number = next(self._ids)
+        session = SimpleNamespace(
+            id=f'cs_fake_{number}',
+            url=f'https://checkout.stripe.test/c/pay/cs_fake_{number}',
+            payment_intent=f'pi_fake_{number}',
+            client_reference_id=params.get('client_reference_id'),
+            metadata=dict(params.get('metadata', {})),
+            status='open',
+            params=params,
+        )
+        self.sessions[session.id] = session
+        return session
+
+    def expire_checkout_session(self, session_id):
+        self._maybe_fail()
+        session = self.sessions.get(session_id)
+        if session is None or session.status != 'open':
+            raise stripe.error.InvalidRequestError(f'Checkout session {session_id} is not open.', 'session')
+        session.status = 'expired'
+        return session
+
+    def construct_event(self, payload, sig_header, secret):
+        # Signature checks stay real; they never leave the process
+        return stripe.Webhook.construct_event(payload, sig_header, secret)
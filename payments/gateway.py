@@ -0,0 +1,169 @@
+"""
+Shared Stripe gateway: one pooled keep-alive HTTP client per process, bounded
+timeouts, a circuit breaker that fails fast while Stripe is unhealthy, and
+latency / error metrics for every call.
+
+Code talks to ``get_gateway()``. ``PAYMENT_GATEWAY`` names the class to build,
+``STRIPE_API_BASE`` points the real gateway at a local stub server, and tests
+can swap in any object with the same methods through ``set_gateway()``.
+"""
+import threading
+import time
+
+import requests
+import stripe
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from event_booking import metrics
+from event_booking.instrumentation import record_external
+
+# Stripe is called from Celery workers, so these go to the shared store /metrics reads
+stripe_requests = metrics.counter(
+    'stripe_requests_total', "Stripe API calls by operation and outcome.", ['operation', 'outcome'], shared=True)
+stripe_latency = metrics.histogram(
+    'stripe_request_duration_seconds', "Stripe API call latency.", ['operation'], shared=True)
+stripe_circuit_open = metrics.gauge(
+    'stripe_circuit_open', "1 while the Stripe circuit breaker is open (as last set by any process).", shared=True)
+
+# Errors that mean Stripe (or the path to it) is unhealthy, as opposed to a bad request from us
+UNHEALTHY_STRIPE_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.RateLimitError,
+    stripe.error.APIError,
+)
+
+
+class CircuitOpenError(stripe.error.APIConnectionError):
+    """Raised without calling Stripe while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            # Half open lets exactly one trial call through; everything else keeps failing fast
+            if state == 'open' or (state == 'half_open' and self._trial_running):
+                raise CircuitOpenError("Stripe circuit breaker is open; not calling Stripe.")
+            if state == 'half_open':
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+        stripe_circuit_open.set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+        if self.opened_at is not None:
+            stripe_circuit_open.set(1)
+
+
+class StripeGateway:
+    def __init__(self, api_key=None, api_base=None, connect_timeout=None, read_timeout=None,
+                 max_connections=None, max_network_retries=None, breaker=None):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections or settings.STRIPE_MAX_CONNECTIONS)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        http_client = stripe.RequestsClient(
+            timeout=(connect_timeout or settings.STRIPE_CONNECT_TIMEOUT, read_timeout or settings.STRIPE_READ_TIMEOUT),
+            session=session,
+        )
+        api_base = api_base or settings.STRIPE_API_BASE
+        self.client = stripe.StripeClient(
+            api_key or settings.STRIPE_SECRET_KEY,
+            http_client=http_client,
+            base_addresses={'api': api_base} if api_base else {},
+            max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES if max_network_retries is None else max_network_retries,
+        )
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=settings.STRIPE_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.STRIPE_BREAKER_RESET_SECONDS,
+        )
+
+    def create_checkout_session(self, params):
+        return self._call('checkout.sessions.create', self.client.checkout.sessions.create, params)
+
+    def expire_checkout_session(self, session_id):
+        return self._call('checkout.sessions.expire', self.client.checkout.sessions.expire, session_id)
+
+    def construct_event(self, payload, sig_header, secret):
+        # Signature checks are local; no round trip and nothing for the breaker to guard
+        return stripe.Webhook.construct_event(payload, sig_header, secret)
+
+    def _call(self, operation, method, *args):
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            stripe_requests.inc(operation=operation, outcome='short_circuited')
+            raise
+        started = time.perf_counter()
+        try:
+            result = method(*args)
+        except UNHEALTHY_STRIPE_ERRORS:
+            self.breaker.record_failure()
+            stripe_requests.inc(operation=operation, outcome='unavailable')
+            raise
+        except stripe.error.StripeError:
+            self.breaker.record_success()
+            stripe_requests.inc(operation=operation, outcome='rejected')
+            raise
+        except Exception:
+            # Anything unexpected still has to settle a half-open trial call
+            self.breaker.record_failure()
+            stripe_requests.inc(operation=operation, outcome='error')
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stripe_latency.observe(elapsed, operation=operation)
+            record_external('stripe', elapsed)
+
+        self.breaker.record_success()
+        stripe_requests.inc(operation=operation, outcome='ok')
+        return result
+
+
+# ------------------------ Process-wide instance ------------------------
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = import_string(settings.PAYMENT_GATEWAY)()
+    return _gateway
+
+
+def set_gateway(gateway):
+    """Install ``gateway`` for this process; ``None`` rebuilds it from settings on next use."""
+    global _gateway
+    _gateway = gateway
@@ -0,0 +1,57 @@
+import json
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bookings.models import Booking
+from payments.fake_stripe import checkout_events, signature_header
+
+
+class Command(BaseCommand):
+    help = "Generate signed fake Stripe checkout events for pending bookings and post them to a webhook URL (load testing)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Webhook URL to post to; without it events are printed as JSON Lines")
+        parser.add_argument('--bookings', type=int, default=100, help="How many pending bookings to 'pay'")
+        parser.add_argument('--duplicate-rate', type=float, default=0.1, help="Share of events delivered twice, like Stripe retries")
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--secret', default=None, help="Webhook signing secret (defaults to STRIPE_WEBHOOK_SECRET)")
+
+    def handle(self, *args, **options):
+        booking_ids = Booking.objects.filter(status='pending').order_by('id').values_list('id', flat=True)[:options['bookings']]
+        events = [event for booking_id in booking_ids for event in checkout_events(booking_id)]
+        events += random.sample(events, int(len(events) * options['duplicate_rate']))
+        random.shuffle(events)
+        if not events:
+            self.stdout.write("No pending bookings to generate events for.")
+            return
+
+        if not options['url']:
+            for event in events:
+                self.stdout.write(json.dumps(event))
+            return
+
+        secret = options['secret'] or settings.STRIPE_WEBHOOK_SECRET
+        session = requests.Session()
+
+        def deliver(event):
+            payload = json.dumps(event)
+            response = session.post(options['url'], data=payload, timeout=10, headers={
+                'Content-Type': 'application/json',
+                'Stripe-Signature': signature_header(payload, secret),
+            })
+            return response.status_code, response.elapsed.total_seconds()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            results = list(pool.map(deliver, events))
+
+        latencies = sorted(elapsed for _, elapsed in results)
+        failures = sum(1 for status_code, _ in results if status_code != 200)
+        self.stdout.write(
+            f"Delivered {len(results)} events, {failures} non-200. "
+            f"p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+            f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:.1f} ms"
+        )
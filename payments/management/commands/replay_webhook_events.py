@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+
+from payments.models import WebhookEvent
+from payments.tasks import process_webhook_event_task
+from payments.webhooks import RetryLater, process_event
+
+
+class Command(BaseCommand):
+    help = "Re-run stored Stripe webhook events, e.g. to backfill after an outage or a handler fix."
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', help="Stripe event ids (evt_...) to replay")
+        parser.add_argument('--status', nargs='+', default=['failed', 'pending'], choices=['pending', 'failed', 'processed'])
+        parser.add_argument('--type', dest='event_type', help="Only this Stripe event type")
+        parser.add_argument('--since', help="Only events Stripe created at or after this ISO timestamp")
+        parser.add_argument('--sync', action='store_true', help="Process in this process instead of queueing to Celery")
+
+    def handle(self, *args, **options):
+        events = WebhookEvent.objects.exclude(status='ignored').order_by('stripe_created', 'id')
+        if options['event_ids']:
+            events = events.filter(stripe_event_id__in=options['event_ids'])
+        else:
+            events = events.filter(status__in=options['status'])
+        if options['event_type']:
+            events = events.filter(event_type=options['event_type'])
+        if options['since']:
+            events = events.filter(stripe_created__gte=parse_datetime(options['since']))
+
+        ids = list(events.values_list('id', flat=True))
+        # Handlers are idempotent, so already processed events can safely be applied again
+        WebhookEvent.objects.filter(id__in=ids, status='processed').update(status='pending')
+
+        waiting = 0
+        for webhook_event_id in ids:
+            if not options['sync']:
+                process_webhook_event_task.delay(webhook_event_id)
+                continue
+            try:
+                process_event(webhook_event_id)
+            except RetryLater:
+                waiting += 1
+            except Exception as exc:
+                self.stderr.write(f"Event {webhook_event_id} failed: {exc!r}")
+
+        action = "Processed" if options['sync'] else "Queued"
+        self.stdout.write(self.style.SUCCESS(f"{action} {len(ids)} event(s); {waiting} still waiting on other events."))
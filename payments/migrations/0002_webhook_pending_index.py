@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['received_at'], name='webhook_pending_received'),
+        ),
+    ]
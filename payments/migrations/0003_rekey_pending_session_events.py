@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:02
+
+from django.db import migrations
+
+
+def rekey_pending_session_events(apps, schema_editor):
+    """
+    Events still waiting were keyed by PaymentIntent; key the ones that name
+    their booking by the booking instead, as ``payments.webhooks.ordering_key``
+    now does, so they are ordered against that booking's other events.
+    """
+    WebhookEvent = apps.get_model('payments', 'WebhookEvent')
+
+    rekeyed = []
+    for webhook_event in WebhookEvent.objects.filter(status='pending').only('id', 'payload').iterator():
+        obj = webhook_event.payload.get('data', {}).get('object', {})
+        booking_id = obj.get('client_reference_id') or (obj.get('metadata') or {}).get('booking_id')
+        if booking_id:
+            webhook_event.ordering_key = f'booking:{booking_id}'
+            rekeyed.append(webhook_event)
+    WebhookEvent.objects.bulk_update(rekeyed, ['ordering_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_webhook_pending_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(rekey_pending_session_events, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,29 @@
 from django.db import models
 
-# Create your models here.
+
+class WebhookEvent(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+        ('ignored', 'Ignored'),
+    ]
+    stripe_event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    ordering_key = models.CharField(max_length=255, blank=True, db_index=True, help_text="Events sharing a key are processed in Stripe creation order")
+    stripe_created = models.DateTimeField()
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # The redispatch sweep only looks at events still waiting
+            models.Index(fields=['received_at'], condition=models.Q(status='pending'), name='webhook_pending_received'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.stripe_event_id} ({self.status})"
@@ -0,0 +1,112 @@
+import logging
+from datetime import timedelta
+
+import stripe
+from celery import shared_task
+from celery.utils.time import get_exponential_backoff_interval
+from django.conf import settings
+from django.utils import timezone
+
+from bookings.inventory import release_booking
+from bookings.models import Booking
+from .gateway import UNHEALTHY_STRIPE_ERRORS, get_gateway
+from .models import WebhookEvent
+from .utils import create_stripe_checkout_session
+from .webhooks import TRANSIENT_ERRORS, process_event
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=5)
+def create_checkout_session_task(self, booking_id):
+    booking = Booking.objects.select_related('event').get(id=booking_id)
+    if booking.status != 'pending' or booking.checkout_status != 'queued':
+        return booking.checkout_url
+
+    try:
+        session = create_stripe_checkout_session(booking)
+    # Stripe unreachable, throttling or failing fast behind the breaker: worth another attempt
+    except UNHEALTHY_STRIPE_ERRORS as exc:
+        if self.request.retries < self.max_retries:
+            countdown = get_exponential_backoff_interval(factor=1, retries=self.request.retries, maximum=60, full_jitter=True)
+            raise self.retry(exc=exc, countdown=countdown)
+        return _give_up(booking_id, exc)
+    except stripe.error.StripeError as exc:
+        return _give_up(booking_id, exc)
+
+    attached = Booking.objects.filter(id=booking_id, status='pending', checkout_status='queued').update(
+        checkout_url=session.url, checkout_session_id=session.id, checkout_status='ready'
+    )
+    if not attached:
+        # A re-dispatched attempt got there first, or the hold was released meanwhile: nobody may pay this one
+        expire_checkout_sessions_task.delay([session.id])
+        return Booking.objects.values_list('checkout_url', flat=True).get(id=booking_id)
+    return session.url
+
+
+def _give_up(booking_id, exc):
+    # No checkout session means no way to pay: give the seats back right away
+    logger.error("Could not create a checkout session for booking %s: %s", booking_id, exc)
+    Booking.objects.filter(id=booking_id).update(checkout_status='failed')
+    release_booking(booking_id)
+
+
+@shared_task(bind=True, max_retries=5)
+def expire_checkout_sessions_task(self, session_ids):
+    """Expire the checkout sessions of released bookings so their customers can't pay any more."""
+    gateway = get_gateway()
+    for index, session_id in enumerate(session_ids):
+        try:
+            gateway.expire_checkout_session(session_id)
+        except UNHEALTHY_STRIPE_ERRORS as exc:
+            countdown = get_exponential_backoff_interval(factor=2, retries=self.request.retries, maximum=300, full_jitter=True)
+            raise self.retry(exc=exc, args=[session_ids[index:]], countdown=countdown)
+        except stripe.error.StripeError as exc:
+            # Already completed or expired: mark_booking_paid re-holds seats for a payment that got in first
+            logger.info("Did not expire checkout session %s: %s", session_id, exc)
+
+
+@shared_task(bind=True, max_retries=8)
+def process_webhook_event_task(self, webhook_event_id):
+    try:
+        process_event(webhook_event_id)
+    except TRANSIENT_ERRORS as exc:
+        # Not ready yet, or the database blipped: the inbox row stays pending, try again with backoff.
+        # Once the retries run out redispatch_pending_webhooks_task picks it up again.
+        countdown = get_exponential_backoff_interval(factor=2, retries=self.request.retries, maximum=600, full_jitter=True)
+        raise self.retry(exc=exc, countdown=countdown)
+    except Exception as exc:
+        # A malformed payload or a booking that doesn't exist won't get better with retries
+        logger.error("Stripe webhook event %s failed, not retrying: %r", webhook_event_id, exc)
+        WebhookEvent.objects.filter(id=webhook_event_id, status='pending').update(status='failed', last_error=repr(exc))
+
+
+@shared_task
+def redispatch_queued_checkouts_task():
+    """Queue checkout again for held bookings still without a session after ``CHECKOUT_REDISPATCH_AFTER_SECONDS`` (lost enqueue, broker down)."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.CHECKOUT_REDISPATCH_AFTER_SECONDS)
+    booking_ids = list(
+        Booking.objects.filter(status='pending', checkout_status='queued', booked_at__lte=stale, hold_expires_at__gt=now)
+        .order_by('booked_at').values_list('id', flat=True)[:settings.CHECKOUT_REDISPATCH_BATCH_SIZE]
+    )
+    for booking_id in booking_ids:
+        create_checkout_session_task.delay(booking_id)
+    if booking_ids:
+        logger.warning("Re-queued checkout for %s bookings still without a session.", len(booking_ids))
+    return len(booking_ids)
+
+
+@shared_task
+def redispatch_pending_webhooks_task():
+    """Queue again inbox rows still pending after ``WEBHOOK_REDISPATCH_AFTER_SECONDS`` (lost enqueue, retries exhausted)."""
+    stale = timezone.now() - timedelta(seconds=settings.WEBHOOK_REDISPATCH_AFTER_SECONDS)
+    webhook_event_ids = list(
+        WebhookEvent.objects.filter(status='pending', received_at__lte=stale)
+        .order_by('received_at').values_list('id', flat=True)[:settings.WEBHOOK_REDISPATCH_BATCH_SIZE]
+    )
+    for webhook_event_id in webhook_event_ids:
+        process_webhook_event_task.delay(webhook_event_id)
+    if webhook_event_ids:
+        logger.warning("Re-queued %s Stripe webhook events still pending.", len(webhook_event_ids))
+    return len(webhook_event_ids)
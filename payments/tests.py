@@ -1,3 +1,399 @@
-from django.test import TestCase
+import io
+import json
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import stripe
+from asgiref.sync import async_to_sync, sync_to_async
+from celery.exceptions import Retry
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from kombu.exceptions import OperationalError as KombuOperationalError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from bookings.async_views import booking_checkout_status
+from bookings.inventory import release_booking, release_expired_holds
+from bookings.models import Booking
+from event_booking.metrics import LocalStore, set_shared_store
+from events.models import Event, TicketType
+from users.models import CustomUser
+from .fake_stripe import FakeStripeGateway, checkout_events, fake_event, signature_header
+from .gateway import CircuitBreaker, CircuitOpenError, StripeGateway, set_gateway
+from .models import WebhookEvent
+from .tasks import (
+    create_checkout_session_task, expire_checkout_sessions_task, process_webhook_event_task, redispatch_pending_webhooks_task,
+    redispatch_queued_checkouts_task,
+)
+from .webhooks import RetryLater, handle_charge_succeeded, process_event
+
+
+class AsyncCheckoutTests(TestCase):
+    def setUp(self):
+        self.gateway = FakeStripeGateway()
+        set_gateway(self.gateway)
+        self.addCleanup(set_gateway, None)
+        organizer = CustomUser.objects.create_user(username='organizer', email='o@example.com', password='x', role='organizer')
+        self.attendee = CustomUser.objects.create_user(username='attendee', email='a@example.com', password='x')
+        now = timezone.now()
+        self.event = Event.objects.create(
+            organizer=organizer, title='Tech Talk', description='', location='Pune', category='tech',
+            start_time=now + timedelta(days=1), end_time=now + timedelta(days=1, hours=2), status='published',
+        )
+        self.ticket_type = TicketType.objects.create(event=self.event, name='Standard', price='12.50', quantity=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.attendee)
+
+    def book(self):
+        payload = {'event_id': self.event.id, 'tickets': [{'ticket_type_id': self.ticket_type.id, 'quantity': 2}]}
+        run_task = lambda booking_id: create_checkout_session_task.apply(args=[booking_id])
+        with mock.patch('bookings.views.create_checkout_session_task.delay', side_effect=run_task) as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('booking-create'), payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        delay.assert_called_once_with(response.data['booking_id'])
+        return response
+
+    def test_booking_returns_status_url_and_checkout_becomes_ready(self):
+        response = self.book()
+
+        status_response = self.client.get(response.data['status_url'])
+        data = status_response.data['data']
+        self.assertEqual(data['checkout_status'], 'ready')
+        self.assertTrue(data['checkout_url'].startswith('https://checkout.stripe.test/'))
+        session = next(iter(self.gateway.sessions.values()))
+        self.assertEqual(session.params['line_items'][0]['price_data']['unit_amount'], 2500)
+        self.assertEqual(session.params['client_reference_id'], str(response.data['booking_id']))
+        self.assertEqual(Booking.objects.get(id=response.data['booking_id']).checkout_session_id, session.id)
+
+    def test_transient_stripe_errors_are_retried(self):
+        self.gateway.fail_next(stripe.error.APIConnectionError('timeout'), stripe.error.RateLimitError('slow down'))
+
+        response = self.book()
+
+        self.assertEqual(Booking.objects.get(id=response.data['booking_id']).checkout_status, 'ready')
+
+    def test_permanent_failure_releases_the_hold(self):
+        self.gateway.fail_next(stripe.error.InvalidRequestError('bad amount', 'amount'))
+
+        response = self.book()
+
+        booking = Booking.objects.get(id=response.data['booking_id'])
+        self.assertEqual((booking.status, booking.checkout_status), ('failed', 'failed'))
+        self.ticket_type.refresh_from_db()
+        self.assertEqual(self.ticket_type.quantity, 10)
+
+    def test_released_holds_expire_their_checkout_sessions(self):
+        swept = Booking.objects.get(id=self.book().data['booking_id'])
+        released = Booking.objects.get(id=self.book().data['booking_id'])
+        Booking.objects.filter(id=swept.id).update(hold_expires_at=timezone.now() - timedelta(seconds=1))
+        self.gateway.fail_next(stripe.error.APIConnectionError('timeout'))
+
+        run_task = lambda session_ids: expire_checkout_sessions_task.apply(args=[session_ids])
+        with mock.patch('payments.tasks.expire_checkout_sessions_task.delay', side_effect=run_task):
+            with self.captureOnCommitCallbacks(execute=True):
+                release_expired_holds()
+            with self.captureOnCommitCallbacks(execute=True):
+                release_booking(released.id)
+
+        sessions = self.gateway.sessions
+        self.assertEqual(
+            (sessions[swept.checkout_session_id].status, sessions[released.checkout_session_id].status), ('expired', 'expired')
+        )
+
+    def test_checkout_lost_to_a_broker_outage_is_queued_again_by_beat(self):
+        payload = {'event_id': self.event.id, 'tickets': [{'ticket_type_id': self.ticket_type.id, 'quantity': 2}]}
+        with mock.patch('bookings.views.create_checkout_session_task.delay', side_effect=KombuOperationalError('broker down')):
+            with self.assertLogs('bookings.views', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('booking-create'), payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        booking_id = response.data['booking_id']
+        Booking.objects.filter(id=booking_id).update(booked_at=timezone.now() - timedelta(minutes=5))
+
+        run_task = lambda booking_id: create_checkout_session_task.apply(args=[booking_id])
+        with mock.patch('payments.tasks.create_checkout_session_task.delay', side_effect=run_task):
+            with self.assertLogs('payments.tasks', 'WARNING'):
+                self.assertEqual(redispatch_queued_checkouts_task(), 1)
+
+        self.assertEqual(Booking.objects.get(id=booking_id).checkout_status, 'ready')
+        self.assertEqual(redispatch_queued_checkouts_task(), 0)
+
+    def test_session_created_after_the_hold_was_released_is_expired(self):
+        booking = Booking.objects.create(user=self.attendee, event=self.event, total_amount=25, hold_expires_at=timezone.now() + timedelta(minutes=30))
+
+        def released_meanwhile(booking):
+            Booking.objects.filter(id=booking.id).update(status='failed')
+            return self.gateway.create_checkout_session({})
+
+        run_task = lambda session_ids: expire_checkout_sessions_task.apply(args=[session_ids])
+        with mock.patch('payments.tasks.create_stripe_checkout_session', side_effect=released_meanwhile), \
+                mock.patch('payments.tasks.expire_checkout_sessions_task.delay', side_effect=run_task):
+            create_checkout_session_task.apply(args=[booking.id])
+
+        booking.refresh_from_db()
+        self.assertEqual((booking.checkout_status, booking.checkout_session_id), ('queued', None))
+        self.assertEqual([session.status for session in self.gateway.sessions.values()], ['expired'])
+
+    def test_status_is_private_to_the_booking_owner(self):
+        response = self.book()
+        stranger = CustomUser.objects.create_user(username='stranger', email='s@example.com', password='x')
+        self.client.force_authenticate(stranger)
+
+        self.assertEqual(self.client.get(response.data['status_url']).status_code, 404)
+
+    def test_queued_checkout_answers_at_once_with_a_retry_hint(self):
+        booking = Booking.objects.create(user=self.attendee, event=self.event, total_amount=25, hold_expires_at=timezone.now() + timedelta(minutes=30))
+
+        with mock.patch('time.sleep') as sleep:
+            response = self.client.get(reverse('booking-checkout-status', args=[booking.id]), {'wait': 20})
+
+        sleep.assert_not_called()
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual((response.data['data']['checkout_status'], response.data['data']['poll_after_seconds']), ('queued', 1))
+
+    def test_async_long_poll_returns_once_the_checkout_is_ready(self):
+        booking = Booking.objects.create(user=self.attendee, event=self.event, total_amount=25, hold_expires_at=timezone.now() + timedelta(minutes=30))
+        url = reverse('booking-checkout-status', args=[booking.id])
+        token = f'Bearer {AccessToken.for_user(self.attendee)}'
+
+        async def worker_finishes(seconds):
+            await sync_to_async(Booking.objects.filter(id=booking.id).update)(checkout_status='ready', checkout_url='https://checkout.stripe.test/1')
+
+        with mock.patch('bookings.async_views.asyncio.sleep', side_effect=worker_finishes) as sleep:
+            response = async_to_sync(booking_checkout_status)(AsyncRequestFactory().get(url, {'wait': 20}, headers={'Authorization': token}), pk=booking.id)
+
+        sleep.assert_called_once()
+        data = json.loads(response.content)['data']
+        self.assertEqual((data['checkout_status'], data['checkout_url']), ('ready', 'https://checkout.stripe.test/1'))
+        self.assertFalse(response.has_header('Retry-After'))
+
+
+WEBHOOK_SECRET = 'whsec_test'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTests(TestCase):
+    def setUp(self):
+        set_gateway(FakeStripeGateway())
+        self.addCleanup(set_gateway, None)
+        organizer = CustomUser.objects.create_user(username='organizer', email='o@example.com', password='x', role='organizer')
+        attendee = CustomUser.objects.create_user(username='attendee', email='a@example.com', password='x')
+        now = timezone.now()
+        event = Event.objects.create(
+            organizer=organizer, title='Expo', description='', location='Delhi', category='expo',
+            start_time=now + timedelta(days=1), end_time=now + timedelta(days=1, hours=8), status='published',
+        )
+        self.booking = Booking.objects.create(
+            user=attendee, event=event, total_amount=100, hold_expires_at=now + timedelta(minutes=30),
+        )
+
+    def deliver(self, event):
+        payload = json.dumps(event)
+        with mock.patch('payments.views.process_webhook_event_task.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('stripe-webhook'), payload, content_type='application/json',
+                    HTTP_STRIPE_SIGNATURE=signature_header(payload, WEBHOOK_SECRET),
+                )
+        self.assertEqual(response.status_code, 200)
+        return [call.args[0] for call in delay.call_args_list]
+
+    def test_delivery_is_stored_and_acknowledged_before_processing(self):
+        charge, session = checkout_events(self.booking.id)
+
+        queued = self.deliver(session)
+
+        inbox = WebhookEvent.objects.get()
+        self.assertEqual(queued, [inbox.id])
+        self.assertEqual((inbox.stripe_event_id, inbox.status), (session['id'], 'pending'))
+        self.assertEqual(Booking.objects.get(id=self.booking.id).status, 'pending')
+
+    def test_redelivered_events_are_deduplicated(self):
+        charge, session = checkout_events(self.booking.id)
+
+        first = self.deliver(session)
+        # Still pending: the first enqueue may never have reached the broker
+        second = self.deliver(session)
+        process_event(first[0])
+        third = self.deliver(session)
+
+        self.assertEqual(second, first)
+        self.assertEqual(third, [])
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    def test_stale_pending_events_are_redispatched(self):
+        charge, session = checkout_events(self.booking.id)
+        stale_id, = self.deliver(session)
+        fresh_id, = self.deliver(charge)
+        WebhookEvent.objects.filter(id=stale_id).update(received_at=timezone.now() - timedelta(minutes=10))
+
+        with mock.patch('payments.tasks.process_webhook_event_task.delay') as delay:
+            redispatch_pending_webhooks_task()
+
+        delay.assert_called_once_with(stale_id)
+
+    def test_transient_errors_are_retried_and_bad_events_marked_failed(self):
+        charge, session = checkout_events(self.booking.id)
+        session_id, = self.deliver(session)
+
+        with mock.patch('payments.tasks.process_event', side_effect=OperationalError('connection reset')):
+            with self.assertRaises(Retry):
+                process_webhook_event_task.apply(args=[session_id], throw=True)
+        self.assertEqual(WebhookEvent.objects.get(id=session_id).status, 'pending')
+
+        with mock.patch('payments.tasks.process_event', side_effect=KeyError('data')):
+            process_webhook_event_task.apply(args=[session_id], throw=True)
+        inbox = WebhookEvent.objects.get(id=session_id)
+        self.assertEqual((inbox.status, inbox.last_error), ('failed', "KeyError('data')"))
+
+    def test_charge_waits_for_its_session_and_both_apply_in_order(self):
+        charge, session = checkout_events(self.booking.id)
+        charge_id, = self.deliver(charge)
+        session_id, = self.deliver(session)
+
+        with self.assertRaises(RetryLater):
+            process_event(charge_id)
+        process_event(session_id)
+
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'paid')
+        self.assertEqual(self.booking.platform_fee, 10)
+        self.assertEqual(self.booking.payment_intent_id, session['data']['object']['payment_intent'])
+        self.assertEqual(self.booking.receipt_url, charge['data']['object']['receipt_url'])
+        self.assertEqual(set(WebhookEvent.objects.values_list('status', flat=True)), {'processed'})
+
+    def test_an_earlier_bad_event_does_not_block_later_ones(self):
+        charge, session = checkout_events(self.booking.id)
+        expired = fake_event('checkout.session.expired', {**session['data']['object'], 'payment_intent': None}, session['created'] - 1)
+        expired_id, = self.deliver(expired)
+        session_id, = self.deliver(session)
+
+        with mock.patch('payments.webhooks.release_booking', side_effect=ValueError('bad row')), \
+                self.assertLogs('payments.webhooks', 'ERROR'):
+            process_event(session_id)
+
+        self.assertEqual(Booking.objects.get(id=self.booking.id).status, 'paid')
+        self.assertEqual(WebhookEvent.objects.get(id=session_id).status, 'processed')
+        self.assertEqual(WebhookEvent.objects.get(id=expired_id).status, 'failed')
+
+    def test_session_events_for_one_booking_apply_in_order(self):
+        charge, session = checkout_events(self.booking.id)
+        # Expired first, though delivered last: checkout.session.expired carries no PaymentIntent
+        expired = fake_event('checkout.session.expired', {**session['data']['object'], 'payment_intent': None}, session['created'] - 1)
+        session_id, = self.deliver(session)
+        expired_id, = self.deliver(expired)
+
+        process_event(session_id)
+
+        self.assertEqual(WebhookEvent.objects.get(id=expired_id).ordering_key, WebhookEvent.objects.get(id=session_id).ordering_key)
+        self.assertEqual(WebhookEvent.objects.get(id=expired_id).status, 'processed')
+        self.booking.refresh_from_db()
+        # Released by the expiry, then paid by the completion that Stripe created after it
+        self.assertEqual((self.booking.status, self.booking.holds_seats), ('paid', True))
+
+    def test_charge_receipt_is_stored_with_one_indexed_query(self):
+        Booking.objects.filter(id=self.booking.id).update(payment_intent_id='pi_test_1')
+
+        with self.assertNumQueries(1):
+            handle_charge_succeeded({'payment_intent': 'pi_test_1', 'receipt_url': 'https://pay.stripe.com/receipts/1'}, 'charge.succeeded')
+
+    def test_replay_reapplies_processed_events(self):
+        charge, session = checkout_events(self.booking.id)
+        session_id, = self.deliver(session)
+        process_event(session_id)
+        Booking.objects.filter(id=self.booking.id).update(status='pending')
+
+        call_command('replay_webhook_events', session['id'], '--sync', stdout=io.StringIO())
+
+        self.assertEqual(Booking.objects.get(id=self.booking.id).status, 'paid')
+
+    def test_bad_signature_is_rejected(self):
+        response = self.client.post(reverse('stripe-webhook'), '{}', content_type='application/json', HTTP_STRIPE_SIGNATURE='t=1,v1=bad')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+
+# ------------------------ Gateway against a local stub server ------------------------
+class StubStripeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        server.connections.add(self.client_address)
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        status_code = server.status_codes.pop(0) if server.status_codes else 200
+        if status_code == 200:
+            body = {'id': 'cs_stub_1', 'object': 'checkout.session', 'url': 'https://checkout.stub/cs_stub_1'}
+        else:
+            body = {'error': {'type': 'api_error', 'message': 'stub outage'}}
+        payload = json.dumps(body).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StripeGatewayTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubStripeHandler)
+        self.server.connections = set()
+        self.server.status_codes = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        self.gateway = StripeGateway(
+            api_key='sk_test_stub', api_base=f'http://127.0.0.1:{self.server.server_port}',
+            max_network_retries=0, breaker=self.breaker,
+        )
+
+    def test_worker_stripe_metrics_are_served_by_web_processes(self):
+        # One store standing in for Redis, shared by the worker that calls Stripe and the web process that is scraped
+        set_shared_store(LocalStore())
+        self.addCleanup(set_shared_store, None)
+
+        self.gateway.create_checkout_session({'mode': 'payment'})
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('stripe_requests_total{operation="checkout.sessions.create",outcome="ok"} 1', body)
+        self.assertIn('external_call_duration_seconds_count{service="stripe"} 1', body)
+
+    def test_calls_reuse_one_keep_alive_connection(self):
+        for _ in range(3):
+            session = self.gateway.create_checkout_session({'mode': 'payment'})
+
+        self.assertEqual(session.url, 'https://checkout.stub/cs_stub_1')
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_breaker_fails_fast_after_repeated_outages(self):
+        self.server.status_codes = [500, 500]
+        for _ in range(2):
+            with self.assertRaises(stripe.error.APIError):
+                self.gateway.create_checkout_session({'mode': 'payment'})
+
+        with self.assertRaises(CircuitOpenError):
+            self.gateway.create_checkout_session({'mode': 'payment'})
+        self.assertEqual(self.breaker.state, 'open')
+
+    def test_half_open_trial_closes_the_breaker(self):
+        clock = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=lambda: clock[0])
+        breaker.record_failure()
+        self.assertRaises(CircuitOpenError, breaker.before_call)
+
+        clock[0] = 31
+        breaker.before_call()
+        self.assertRaises(CircuitOpenError, breaker.before_call)
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
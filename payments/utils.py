@@ -1,12 +1,21 @@
-import stripe
-from django.conf import settings
+from datetime import timedelta
+from django.utils import timezone
+from .gateway import get_gateway
+
+# Stripe refuses sessions that expire sooner than 30 minutes after creation.
+STRIPE_MIN_SESSION_TTL = timedelta(minutes=30, seconds=30)
+
+
+def checkout_session_expiry(booking):
+    earliest = timezone.now() + STRIPE_MIN_SESSION_TTL
+    expires_at = max(booking.hold_expires_at or earliest, earliest)
+    return int(expires_at.timestamp())
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
 
 def create_stripe_checkout_session(booking):
-    session = stripe.checkout.Session.create(
-        payment_method_types=['card'],
-        line_items=[
+    session = get_gateway().create_checkout_session({
+        'payment_method_types': ['card'],
+        'line_items': [
             {
                 'price_data': {
                     'currency': 'usd',
@@ -18,15 +27,18 @@ def create_stripe_checkout_session(booking):
                 'quantity': 1,
             },
         ],
-        mode='payment',
-        success_url='http://127.0.0.1:8000/payment/success/',
-        cancel_url='http://127.0.0.1:8000/payment/cancel/',
-        payment_intent_data={   
+        'mode': 'payment',
+        'client_reference_id': str(booking.id),
+        'success_url': 'http://127.0.0.1:8000/payment/success/',
+        'cancel_url': 'http://127.0.0.1:8000/payment/cancel/',
+        'expires_at': checkout_session_expiry(booking),
+        'metadata': {
+            'booking_id': str(booking.id),
+        },
+        'payment_intent_data': {   
             'metadata': {
                 'booking_id': str(booking.id),
             }
         },
-        expand=['payment_intent.charges']
-
-    )
-    return session.url
\ No newline at end of file
+    })
+    return session
\ No newline at end of file
@@ -5,13 +5,12 @@ from rest_framework.views import APIView
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.http import HttpResponse
-from bookings.models import Booking
+from django.db import transaction
 from django.shortcuts import render
-from rest_framework.views import APIView
-from decimal import Decimal
-
+from .gateway import get_gateway
+from .tasks import process_webhook_event_task
+from .webhooks import record_event
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
 
 class StripeWebhookView(APIView):
     @method_decorator(csrf_exempt, name='dispatch')
@@ -22,66 +21,15 @@ class StripeWebhookView(APIView):
 
         # Verify webhook signature
         try:
-            event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
+            event = get_gateway().construct_event(payload, sig_header, endpoint_secret)
         except (ValueError, stripe.error.SignatureVerificationError):
             return HttpResponse(status=400)
 
-        # Handle payment success: update inventory and booking status
-        if event['type'] == 'checkout.session.completed':
-            session = event['data']['object']
-            payment_intent_id = session.get('payment_intent')
-
-            if payment_intent_id:
-                try:
-                    payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-                    booking_id = payment_intent.metadata.get('booking_id')
-
-                    if booking_id:
-                        booking = Booking.objects.get(id=booking_id)
-
-                        if booking.status != 'paid':
-                            # Deduct ticket quantities
-                            for ticket in booking.tickets.all():
-                                ticket_type = ticket.ticket_type
-                                if ticket_type.quantity >= ticket.quantity:
-                                    ticket_type.quantity -= ticket.quantity
-                                    ticket_type.save()
-
-                            # Calculate platform fee and organizer revenue
-                            platform_percentage = settings.PLATFORM_FEE_PERCENTAGE
-                            platform_fee = booking.total_amount * (platform_percentage / Decimal('100'))
-                            organizer_revenue = booking.total_amount - platform_fee
-
-                            # Update booking with financial data
-                            booking.platform_fee = platform_fee
-                            booking.organizer_revenue = organizer_revenue
-                            booking.status = 'paid'
-                            booking.save()
-
-                except Exception:
-                    return HttpResponse(status=404)
-
-        # Handle charge success: save receipt URL
-        elif event['type'] == 'charge.succeeded':
-            charge = event['data']['object']
-            payment_intent_id = charge.get('payment_intent')
-            receipt_url = charge.get('receipt_url')
-
-            if payment_intent_id and receipt_url:
-                try:
-                    payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-                    booking_id = payment_intent.metadata.get('booking_id')
-
-                    if booking_id:
-                        booking = Booking.objects.get(id=booking_id)
-                        booking.receipt_url = receipt_url
-                        booking.save()
-                        booking.refresh_from_db()
-
-                except Booking.DoesNotExist:
-                    return HttpResponse(status=404)
-                except Exception:
-                    return HttpResponse(status=500)
+        # Store and acknowledge; a Celery worker applies it. Redeliveries hit the unique event id, and are
+        # queued again while the row is still pending, in case the first enqueue never reached the broker.
+        webhook_event, created = record_event(event)
+        if webhook_event.status == 'pending':
+            transaction.on_commit(lambda: process_webhook_event_task.delay(webhook_event.id))
 
         return HttpResponse(status=200)
 
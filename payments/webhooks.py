@@ -0,0 +1,202 @@
+"""
+Stripe webhook inbox.
+
+The view only verifies the signature and records the raw event here, keyed by
+Stripe's event id, so retried deliveries collapse onto one row. Celery then
+works through pending events; events for the same booking share an
+``ordering_key`` and are applied in the order Stripe created them.
+"""
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import InterfaceError, OperationalError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from bookings.inventory import mark_booking_paid, release_booking
+from bookings.models import Booking
+from .models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+HANDLED_EVENT_TYPES = {
+    'checkout.session.completed',
+    'checkout.session.expired',
+    'checkout.session.async_payment_failed',
+    'charge.succeeded',
+}
+
+
+class RetryLater(Exception):
+    """The event can't be applied yet (e.g. a charge that beat its checkout session)."""
+
+
+# Worth retrying the task for; anything else is a bad event and retrying won't fix it
+TRANSIENT_ERRORS = (RetryLater, OperationalError, InterfaceError)
+
+
+def booking_id_of(obj):
+    return obj.get('client_reference_id') or (obj.get('metadata') or {}).get('booking_id')
+
+
+def session_booking_lookup(session):
+    # Sessions carry the booking id themselves, so no PaymentIntent round trip is needed
+    booking_id = booking_id_of(session)
+    if booking_id:
+        return {'id': booking_id}
+    return {'checkout_session_id': session.get('id')}
+
+
+def ordering_key(event):
+    # Session events go by their booking: checkout.session.expired has no PaymentIntent to share with
+    # the completion it races. Charges don't name the booking and keep their PaymentIntent.
+    obj = event['data']['object']
+    booking_id = booking_id_of(obj)
+    if booking_id:
+        return f'booking:{booking_id}'
+    return obj.get('payment_intent') or obj.get('id') or ''
+
+
+def ordering_keys(event):
+    """``event``'s own key, plus its PaymentIntent's: a completed session also unlocks the charge before it."""
+    keys = [ordering_key(event)]
+    payment_intent = event['data']['object'].get('payment_intent')
+    if payment_intent and payment_intent not in keys:
+        keys.append(payment_intent)
+    return keys
+
+
+# ------------------------ Ingestion ------------------------
+def record_event(event):
+    """Store a verified Stripe event; returns ``(webhook_event, created)``."""
+    if not isinstance(event, dict):
+        event = event.to_dict()
+    return WebhookEvent.objects.get_or_create(
+        stripe_event_id=event['id'],
+        defaults={
+            'event_type': event['type'],
+            'ordering_key': ordering_key(event),
+            'stripe_created': datetime.fromtimestamp(event.get('created') or timezone.now().timestamp(), tz=dt_timezone.utc),
+            'payload': event,
+            'status': 'pending' if event['type'] in HANDLED_EVENT_TYPES else 'ignored',
+        },
+    )
+
+
+# ------------------------ Processing ------------------------
+def process_event(webhook_event_id):
+    """
+    Apply ``webhook_event_id`` and every earlier pending event with the same
+    ordering key (or, for a session, its PaymentIntent's), oldest first.
+
+    An event that can't be applied yet is set aside and tried again once the
+    rest are in (Stripe usually creates ``charge.succeeded`` before the
+    ``checkout.session.completed`` it depends on); if it still has to wait,
+    ``RetryLater`` propagates so the task is retried. An earlier event that
+    fails for good is marked failed and skipped: only ``webhook_event_id``'s
+    own error is raised.
+    """
+    webhook_event = WebhookEvent.objects.get(id=webhook_event_id)
+    queue = WebhookEvent.objects.filter(
+        Q(status='pending') | Q(id=webhook_event_id),
+        ordering_key__in=ordering_keys(webhook_event.payload),
+        stripe_created__lte=webhook_event.stripe_created,
+    ).order_by('stripe_created', 'id').values_list('id', flat=True)
+
+    deferred, error = _apply_each(list(queue), webhook_event_id)
+    _, error = _apply_each(deferred, webhook_event_id, error=error, defer=False)
+    if error is not None:
+        raise error
+
+
+def _apply_each(webhook_event_ids, requested_id, error=None, defer=True):
+    """Apply each event in turn; returns the ones that have to wait (with ``defer``) and ``requested_id``'s error."""
+    deferred = []
+    for queued_id in webhook_event_ids:
+        try:
+            _apply(queued_id)
+        except RetryLater as exc:
+            if defer:
+                deferred.append(queued_id)
+            elif queued_id == requested_id:
+                error = exc
+        except TRANSIENT_ERRORS:
+            raise
+        except Exception as exc:
+            # _apply has marked it failed; its own task reports it, and it mustn't hold up the events after it
+            if queued_id == requested_id:
+                error = exc
+    return deferred, error
+
+
+def _apply(webhook_event_id):
+    error = None
+    with transaction.atomic():
+        # Blocking lock: a second worker on the same event waits, then sees it done
+        webhook_event = WebhookEvent.objects.select_for_update().get(id=webhook_event_id)
+        if webhook_event.status not in ('pending', 'failed'):
+            return
+
+        webhook_event.attempts += 1
+        try:
+            with transaction.atomic():
+                HANDLERS[webhook_event.event_type](webhook_event.payload['data']['object'], webhook_event.event_type)
+        except RetryLater as exc:
+            webhook_event.last_error = str(exc)
+            error = exc
+        except TRANSIENT_ERRORS as exc:
+            # The database, not the event: leave it pending for the retry
+            webhook_event.last_error = repr(exc)
+            error = exc
+        except Exception as exc:
+            logger.exception("Stripe event %s failed.", webhook_event.stripe_event_id)
+            webhook_event.status = 'failed'
+            webhook_event.last_error = repr(exc)
+            error = exc
+        else:
+            webhook_event.status = 'processed'
+            webhook_event.last_error = ''
+            webhook_event.processed_at = timezone.now()
+        webhook_event.save(update_fields=['attempts', 'status', 'last_error', 'processed_at'])
+
+    # Raised only once the bookkeeping above has committed
+    if error is not None:
+        raise error
+
+
+# ------------------------ Handlers ------------------------
+def handle_session_completed(session, event_type):
+    # Remember the Stripe ids so later events resolve with one indexed lookup
+    short = mark_booking_paid(
+        session_booking_lookup(session),
+        checkout_session_id=session.get('id'),
+        payment_intent_id=session.get('payment_intent'),
+    )
+    if short:
+        logger.error("Booking for session %s was paid after its hold expired and ticket types %s are sold out; refund required.",
+                     session.get('id'), short)
+
+
+def handle_session_failed(session, event_type):
+    booking_id = Booking.objects.filter(**session_booking_lookup(session)).values_list('id', flat=True).first()
+    # The session already expired or completed on Stripe's side: nothing left to expire
+    if booking_id and release_booking(booking_id, expire_session=False):
+        logger.info("Released seats held by booking %s (%s).", booking_id, event_type)
+
+
+def handle_charge_succeeded(charge, event_type):
+    payment_intent_id = charge.get('payment_intent')
+    receipt_url = charge.get('receipt_url')
+    if not (payment_intent_id and receipt_url):
+        return
+
+    if not Booking.objects.filter(payment_intent_id=payment_intent_id).update(receipt_url=receipt_url):
+        raise RetryLater(f"No booking for payment intent {payment_intent_id} yet.")
+
+
+HANDLERS = {
+    'checkout.session.completed': handle_session_completed,
+    'checkout.session.expired': handle_session_failed,
+    'checkout.session.async_payment_failed': handle_session_failed,
+    'charge.succeeded': handle_charge_succeeded,
+}
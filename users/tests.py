@@ -1,3 +1,22 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from event_booking.query_plans import captured_sequential_scans
+from .models import CustomUser, PasswordResetToken
+
+
+class PasswordResetQueryPlanTests(TestCase):
+    def test_token_lookup_uses_an_index(self):
+        users = CustomUser.objects.bulk_create([
+            CustomUser(username=f'user{index}', email=f'user{index}@example.com') for index in range(50)
+        ])
+        tokens = PasswordResetToken.objects.bulk_create([
+            PasswordResetToken(user=user, used=index % 2 == 0) for index, user in enumerate(users)
+        ])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('reset_password_html', args=[tokens[-1].token]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(captured_sequential_scans(queries.captured_queries), {})